@@ -0,0 +1,298 @@
+"""
+Alert rules evaluated incrementally on every ingested batch.
+
+Each rule watches one metric over the last ``window`` requests of every group
+(model x device by default, canonical names from dimensions.py). Windows are
+ring buffers with running aggregates: a sum for rates and means, a latency
+sketch (sketch.py) for quantiles and a monotonic deque for maxima. Adding a
+row and evicting the oldest one are O(1); after a batch only the groups it
+touched are re-evaluated, so nothing is ever rescanned.
+
+An alert fires when a rule's condition becomes true for a group. It is not
+repeated while the condition holds (dedup). It is not fired again within
+``cooldown_s`` of the last firing, even if it resolved in between
+(flapping). Firings and resolutions go to every sink: a JSON-lines file, an
+optional webhook and the SSE channel behind ``GET /api/alerts/stream``.
+"""
+import json
+import operator
+import os
+import queue
+import threading
+import time
+from collections import deque
+
+import log_store
+from dimensions import Dimensions
+from sketch import LatencySketch
+
+ALERT_RULES_FILE = os.environ.get("ALERT_RULES_FILE")
+ALERT_LOG_FILE = os.environ.get("ALERT_LOG_FILE", os.path.join(log_store.SEGMENT_DIR, "alerts.jsonl"))
+ALERT_WEBHOOK_URL = os.environ.get("ALERT_WEBHOOK_URL")
+ALERT_HISTORY = int(os.environ.get("ALERT_HISTORY", "200"))  # recent alerts kept in memory
+# Coarser than the cube: evaluation walks the sketch's buckets once per touched group
+ALERT_SKETCH_ACCURACY = 0.02
+
+METRICS = ("p50_latency_ms", "p95_latency_ms", "p99_latency_ms", "avg_latency_ms",
+           "crash_rate_pct", "max_temperature")
+OPERATORS = {">": operator.gt, ">=": operator.ge, "<": operator.lt, "<=": operator.le}
+GROUP_COLUMNS = {"model_name": "model", "device_model": "device", "app_version": "version"}
+
+DEFAULT_RULES = [
+    {"name": "p95_latency_high", "metric": "p95_latency_ms", "op": ">", "threshold": 30000,
+     "window": 100, "min_samples": 20, "severity": "warning"},
+    {"name": "crash_burst", "metric": "crash_rate_pct", "op": ">", "threshold": 5,
+     "window": 50, "min_samples": 20, "severity": "critical"},
+    {"name": "thermal_critical", "metric": "max_temperature", "op": ">=", "threshold": 3,
+     "window": 1, "min_samples": 1, "severity": "warning"},
+]
+
+
+class Rule:
+    def __init__(self, name, metric, op, threshold, window=100, min_samples=None,
+                 group_by=("model_name", "device_model"), cooldown_s=300, severity="warning"):
+        if metric not in METRICS:
+            raise ValueError(f"rule {name!r}: metric must be one of {METRICS}")
+        if op not in OPERATORS:
+            raise ValueError(f"rule {name!r}: op must be one of {tuple(OPERATORS)}")
+        if any(col not in GROUP_COLUMNS for col in group_by):
+            raise ValueError(f"rule {name!r}: group_by must be among {tuple(GROUP_COLUMNS)}")
+        self.name = name
+        self.metric = metric
+        self.op = op
+        self.threshold = float(threshold)
+        self.window = max(int(window), 1)
+        self.min_samples = min(int(min_samples or self.window), self.window)
+        self.group_by = tuple(group_by)
+        self.cooldown_s = float(cooldown_s)
+        self.severity = severity
+
+    def to_dict(self):
+        return {key: getattr(self, key) for key in (
+            "name", "metric", "op", "threshold", "window", "min_samples", "group_by", "cooldown_s", "severity")}
+
+
+def load_rules(path=ALERT_RULES_FILE):
+    if not path:
+        return [Rule(**spec) for spec in DEFAULT_RULES]
+    with open(path) as f:
+        return [Rule(**spec) for spec in json.load(f)]
+
+
+class Window:
+    """The last ``size`` values of one metric, with O(1) add / evict"""
+
+    def __init__(self, rule):
+        self.size = rule.window
+        self.metric = rule.metric
+        self.values = deque()
+        self.total = 0.0
+        self.sketch = LatencySketch(ALERT_SKETCH_ACCURACY) if rule.metric.startswith("p") else None
+        self._maxima = deque() if rule.metric == "max_temperature" else None  # (index, value), decreasing
+        self._index = 0
+
+    def add(self, value):
+        self.values.append(value)
+        self.total += value
+        if self.sketch is not None:
+            self.sketch.add(value)
+        if self._maxima is not None:
+            while self._maxima and self._maxima[-1][1] <= value:
+                self._maxima.pop()
+            self._maxima.append((self._index, value))
+        self._index += 1
+        if len(self.values) > self.size:
+            old = self.values.popleft()
+            self.total -= old
+            if self.sketch is not None:
+                self.sketch.remove(old)
+            if self._maxima is not None and self._maxima[0][0] <= self._index - 1 - self.size:
+                self._maxima.popleft()
+
+    def value(self):
+        n = len(self.values)
+        if n == 0:
+            return None
+        if self.metric == "max_temperature":
+            return self._maxima[0][1]
+        if self.metric in ("avg_latency_ms", "crash_rate_pct"):
+            return self.total / n
+        return self.sketch.quantile({"p50": 0.50, "p95": 0.95, "p99": 0.99}[self.metric.split("_")[0]])
+
+
+def _sample(metric, row):
+    """The value a row contributes to ``metric`` (None if it has none)"""
+    if metric == "crash_rate_pct":
+        crash = row.get("crash_log")
+        return 100.0 if crash not in (None, "") else 0.0
+    raw = row.get("device_temperature") if metric == "max_temperature" else row.get("latency_ms")
+    if raw in (None, ""):
+        return None
+    try:
+        return float(raw)
+    except (TypeError, ValueError):
+        return None
+
+
+class SseChannel:
+    """Fan-out of alerts to ``GET /api/alerts/stream`` subscribers (any thread -> event loops)"""
+
+    def __init__(self, max_queue=100):
+        self.max_queue = max_queue
+        self._subscribers = set()
+        self._lock = threading.Lock()
+
+    def subscribe(self, loop):
+        import asyncio
+
+        q = asyncio.Queue(self.max_queue)
+        with self._lock:
+            self._subscribers.add((loop, q))
+        return q
+
+    def unsubscribe(self, loop, q):
+        with self._lock:
+            self._subscribers.discard((loop, q))
+
+    @staticmethod
+    def _offer(q, alert):
+        if not q.full():  # a slow client misses alerts instead of growing memory
+            q.put_nowait(alert)
+
+    def publish(self, alert):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for loop, q in subscribers:
+            try:
+                loop.call_soon_threadsafe(self._offer, q, alert)
+            except RuntimeError:
+                self.unsubscribe(loop, q)  # loop closed
+
+
+class WebhookSink:
+    """POST each alert as JSON from a background thread; ingestion never waits on it"""
+
+    def __init__(self, url):
+        self.url = url
+        self._queue = queue.Queue(1000)
+        threading.Thread(target=self._run, name="alert-webhook", daemon=True).start()
+
+    def publish(self, alert):
+        try:
+            self._queue.put_nowait(alert)
+        except queue.Full:
+            pass
+
+    def _run(self):
+        import httpx
+
+        while True:
+            alert = self._queue.get()
+            try:
+                httpx.post(self.url, json=alert, timeout=5)
+            except httpx.HTTPError as e:
+                print(f"⚠️ Alert webhook failed: {e}")
+
+
+class AlertEngine:
+    """Windows per (rule, group), firing state with dedup / cooldown, sinks"""
+
+    def __init__(self, rules=None, log_file=ALERT_LOG_FILE, webhook_url=ALERT_WEBHOOK_URL):
+        self.rules = rules if rules is not None else load_rules()
+        self.log_file = log_file
+        self.sse = SseChannel()
+        self.webhook = WebhookSink(webhook_url) if webhook_url else None
+        self.dims = Dimensions()
+        self.recent = deque(maxlen=ALERT_HISTORY)
+        self._windows = {}  # (rule name, group) -> Window
+        self._firing = {}  # (rule name, group) -> alert dict while the condition holds
+        self._last_fired = {}  # (rule name, group) -> time of the last firing
+        self._lock = threading.Lock()
+
+    def _group(self, rule, row):
+        labels = []
+        for col in rule.group_by:
+            dim = self.dims.by_name(GROUP_COLUMNS[col])
+            labels.append(dim.labels[dim.lookup(row.get(col))])
+        return tuple(labels)
+
+    def observe(self, rows):
+        """Feed freshly written rows; returns the alerts emitted for this batch"""
+        emitted = []
+        with self._lock:
+            touched = set()
+            for row in rows:
+                for rule in self.rules:
+                    value = _sample(rule.metric, row)
+                    if value is None:
+                        continue
+                    key = (rule.name, self._group(rule, row))
+                    window = self._windows.get(key)
+                    if window is None:
+                        window = self._windows[key] = Window(rule)
+                    window.add(value)
+                    touched.add((rule, key))
+            now = time.time()
+            for rule, key in touched:
+                alert = self._evaluate(rule, key, now)
+                if alert:
+                    emitted.append(alert)
+        for alert in emitted:
+            self._emit(alert)
+        return emitted
+
+    def _evaluate(self, rule, key, now):
+        window = self._windows[key]
+        value = window.value()
+        breached = (len(window.values) >= rule.min_samples and value is not None
+                    and OPERATORS[rule.op](value, rule.threshold))
+        firing = self._firing.get(key)
+        if breached and firing is None:
+            if now - self._last_fired.get(key, -float("inf")) < rule.cooldown_s:
+                return None  # cooling down: stay silent, fire again once it has passed
+            self._last_fired[key] = now
+            alert = self._firing[key] = self._alert("firing", rule, key, value, len(window.values), now)
+            return alert
+        if not breached and firing is not None:
+            del self._firing[key]
+            return self._alert("resolved", rule, key, value, len(window.values), now, since=firing["at"])
+        return None
+
+    @staticmethod
+    def _alert(status, rule, key, value, samples, now, since=None):
+        alert = {
+            "status": status,
+            "rule": rule.name,
+            "severity": rule.severity,
+            "group": dict(zip(rule.group_by, key[1])),
+            "metric": rule.metric,
+            "value": value,
+            "condition": f"{rule.metric} {rule.op} {rule.threshold:g}",
+            "window": rule.window,
+            "samples": samples,
+            "at": now,
+        }
+        if since is not None:
+            alert["firing_since"] = since
+        return alert
+
+    def _emit(self, alert):
+        self.recent.append(alert)
+        if self.log_file:
+            os.makedirs(os.path.dirname(self.log_file) or ".", exist_ok=True)
+            with open(self.log_file, "a") as f:
+                f.write(json.dumps(alert) + "\n")
+        if self.webhook is not None:
+            self.webhook.publish(alert)
+        self.sse.publish(alert)
+
+    def active(self):
+        with self._lock:
+            return list(self._firing.values())
+
+    def reset(self):
+        """Forget every window and firing state (e.g. after the logs were cleared)"""
+        with self._lock:
+            self._windows.clear()
+            self._firing.clear()
+            self._last_fired.clear()
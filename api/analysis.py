@@ -0,0 +1,334 @@
+"""
+Statistical comparison of latency between a baseline and a candidate.
+
+Quantile confidence intervals use an exact shortcut for the bootstrap of an
+order statistic: resampling n values from the empirical distribution and taking
+the k-th smallest is the same as drawing U ~ Beta(k, n - k + 1) and reading the
+empirical quantile at U. One Beta draw per replicate replaces an n-sized
+resample, so 10k replicates over 100k rows cost ~10k random numbers instead of
+10^9 indices.
+"""
+import math
+
+import numpy as np
+import pandas as pd
+
+import log_store
+from export import normalize_chunk
+
+DIMENSIONS = ("run_id", "app_version", "model_name")
+QUANTILES = {"p50": 0.50, "p95": 0.95}
+
+
+def load_latency_groups(dimension, values):
+    """Collect latency arrays for each requested value of ``dimension`` (chunked read)"""
+    if dimension not in DIMENSIONS:
+        raise ValueError(f"dimension must be one of {DIMENSIONS}")
+    values = [str(v) for v in values]
+
+    def segment_filter(entry):
+        return dimension != "run_id" or not entry.get("run_ids") or bool(set(entry["run_ids"]) & set(values))
+
+    parts = {v: [] for v in values}
+    for chunk in log_store.iter_log_chunks(segment_filter=segment_filter):
+        chunk = normalize_chunk(chunk)
+        chunk = chunk[chunk[dimension].isin(values).fillna(False).astype(bool) & chunk["latency_ms"].notna()]
+        for value, sub in chunk.groupby(dimension, observed=True):
+            parts[str(value)].append(sub["latency_ms"].to_numpy(dtype=float))
+    return {v: np.concatenate(p) if p else np.empty(0) for v, p in parts.items()}
+
+
+def bootstrap_quantile(sorted_values, q, n_boot, rng):
+    """Bootstrap replicates of the ``q`` quantile (inverted-CDF definition) of sorted data"""
+    n = len(sorted_values)
+    k = min(max(math.ceil(q * n), 1), n)
+    u = rng.beta(k, n - k + 1, size=n_boot)
+    idx = np.minimum((u * n).astype(np.int64), n - 1)
+    return sorted_values[idx]
+
+
+def mann_whitney(baseline, candidate):
+    """Two-sided Mann-Whitney U test (normal approximation, tie and continuity corrected)"""
+    n1, n2 = len(baseline), len(candidate)
+    combined = np.concatenate([baseline, candidate])
+    ranks = pd.Series(combined).rank(method="average").to_numpy()
+    u_candidate = ranks[n1:].sum() - n2 * (n2 + 1) / 2
+
+    n = n1 + n2
+    _, tie_counts = np.unique(combined, return_counts=True)
+    tie_term = float((tie_counts ** 3 - tie_counts).sum())
+    sigma = math.sqrt(n1 * n2 / 12 * ((n + 1) - tie_term / (n * (n - 1))))
+    mu = n1 * n2 / 2
+    if sigma == 0:
+        z, p = 0.0, 1.0
+    else:
+        z = (u_candidate - mu - 0.5 * np.sign(u_candidate - mu)) / sigma
+        p = math.erfc(abs(z) / math.sqrt(2))
+    return {
+        "u_statistic": float(u_candidate),
+        "z": float(z),
+        "p_value": float(p),
+        # Probability that a random candidate request is slower than a baseline one
+        "prob_candidate_slower": float(u_candidate / (n1 * n2)),
+    }
+
+
+def compare_latency(baseline, candidate, n_boot=10_000, confidence=0.95,
+                    threshold_pct=5.0, alpha=0.05, seed=0):
+    """
+    Compare two latency samples: bootstrap CIs on p50/p95 (and their relative
+    change) plus a Mann-Whitney test. A quantile is flagged as a regression when
+    its relative increase exceeds ``threshold_pct``, the CI of the change lies
+    entirely above zero and the Mann-Whitney p-value is below ``alpha``.
+    """
+    base = np.sort(np.asarray(baseline, dtype=float))
+    cand = np.sort(np.asarray(candidate, dtype=float))
+    if len(base) < 2 or len(cand) < 2:
+        raise ValueError("Need at least 2 samples on each side")
+
+    rng = np.random.default_rng(seed)
+    lo, hi = (1 - confidence) / 2 * 100, (1 + confidence) / 2 * 100
+    test = mann_whitney(base, cand)
+
+    metrics, regressions = {}, []
+    for name, q in QUANTILES.items():
+        base_boot = bootstrap_quantile(base, q, n_boot, rng)
+        cand_boot = bootstrap_quantile(cand, q, n_boot, rng)
+        rel_boot = (cand_boot / base_boot - 1) * 100
+        base_q = float(np.quantile(base, q, method="inverted_cdf"))
+        cand_q = float(np.quantile(cand, q, method="inverted_cdf"))
+        change_pct = (cand_q / base_q - 1) * 100 if base_q else float("nan")
+        rel_ci = np.percentile(rel_boot, [lo, hi])
+
+        regressed = bool(change_pct > threshold_pct and rel_ci[0] > 0 and test["p_value"] < alpha)
+        if regressed:
+            regressions.append(name)
+        metrics[name] = {
+            "baseline": base_q,
+            "baseline_ci": np.percentile(base_boot, [lo, hi]).tolist(),
+            "candidate": cand_q,
+            "candidate_ci": np.percentile(cand_boot, [lo, hi]).tolist(),
+            "change_pct": change_pct,
+            "change_pct_ci": rel_ci.tolist(),
+            "regression": regressed,
+        }
+
+    return {
+        "n_baseline": int(len(base)),
+        "n_candidate": int(len(cand)),
+        "n_boot": n_boot,
+        "confidence": confidence,
+        "threshold_pct": threshold_pct,
+        "alpha": alpha,
+        "metrics": metrics,
+        "mann_whitney": test,
+        "regression": bool(regressions),
+        "regressed_metrics": regressions,
+    }
+
+
+# ---------------------------------------------------------------------------
+# Thermal / battery-aware normalization
+# ---------------------------------------------------------------------------
+
+THERMAL_LEVELS = {0: "nominal", 1: "fair", 2: "serious", 3: "critical"}
+PHASE_COLUMNS = ["run_id", "request_id", "model_name", "device_model",
+                 "latency_ms", "device_temperature", "battery_percentage"]
+
+
+def load_frame(columns=PHASE_COLUMNS, run_ids=None, models=None, view=None):
+    """
+    Read only ``columns`` of the rows matching ``run_ids`` / ``models`` (chunked;
+    segments whose manifest lists none of ``run_ids`` are skipped unread)
+    """
+    run_ids = [str(r) for r in run_ids] if run_ids else None
+
+    def segment_filter(entry):
+        return not run_ids or not entry.get("run_ids") or bool(set(entry["run_ids"]) & set(run_ids))
+
+    needed = set(columns) | ({"run_id"} if run_ids else set()) | ({"model_name"} if models else set())
+    frames = []
+    for chunk in log_store.iter_log_chunks(segment_filter=segment_filter, columns=needed, view=view):
+        chunk = normalize_chunk(chunk)
+        if run_ids:
+            chunk = chunk[chunk["run_id"].isin(run_ids).fillna(False).astype(bool)]
+        if models:
+            chunk = chunk[chunk["model_name"].isin(models).fillna(False).astype(bool)]
+        frames.append(chunk[columns])
+    return pd.concat(frames, ignore_index=True)
+
+
+def annotate_thermal_phases(df, window=5, warmup_tol=0.15, max_warmup_frac=0.1,
+                            throttle_level=2, sustain=3):
+    """
+    Label every request of every run as ``warmup``, ``steady`` or ``throttled``.
+
+    - warm-up: the leading requests whose latency is more than ``warmup_tol``
+      away from the median of the next ``window`` requests (cold caches, model
+      load), capped at ``max_warmup_frac`` of the run;
+    - throttling onset: first request from which ``device_temperature`` stays at
+      or above ``throttle_level`` for ``sustain`` consecutive requests.
+    All steps are grouped rolling / cumulative operations over the whole frame.
+    """
+    df = df.copy()
+    df["ts"] = pd.to_numeric(df["request_id"], errors="coerce")
+    df = df.sort_values(["run_id", "ts"], kind="stable").reset_index(drop=True)
+    g = df.groupby("run_id", sort=False)
+    pos = g.cumcount()
+    size = g["latency_ms"].transform("size")
+
+    # Median of the *next* `window` requests: rolling over the reversed run
+    rev = df.iloc[::-1]
+    ahead = (
+        rev.groupby("run_id", sort=False)["latency_ms"].shift(1)
+        .groupby(rev["run_id"], sort=False).rolling(window, min_periods=1).median()
+        .droplevel(0).reindex(df.index)
+    )
+    off = ((df["latency_ms"] / ahead - 1).abs() > warmup_tol) & ahead.notna()
+    # Warm-up only while every request so far was off the forward median
+    leading_off = off.astype(int).groupby(df["run_id"], sort=False).cummin().astype(bool)
+    warmup = leading_off & (pos < (size * max_warmup_frac).clip(lower=1))
+
+    # Rows without a temperature (optional field) never count as throttled
+    hot = (df["device_temperature"] >= throttle_level).fillna(False).astype(int)
+    # Hot for the next `sustain` requests: the last ones of a run, with fewer
+    # requests left than that, cannot start throttling
+    hot_ahead = (
+        hot.iloc[::-1].groupby(rev["run_id"], sort=False).rolling(sustain, min_periods=sustain).min()
+        .droplevel(0).reindex(df.index)
+    )
+    sustained = hot_ahead == 1
+    throttled = sustained.astype(int).groupby(df["run_id"], sort=False).cummax().astype(bool)
+
+    df["phase"] = "steady"
+    df.loc[throttled, "phase"] = "throttled"
+    df.loc[warmup & ~throttled, "phase"] = "warmup"
+    return df
+
+
+def _quantiles(series):
+    if series.empty:
+        return {"count": 0, "p50": None, "p95": None, "mean": None}
+    return {
+        "count": int(len(series)),
+        "p50": float(series.quantile(0.5)),
+        "p95": float(series.quantile(0.95)),
+        "mean": float(series.mean()),
+    }
+
+
+def thermal_summary(df, **phase_kwargs):
+    """Per-run phases, steady-state latency and latency per thermal level (+ per model)"""
+    df = annotate_thermal_phases(df, **phase_kwargs)
+    steady = df[df["phase"] == "steady"]
+
+    # Latency sensitivity to battery level during steady state: cov / var per run
+    b = steady["battery_percentage"]
+    l = steady["latency_ms"]
+    sums = pd.DataFrame({"run_id": steady["run_id"], "b": b, "l": l, "bl": b * l, "bb": b * b}).dropna()
+    agg = sums.groupby("run_id").agg(n=("b", "size"), b=("b", "sum"), l=("l", "sum"), bl=("bl", "sum"), bb=("bb", "sum"))
+    var_b = agg["bb"] / agg["n"] - (agg["b"] / agg["n"]) ** 2
+    cov_bl = agg["bl"] / agg["n"] - (agg["b"] / agg["n"]) * (agg["l"] / agg["n"])
+    battery_slope = (cov_bl / var_b).where(var_b > 1e-9)
+
+    runs = []
+    for run_id, sub in df.groupby("run_id", sort=False):
+        warm = sub[sub["phase"] == "warmup"]
+        hot = sub[sub["phase"] == "throttled"]
+        run_steady = sub[sub["phase"] == "steady"]["latency_ms"]
+        steady_p50 = run_steady.median() if not run_steady.empty else None
+        slope = battery_slope.get(run_id)
+        runs.append({
+            "run_id": run_id,
+            "model_name": sub["model_name"].mode().iloc[0] if sub["model_name"].notna().any() else None,
+            "device_model": sub["device_model"].mode().iloc[0] if sub["device_model"].notna().any() else None,
+            "requests": int(len(sub)),
+            "warmup_requests": int(len(warm)),
+            "warmup_end_request_id": warm["request_id"].iloc[-1] if not warm.empty else None,
+            "throttle_onset_request_id": hot["request_id"].iloc[0] if not hot.empty else None,
+            "steady_state": _quantiles(run_steady),
+            "throttled": _quantiles(hot["latency_ms"]),
+            "throttle_slowdown_pct": (
+                float(hot["latency_ms"].median() / steady_p50 - 1) * 100
+                if steady_p50 and not hot.empty else None
+            ),
+            "battery_slope_ms_per_pct": float(slope) if slope is not None and pd.notna(slope) else None,
+            "by_thermal_level": {
+                THERMAL_LEVELS.get(int(level), str(level)): _quantiles(grp["latency_ms"])
+                for level, grp in sub.groupby("device_temperature")
+            },
+        })
+
+    models = []
+    for model, sub in df.groupby("model_name"):
+        models.append({
+            "model_name": model,
+            "steady_state": _quantiles(sub[sub["phase"] == "steady"]["latency_ms"]),
+            "by_thermal_level": {
+                THERMAL_LEVELS.get(int(level), str(level)): _quantiles(grp["latency_ms"])
+                for level, grp in sub.groupby("device_temperature")
+            },
+        })
+    return {"runs": runs, "models": models}
+
+
+# Additive parts of latency_ms: preprocessing + prefill + rest of TTFT + decode
+STAGES = ("image_preprocess_ms", "prefill_ms", "first_token_other_ms", "decode_ms")
+STAGE_GROUPS = ("model_name", "device_model", "app_version", "run_id")
+STAGE_FRAME_COLUMNS = ["run_id", "model_name", "device_model", "app_version", "latency_ms"] + log_store.STAGE_COLUMNS
+
+
+def _optional_float(value):
+    return float(value) if value is not None and pd.notna(value) else None
+
+
+def stage_breakdown(df, group_by=("model_name", "device_model")):
+    """
+    Where the latency of each group goes. Requests that report ``ttft_ms`` are
+    split into image preprocessing, prefill, the rest of the time to first
+    token and decode (``latency_ms - ttft_ms``); stage means add up to the mean
+    latency, so ``share_pct`` says how much a stage-specific optimization can
+    save at most (halving a stage saves ``share_pct / 2``).
+    """
+    for col in group_by:
+        if col not in STAGE_GROUPS:
+            raise ValueError(f"group_by must be among {STAGE_GROUPS}")
+    group_by = list(group_by)
+    df = df.assign(
+        decode_ms=(df["latency_ms"] - df["ttft_ms"]).clip(lower=0),
+        first_token_other_ms=(
+            df["ttft_ms"] - df["image_preprocess_ms"].fillna(0) - df["prefill_ms"].fillna(0)
+        ).clip(lower=0),
+    )
+
+    groups = []
+    for key, sub in df.groupby(group_by, dropna=False) if group_by else [((), df)]:
+        key = key if isinstance(key, tuple) else (key,)
+        timed = sub[sub["ttft_ms"].notna() & sub["latency_ms"].notna()]
+        latency_mean = timed["latency_ms"].mean() if not timed.empty else None
+        stages = {}
+        for stage in STAGES:
+            values = timed[stage].dropna()
+            # Stages a client does not report at all are left out, not counted as 0
+            if values.empty:
+                continue
+            mean = timed[stage].fillna(0).mean()
+            stages[stage] = {
+                **_quantiles(values),
+                "share_pct": float(mean / latency_mean * 100) if latency_mean else None,
+            }
+        bottleneck = max(stages, key=lambda s: stages[s]["share_pct"] or 0) if stages else None
+        groups.append({
+            **{col: (None if pd.isna(value) else value) for col, value in zip(group_by, key)},
+            "requests": int(len(sub)),
+            "with_stages": int(len(timed)),
+            "latency_ms": _quantiles(timed["latency_ms"] if not timed.empty else sub["latency_ms"].dropna()),
+            "stages": stages,
+            "bottleneck": bottleneck,
+            "decode_tokens_per_s": _quantiles(sub["decode_tokens_per_s"].dropna()),
+            "ttft_ms": _quantiles(sub["ttft_ms"].dropna()),
+            "prompt_tokens_mean": _optional_float(sub["prompt_tokens"].mean()),
+            "output_tokens_mean": _optional_float(sub["output_tokens"].mean()),
+            "peak_memory_mb_max": _optional_float(sub["peak_memory_mb"].max()),
+        })
+    return {"group_by": group_by, "stages": list(STAGES), "groups": groups}
@@ -1,18 +1,62 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from pydantic import BaseModel, TypeAdapter, ValidationError
 from typing import Optional
+from typing_extensions import NotRequired, TypedDict
 from datetime import datetime
-import csv
+import asyncio
+import json
 import os
+import time
 from pathlib import Path
 
+import alerts
+import analysis
+import crash_index
+import cube
+import export
+import log_store
+import sampling
+import snapshot
+import timeline
+from log_store import CSV_FILE, ensure_csv_exists
+from ingest import STREAM_FLUSH_ROWS, DecompressingRoute, iter_ndjson_lines
+
 # Initialize FastAPI app
 app = FastAPI(
     title="Latency Logger API",
     description="API để thu thập và lưu logs latency vào CSV",
     version="1.0.0"
 )
+# Accept gzip / deflate / zstd compressed request bodies on every route
+app.router.route_class = DecompressingRoute
+
+class ServerTimingMiddleware:
+    """Report server-side time (until the response starts) as X-Process-Time / Server-Timing, in ms"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        start = time.perf_counter()
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                elapsed = f"{(time.perf_counter() - start) * 1000:.3f}".encode()
+                message = {**message, "headers": [
+                    *message.get("headers", []),
+                    (b"x-process-time", elapsed),
+                    (b"server-timing", b"app;dur=" + elapsed),
+                ]}
+            await send(message)
+
+        await self.app(scope, receive, send_with_timing)
+
+app.add_middleware(ServerTimingMiddleware)
 
 # Add CORS middleware
 from fastapi.middleware.cors import CORSMiddleware
@@ -22,6 +66,7 @@ app.add_middleware(
     allow_credentials=False,
     allow_methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"],
     allow_headers=["*"],
+    expose_headers=["X-Process-Time", "Server-Timing"],
 )
 
 # Data models
@@ -38,61 +83,201 @@ class LatencyLog(BaseModel):
     user_feedback: Optional[str] = None  # "up", "down"
     device_temperature: Optional[int] = None  # 0: nominal, 1: fair, 2: serious, 3: critical
     battery_percentage: Optional[float] = None  # 0-100
+    # Optional per-stage breakdown of latency_ms
+    image_preprocess_ms: Optional[float] = None  # image decode / resize / encode
+    prefill_ms: Optional[float] = None  # prompt (+ image tokens) prefill
+    ttft_ms: Optional[float] = None  # time to first token, from request start
+    decode_tokens_per_s: Optional[float] = None
+    prompt_tokens: Optional[int] = None
+    output_tokens: Optional[int] = None
+    peak_memory_mb: Optional[float] = None
+
+class LatencyLogRow(TypedDict):
+    """Same schema as LatencyLog, validated straight into plain dicts (fast path)"""
+    run_id: str
+    request_id: str
+    model_name: str
+    latency_ms: float
+    device_model: str
+    app_version: str
+    crash_log: NotRequired[Optional[str]]
+    user_feedback: NotRequired[Optional[str]]
+    device_temperature: NotRequired[Optional[int]]
+    battery_percentage: NotRequired[Optional[float]]
+    image_preprocess_ms: NotRequired[Optional[float]]
+    prefill_ms: NotRequired[Optional[float]]
+    ttft_ms: NotRequired[Optional[float]]
+    decode_tokens_per_s: NotRequired[Optional[float]]
+    prompt_tokens: NotRequired[Optional[int]]
+    output_tokens: NotRequired[Optional[int]]
+    peak_memory_mb: NotRequired[Optional[float]]
+
+# Compiled validators: parse raw JSON bytes without building one model per record
+ROW_ADAPTER = TypeAdapter(LatencyLogRow)
+ROWS_ADAPTER = TypeAdapter(list[LatencyLogRow])
 
 class LatencyLogResponse(BaseModel):
     """Response model"""
     message: str
     data: LatencyLog
 
-# Configuration
-CSV_FILE = "latency_logs.csv"
-CSV_HEADERS = [
-    "run_id",
-    "request_id",
-    "model_name",
-    "latency_ms",
-    "device_model",
-    "app_version",
-    "crash_log",
-    "user_feedback",
-    "device_temperature",
-    "battery_percentage",
-]
-
-def ensure_csv_exists():
-    """Ensure CSV file exists with headers"""
-    if not os.path.exists(CSV_FILE):
-        with open(CSV_FILE, 'w', newline='') as f:
-            writer = csv.DictWriter(f, fieldnames=CSV_HEADERS)
-            writer.writeheader()
+def log_to_row(log: LatencyLog):
+    """Convert a log entry to a CSV row dict"""
+    return {
+        "run_id": log.run_id,
+        "request_id": log.request_id,
+        "model_name": log.model_name,
+        "latency_ms": log.latency_ms,
+        "device_model": log.device_model,
+        "app_version": log.app_version,
+        "crash_log": log.crash_log or "",
+        "user_feedback": log.user_feedback or "",
+        "device_temperature": log.device_temperature if log.device_temperature is not None else "",
+        "battery_percentage": log.battery_percentage if log.battery_percentage is not None else "",
+        **{col: getattr(log, col) if getattr(log, col) is not None else "" for col in log_store.STAGE_COLUMNS},
+    }
+
+def run_history_reader(run_id):
+    """Capture the storage now; the returned function reads one run's latencies from it"""
+    view = log_store.capture_view()
+    return lambda: analysis.load_frame(["request_id", "latency_ms"], run_ids=[run_id], view=view)
+
+# Incremental per-run rolling stats / change points, built lazily per run
+timelines = timeline.TimelineCache(run_history_reader, lock=log_store.write_lock)
+
+def storage_reader(columns=None):
+    """Capture the storage now; the returned function yields its chunks (``columns`` only) without the lock"""
+    view = log_store.capture_view()
+    return lambda: log_store.iter_log_chunks(columns=columns, view=view)
+
+# Model x device x version x thermal aggregates, built lazily then kept up to date
+fleet_cube = cube.FleetCube(storage_reader, lock=log_store.write_lock)
+
+# Reservoir samples per (model, run) for approximate summaries, plus exact ones on demand
+samples = sampling.StratifiedSample(storage_reader, lock=log_store.write_lock)
+exact_summaries = sampling.ExactSummaries()
+
+# Rules checked on every ingested batch (rolling windows per model x device)
+alert_engine = alerts.AlertEngine()
+
+def publish_rows(rows: list[dict]):
+    """Write rows and feed the in-memory analytics, atomically w.r.t. other writers"""
+    with log_store.write_lock:
+        # Full crash text goes to the crash index; the rows keep its signature
+        rows = crash_index.index_rows(rows)
+        log_store.append_rows(rows)
+        timelines.observe(rows)
+        fleet_cube.observe(rows)
+        samples.observe(rows)
+        alert_engine.observe(rows)
+
+def forget_derived():
+    """Drop everything derived from stored rows; each structure is rebuilt lazily from storage"""
+    timelines.reset()
+    fleet_cube.reset()
+    samples.reset()
+    exact_summaries.clear()
+
+def segments_dropped(dropped: list[dict]):
+    """Retention hook: invalidate what was derived from the dropped segments' rows"""
+    if dropped:
+        forget_derived()
+        crash_index.forget_segments(dropped)
+
+def run_maintenance():
+    """One log maintenance pass, then invalidate what retention made stale"""
+    result = log_store.run_maintenance()
+    segments_dropped(result["dropped"])
+    return result
+
+def append_logs_to_csv(logs: list[LatencyLog]):
+    """Append log entries to the CSV file in a single write"""
+    try:
+        publish_rows([log_to_row(log) for log in logs])
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error writing to CSV: {str(e)}")
+
+def append_rows_to_csv(rows: list[dict]):
+    """Append validated row dicts (fast path) to the CSV file in a single write"""
+    try:
+        # csv writes None as an empty cell, so validated dicts go out as-is
+        publish_rows(rows)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error writing to CSV: {str(e)}")
+
+def ingest_json_rows(body):
+    """
+    Validate a JSON array body in one pass and write its rows. Returns the rows
+    and the CPU time both took on the calling thread (a threadpool worker).
+    """
+    start = time.thread_time()
+    rows = ROWS_ADAPTER.validate_json(body)
+    append_rows_to_csv(rows)
+    return rows, time.thread_time() - start
+
+def ingest_ndjson_lines(lines, first_line_no):
+    """
+    Validate a flushed block of NDJSON lines and write the valid rows. Returns
+    (rows written, [(line number, validation errors)] of the invalid lines).
+    """
+    rows, invalid = [], []
+    for line_no, line in enumerate(lines, first_line_no):
+        try:
+            rows.append(ROW_ADAPTER.validate_json(line))
+        except ValidationError as e:
+            invalid.append((line_no, e.errors(include_url=False)))
+    if rows:
+        append_rows_to_csv(rows)
+    return len(rows), invalid
 
 def append_log_to_csv(log: LatencyLog):
     """Append a log entry to the CSV file"""
-    ensure_csv_exists()
-    
+    append_logs_to_csv([log])
+
+async def maintenance_loop():
+    """Periodically rotate, compact and expire log segments"""
+    while True:
+        await asyncio.sleep(log_store.MAINTENANCE_INTERVAL_S)
+        try:
+            result = await run_in_threadpool(run_maintenance)
+            if result["rotated"] or result["compacted"] or result["dropped"]:
+                dropped = [seg["name"] for seg in result["dropped"]]
+                print(f"🗂️ Log maintenance: {dict(result, dropped=dropped)}")
+        except Exception as e:
+            print(f"⚠️ Log maintenance failed: {e}")
+
+async def snapshot_loop():
+    """Periodically publish the Arrow snapshot read by the dashboard"""
+    while True:
+        try:
+            meta = await run_in_threadpool(snapshot.publish)
+            if meta:
+                print(f"📸 Snapshot published: {meta['rows']} rows in {meta['build_ms']} ms")
+        except Exception as e:
+            print(f"⚠️ Snapshot publish failed: {e}")
+        await asyncio.sleep(snapshot.SNAPSHOT_INTERVAL_S)
+
+async def warm_samples():
+    """Build the reservoir samples in the background so the first approximate query is fast"""
     try:
-        with open(CSV_FILE, 'a', newline='') as f:
-            writer = csv.DictWriter(f, fieldnames=CSV_HEADERS)
-            writer.writerow({
-                "run_id": log.run_id,
-                "request_id": log.request_id,
-                "model_name": log.model_name,
-                "latency_ms": log.latency_ms,
-                "device_model": log.device_model,
-                "app_version": log.app_version,
-                "crash_log": log.crash_log or "",
-                "user_feedback": log.user_feedback or "",
-                "device_temperature": log.device_temperature if log.device_temperature is not None else "",
-                "battery_percentage": log.battery_percentage if log.battery_percentage is not None else "",
-            })
+        started = time.perf_counter()
+        await run_in_threadpool(samples.build)
+        print(f"🎲 Samples built in {time.perf_counter() - started:.1f} s")
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error writing to CSV: {str(e)}")
+        print(f"⚠️ Sample build failed: {e}")
 
 @app.on_event("startup")
 async def startup_event():
-    """Initialize CSV file on startup"""
+    """Recover the live file from the WAL, then initialize it"""
+    recovery = log_store.recover()
+    if recovery["replayed"] or recovery["wal_torn_bytes"]:
+        print(f"🩹 WAL recovery: {recovery}")
     ensure_csv_exists()
     print(f"✅ CSV file initialized: {CSV_FILE}")
+    asyncio.create_task(maintenance_loop())
+    if snapshot.SNAPSHOT_INTERVAL_S > 0:
+        asyncio.create_task(snapshot_loop())
+    asyncio.create_task(warm_samples())
 
 @app.get("/", tags=["Health"])
 async def root():
@@ -120,7 +305,8 @@ async def create_log(log: LatencyLog):
     - **app_version**: Application version
     """    
     try:
-        append_log_to_csv(log)
+        # The write waits for the storage lock: keep it off the event loop
+        await run_in_threadpool(append_log_to_csv, log)
         return {
             "message": "Log entry created successfully",
             "data": log
@@ -136,9 +322,8 @@ async def create_batch_logs(logs: list[LatencyLog]):
     Takes a list of log entries and saves all to CSV
     """
     try:
-        for log in logs:
-            append_log_to_csv(log)
-        
+        await run_in_threadpool(append_logs_to_csv, logs)
+
         return {
             "message": f"Successfully created {len(logs)} log entries",
             "count": len(logs)
@@ -146,21 +331,81 @@ async def create_batch_logs(logs: list[LatencyLog]):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/api/logs/batch/fast", tags=["Logging"])
+async def create_batch_logs_fast(request: Request):
+    """
+    High-throughput variant of `/api/logs/batch`
+
+    Same JSON array body and schema, but the whole batch is validated in one
+    compiled pass straight into dicts that are written as-is, instead of building
+    a `LatencyLog` object per record. Reports the CPU time per ingested row spent
+    validating and writing it (per-thread CPU, so concurrent requests do not
+    inflate it; receiving the body is not included).
+    """
+    body = await request.body()
+    try:
+        # Validating a large batch is CPU-bound: keep it off the event loop
+        rows, cpu_s = await run_in_threadpool(ingest_json_rows, body)
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=e.errors(include_url=False))
+    return {
+        "message": f"Successfully created {len(rows)} log entries",
+        "count": len(rows),
+        "cpu_us_per_row": cpu_s * 1e6 / len(rows) if rows else 0.0
+    }
+
+@app.post("/api/logs/stream", tags=["Logging"])
+async def create_stream_logs(request: Request):
+    """
+    Stream log entries as NDJSON (one JSON object per line)
+
+    The body may be gzip/deflate/zstd compressed (`Content-Encoding`). Lines are
+    parsed and written incrementally as they arrive, so memory stays flat for
+    uploads of any size. Invalid lines are skipped and reported.
+    """
+    buffer, accepted, rejected, errors = [], 0, 0, []
+    line_no = 0
+
+    async def flush():
+        nonlocal accepted, rejected
+        # Lines are validated with the write, in the threadpool, a block at a time
+        written, invalid = await run_in_threadpool(ingest_ndjson_lines, buffer, line_no - len(buffer) + 1)
+        accepted += written
+        rejected += len(invalid)
+        for number, error in invalid[:20 - len(errors)]:
+            errors.append({"line": number, "error": error})
+
+    try:
+        async for line in iter_ndjson_lines(request):
+            line_no += 1
+            buffer.append(line)
+            if len(buffer) >= STREAM_FLUSH_ROWS:
+                await flush()
+                buffer = []
+        if buffer:
+            await flush()
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    return {
+        "message": f"Successfully created {accepted} log entries",
+        "count": accepted,
+        "rejected": rejected,
+        "errors": errors
+    }
+
 @app.get("/api/logs/count", tags=["Statistics"])
 async def get_logs_count():
     """
     Get total number of logs in CSV file
     """
-    ensure_csv_exists()
-    
     try:
-        with open(CSV_FILE, 'r') as f:
-            # Count lines minus 1 for header
-            count = sum(1 for _ in f) - 1
-        
         return {
-            "total_logs": count,
-            "csv_file": CSV_FILE
+            "total_logs": log_store.count_logs(),
+            "csv_file": CSV_FILE,
+            "segments": len(log_store.list_segments())
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -170,42 +415,362 @@ async def get_statistics():
     """
     Get statistics from logs
     """
-    ensure_csv_exists()
-    
     try:
-        import pandas as pd
-        df = pd.read_csv(CSV_FILE)
-        
-        if df.empty:
-            return {
-                "total_records": 0,
-                "stats": "No data available"
-            }
-        
+        return await run_in_threadpool(log_store.log_statistics)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/stats/summary", tags=["Statistics"])
+async def summary_statistics(
+    mode: str = Query("approx", pattern="^(approx|exact)$"),
+    model: Optional[list[str]] = Query(None),
+    device: Optional[list[str]] = Query(None),
+    version: Optional[list[str]] = Query(None),
+    feedback: Optional[list[str]] = Query(None),
+    temperature: Optional[list[int]] = Query(None),
+    battery_min: Optional[float] = None,
+    battery_max: Optional[float] = None,
+    run_id: Optional[list[str]] = Query(None),
+    start_ms: Optional[int] = None,
+    end_ms: Optional[int] = None,
+    only_crashed: bool = False,
+    confidence: float = Query(0.95, gt=0, lt=1),
+    background: bool = True
+):
+    """
+    Headline metrics and per-model table of the filtered logs (same filters as `/api/export`)
+
+    - **mode=approx**: estimated from stratified reservoir samples kept per
+      (model, run) at ingest, with **confidence** bounds; cost independent of the
+      log size. `exact` is true when the samples hold every row. `background`
+      carries the latest exact summary for these filters (`stale` if rows arrived
+      since) and, unless **background** is false, queues a new one when needed
+    - **mode=exact**: scan the filtered logs now
+    """
+    filters = {
+        "models": model,
+        "devices": device,
+        "versions": version,
+        "feedback": feedback,
+        "temperatures": temperature,
+        "battery_min": battery_min,
+        "battery_max": battery_max,
+        "run_ids": run_id,
+        "start_ms": start_ms,
+        "end_ms": end_ms,
+        "only_crashed": only_crashed,
+    }
+    try:
+        if mode == "exact":
+            entry = await run_in_threadpool(exact_summaries.compute, filters, samples.version)
+            if entry["status"] == "failed":
+                raise HTTPException(status_code=500, detail=entry["error"])
+            return {"mode": "exact", **entry["result"]}
+        approx = await run_in_threadpool(samples.estimate, filters, confidence)
         return {
-            "runs": df["run_id"].unique().tolist(),
-            "total_records": len(df),
-            "avg_latency_ms": float(df['latency_ms'].mean()),
-            "min_latency_ms": float(df['latency_ms'].min()),
-            "max_latency_ms": float(df['latency_ms'].max()),
-            "models": df['model_name'].unique().tolist(),
-            "devices": df['device_model'].unique().tolist(),
-            "versions": df['app_version'].unique().tolist()
+            "mode": "approx",
+            **approx,
+            "background": exact_summaries.lookup(filters, samples.version, background=background and not approx["exact"]),
         }
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/analysis/regression", tags=["Analysis"])
+async def detect_regression(
+    baseline: str,
+    candidate: str,
+    dimension: str = Query("run_id", pattern="^(run_id|app_version|model_name)$"),
+    threshold_pct: float = Query(5.0, ge=0),
+    n_boot: int = Query(10_000, ge=100, le=200_000),
+    confidence: float = Query(0.95, gt=0, lt=1),
+    alpha: float = Query(0.05, gt=0, lt=1),
+    seed: int = 0
+):
+    """
+    Compare latency of a candidate against a baseline
+
+    - **dimension**: what baseline/candidate identify (run_id, app_version or model_name)
+    - Bootstrap CIs on p50/p95 and their relative change, plus a Mann-Whitney U test
+    - A quantile is a regression when it got slower by more than **threshold_pct**,
+      its change CI excludes zero and the Mann-Whitney p-value is below **alpha**
+    """
+    try:
+        groups = await run_in_threadpool(analysis.load_latency_groups, dimension, [baseline, candidate])
+        result = await run_in_threadpool(
+            analysis.compare_latency, groups[baseline], groups[candidate],
+            n_boot, confidence, threshold_pct, alpha, seed
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    return {"dimension": dimension, "baseline": baseline, "candidate": candidate, **result}
+
+@app.get("/api/analysis/thermal", tags=["Analysis"])
+async def thermal_analysis(
+    run_id: Optional[list[str]] = Query(None),
+    model: Optional[list[str]] = Query(None),
+    warmup_window: int = Query(5, ge=1),
+    warmup_tol: float = Query(0.15, gt=0),
+    throttle_level: int = Query(2, ge=0, le=3),
+    sustain: int = Query(3, ge=1)
+):
+    """
+    Thermal / battery-aware latency per run and per model
+
+    Splits each run into warm-up, steady state and thermal throttling (first
+    request from which `device_temperature` stays >= **throttle_level** for
+    **sustain** requests), and reports steady-state latency, latency per thermal
+    level and the latency sensitivity to battery level
+    """
+    try:
+        df = await run_in_threadpool(analysis.load_frame, analysis.PHASE_COLUMNS, run_id, model)
+        if df.empty:
+            return {"runs": [], "models": []}
+        return await run_in_threadpool(
+            lambda: analysis.thermal_summary(
+                df, window=warmup_window, warmup_tol=warmup_tol,
+                throttle_level=throttle_level, sustain=sustain
+            )
+        )
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/api/analysis/stages", tags=["Analysis"])
+async def stage_analysis(
+    run_id: Optional[list[str]] = Query(None),
+    model: Optional[list[str]] = Query(None),
+    device: Optional[list[str]] = Query(None),
+    group_by: list[str] = Query(["model_name", "device_model"])
+):
+    """
+    Latency breakdown by stage (image preprocessing, prefill, rest of TTFT,
+    decode) per **group_by** (model_name, device_model, app_version, run_id)
+
+    Uses the optional stage fields of each log; reports per-stage p50/p95/mean,
+    each stage's share of the mean latency, the bottleneck stage, decode
+    tokens/s, token counts and peak memory
+    """
+    try:
+        df = await run_in_threadpool(analysis.load_frame, analysis.STAGE_FRAME_COLUMNS, run_id, model)
+        if device:
+            df = df[df["device_model"].isin(device).fillna(False).astype(bool)]
+        return await run_in_threadpool(analysis.stage_breakdown, df, group_by)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/runs/{run_id}/timeline", tags=["Analysis"])
+async def run_timeline(run_id: str, since: int = Query(0, ge=0)):
+    """
+    Rolling p50/p95 (last N requests and last T seconds), EWMA and CUSUM change
+    points for one run
+
+    Maintained incrementally as rows are ingested; **since** returns only points
+    from that index on, so clients can poll for new data cheaply
+    """
+    try:
+        state = await run_in_threadpool(timelines.get, run_id)
+        return state.to_dict(since)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/cube", tags=["Analysis"])
+async def fleet_cube_pivot(
+    rows: str = Query("model", pattern="^(model|device|version|thermal)$"),
+    cols: str = Query("device", pattern="^(model|device|version|thermal)$"),
+    metric: str = Query("p95_latency_ms"),
+    model: Optional[list[str]] = Query(None),
+    device: Optional[list[str]] = Query(None),
+    version: Optional[list[str]] = Query(None),
+    temperature: Optional[list[int]] = Query(None)
+):
+    """
+    Pivot of the fleet cube: **metric** for every **rows** x **cols** combination
+
+    Served from precomputed model x device x version x thermal-level cells that
+    are updated at ingest, so the cost does not grow with the number of rows.
+    Device and version filters accept raw strings ("iPhone18,2", "Version 1.0
+    (Build 1)") or canonical names. Quantiles are within 1% (sketch accuracy)
+    """
+    filters = {"model": model, "device": device, "version": version, "thermal": temperature}
+    try:
+        return await run_in_threadpool(fleet_cube.pivot, rows, cols, metric, filters)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/dimensions", tags=["Analysis"])
+async def get_dimensions():
+    """
+    Canonical model / device / version / thermal values, their IDs and the raw
+    strings mapped to each
+    """
+    try:
+        return await run_in_threadpool(fleet_cube.dimensions)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/alerts", tags=["Alerts"])
+async def get_alerts(limit: int = Query(50, ge=1, le=alerts.ALERT_HISTORY)):
+    """
+    Alerts currently firing, the most recent firings / resolutions and the rules
+
+    Rules are evaluated incrementally on every ingested batch over the last N
+    requests of each model x device (see `ALERT_RULES_FILE`)
+    """
+    return {
+        "active": alert_engine.active(),
+        "recent": list(alert_engine.recent)[-limit:][::-1],
+        "rules": [rule.to_dict() for rule in alert_engine.rules],
+    }
+
+@app.get("/api/alerts/stream", tags=["Alerts"])
+async def stream_alerts(request: Request):
+    """
+    Server-Sent Events: one `alert` event per firing / resolution as it happens
+    """
+    loop = asyncio.get_running_loop()
+    q = alert_engine.sse.subscribe(loop)
+
+    async def events():
+        try:
+            yield ": connected\n\n"
+            while not await request.is_disconnected():
+                try:
+                    alert = await asyncio.wait_for(q.get(), timeout=15)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield f"event: alert\ndata: {json.dumps(alert)}\n\n"
+        finally:
+            alert_engine.sse.unsubscribe(loop, q)
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.get("/api/crashes/signatures", tags=["Crashes"])
+async def crash_signatures(
+    model: Optional[list[str]] = Query(None),
+    version: Optional[list[str]] = Query(None),
+    run_id: Optional[list[str]] = Query(None),
+    group_by: Optional[str] = Query(None, pattern="^(run_id|model_name|app_version|device_model)$"),
+    limit: int = Query(20, ge=1, le=1000)
+):
+    """
+    Top crash signatures with counts
+
+    Crashes with the same exception and top frames (addresses, offsets and
+    numbers stripped) share a signature. **group_by** splits the counts per
+    run, model, app version or device
+    """
+    filters = {"models": model, "versions": version, "run_ids": run_id}
+    try:
+        signatures = await run_in_threadpool(crash_index.top_signatures, filters, group_by, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    return {"group_by": group_by, "signatures": signatures}
+
+@app.get("/api/crashes/search", tags=["Crashes"])
+async def search_crashes(
+    q: Optional[str] = None,
+    model: Optional[list[str]] = Query(None),
+    version: Optional[list[str]] = Query(None),
+    run_id: Optional[list[str]] = Query(None),
+    signature: Optional[list[str]] = Query(None),
+    limit: int = Query(50, ge=1, le=1000)
+):
+    """
+    Full-text search over crash logs (SQLite FTS5 query syntax, e.g.
+    `EXC_BAD_ACCESS AND metal`); without **q** lists the latest matching crashes
+    """
+    filters = {"models": model, "versions": version, "run_ids": run_id, "signatures": signature}
+    try:
+        crashes = await run_in_threadpool(crash_index.search, q, filters, limit)
+    except crash_index.sqlite3.OperationalError as e:
+        # Malformed FTS query
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    return {"query": q, "count": len(crashes), "crashes": crashes}
+
+@app.post("/api/crashes/reindex", tags=["Crashes"])
+async def reindex_crashes():
+    """
+    Index crash logs still stored as full text in the logs and recompute all signatures
+    """
+    try:
+        return await run_in_threadpool(crash_index.reindex)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/export", tags=["Export"])
+async def export_logs(
+    format: str = Query("csv", pattern="^(csv|parquet)$"),
+    model: Optional[list[str]] = Query(None),
+    device: Optional[list[str]] = Query(None),
+    version: Optional[list[str]] = Query(None),
+    feedback: Optional[list[str]] = Query(None),
+    temperature: Optional[list[int]] = Query(None),
+    battery_min: Optional[float] = None,
+    battery_max: Optional[float] = None,
+    run_id: Optional[list[str]] = Query(None),
+    start_ms: Optional[int] = None,
+    end_ms: Optional[int] = None,
+    only_crashed: bool = False
+):
+    """
+    Stream a filtered subset of all logs (segments + live file) as CSV or Parquet
+
+    List filters are repeatable (`?model=a&model=b`). The time window applies to
+    `request_id` interpreted as a millisecond timestamp. Rows are read, filtered
+    and encoded chunk by chunk, never materialized in memory.
+    """
+    filters = {
+        "models": model,
+        "devices": device,
+        "versions": version,
+        "feedback": feedback,
+        "temperatures": temperature,
+        "battery_min": battery_min,
+        "battery_max": battery_max,
+        "run_ids": run_id,
+        "start_ms": start_ms,
+        "end_ms": end_ms,
+        "only_crashed": only_crashed,
+    }
+    if format == "parquet":
+        body, media_type = export.stream_parquet(filters), "application/vnd.apache.parquet"
+    else:
+        body, media_type = export.stream_csv(filters), "text/csv"
+    return StreamingResponse(
+        body,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="latency_logs_export.{format}"'}
+    )
+
 @app.delete("/api/logs/clear", tags=["Maintenance"])
 async def clear_logs():
     """
-    Clear all logs from CSV file (keeps headers)
+    Clear all logs from CSV file (keeps headers) and drop every segment
     """
+    def clear():
+        log_store.clear_all()
+        forget_derived()
+        alert_engine.reset()
+        crash_index.clear()
+
     try:
-        ensure_csv_exists()
-        with open(CSV_FILE, 'w', newline='') as f:
-            writer = csv.DictWriter(f, fieldnames=CSV_HEADERS)
-            writer.writeheader()
-        
+        # Clearing waits for the storage lock and deletes files: keep it off the event loop
+        await run_in_threadpool(clear)
+
         return {
             "message": "All logs cleared successfully",
             "csv_file": CSV_FILE
@@ -213,6 +778,81 @@ async def clear_logs():
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/api/logs/segments", tags=["Maintenance"])
+async def get_segments():
+    """
+    List rotated log segments (oldest first) and the ingestion WAL state
+    """
+    manifest = log_store.load_manifest()
+    return {
+        "active_since": manifest["active_since"],
+        "segments": manifest["segments"],
+        "wal": log_store.ingest_wal.stats()
+    }
+
+@app.post("/api/logs/rotate", tags=["Maintenance"])
+async def rotate_logs(force: bool = True):
+    """
+    Rotate the live CSV into an immutable segment
+
+    With `force=false` it only rotates when the size/age limit is reached
+    """
+    try:
+        entry = await run_in_threadpool(log_store.rotate, force)
+        return {"rotated": entry}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/snapshot", tags=["Maintenance"])
+async def get_snapshot():
+    """Metadata of the published Arrow snapshot"""
+    try:
+        info = await run_in_threadpool(snapshot.snapshot_info)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    if info is None:
+        raise HTTPException(status_code=404, detail="No snapshot published yet")
+    return info
+
+@app.post("/api/snapshot", tags=["Maintenance"])
+async def publish_snapshot():
+    """Publish a fresh Arrow snapshot now"""
+    try:
+        return await run_in_threadpool(snapshot.publish, True)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/api/logs/compact", tags=["Maintenance"])
+async def compact_logs(fmt: str = Query(log_store.COMPACT_FORMAT, pattern="^(parquet|csv.gz)$")):
+    """
+    Compact raw CSV segments into Parquet or gzip CSV
+    """
+    try:
+        compacted = await run_in_threadpool(log_store.compact_segments, fmt)
+        return {"compacted": compacted}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.delete("/api/logs/segments", tags=["Maintenance"])
+async def drop_segments(
+    older_than_days: Optional[float] = None,
+    run_id: Optional[list[str]] = Query(None)
+):
+    """
+    Drop whole segments by age or by run (the live file is never rewritten)
+
+    - **older_than_days**: drop segments whose newest row is older than this
+    - **run_id**: drop segments that only contain these runs (repeatable)
+    """
+    if older_than_days is None and not run_id:
+        raise HTTPException(status_code=400, detail="Specify older_than_days and/or run_id")
+    try:
+        dropped = await run_in_threadpool(log_store.apply_retention, older_than_days, run_id)
+        segments_dropped(dropped)
+        return {"dropped": [seg["name"] for seg in dropped]}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
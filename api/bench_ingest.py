@@ -0,0 +1,97 @@
+"""
+Benchmark CPU per ingested row: per-record Pydantic models vs the compiled fast path.
+
+Both paths write through ``publish_rows`` like the endpoints do (crash index,
+timelines, fleet cube, samples and alerts included, all built beforehand as on
+a running server). CPU is measured with ``time.thread_time()``, so background
+threads (WAL fsync, exact summaries) are not counted.
+
+Usage:
+    python bench_ingest.py --rows 100000 --repeat 3
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import tempfile
+import time
+
+# Write into a throwaway directory, never into the real log
+_tmp = tempfile.mkdtemp(prefix="bench_ingest_")
+os.environ["LATENCY_LOG_FILE"] = os.path.join(_tmp, "latency_logs.csv")
+os.environ["LATENCY_SEGMENT_DIR"] = os.path.join(_tmp, "log_segments")
+
+from pydantic import TypeAdapter  # noqa: E402
+
+import backend  # noqa: E402
+from backend import ROWS_ADAPTER, LatencyLog, log_to_row, publish_rows  # noqa: E402
+
+MODELS_ADAPTER = TypeAdapter(list[LatencyLog])
+
+
+def make_payload(n_rows):
+    rng = random.Random(0)
+    rows = [{
+        "run_id": "bench",
+        "request_id": str(1765787547979 + i * 1000),
+        "model_name": rng.choice(["SmolVLM-Instruct-4bit", "Qwen2.5-VL-3B-Instruct-4bit"]),
+        "latency_ms": rng.uniform(3000, 30000),
+        "device_model": "iPhone18,2",
+        "app_version": "Version 1.0 (Build 1)",
+        "crash_log": "",
+        "user_feedback": "",
+        "device_temperature": rng.randint(0, 3),
+        "battery_percentage": rng.uniform(10, 100),
+    } for i in range(n_rows)]
+    return json.dumps(rows).encode()
+
+
+def model_path(body):
+    """What /api/logs/batch does: one LatencyLog per record, then a dict per record"""
+    logs = MODELS_ADAPTER.validate_json(body)
+    publish_rows([log_to_row(log) for log in logs])
+    return len(logs)
+
+
+def fast_path(body):
+    """What /api/logs/batch/fast does: validate straight into dicts, write as-is"""
+    rows = ROWS_ADAPTER.validate_json(body)
+    publish_rows(rows)
+    return len(rows)
+
+
+def reset_server():
+    """Empty log, with every structure that publish_rows updates already built"""
+    asyncio.run(backend.clear_logs())
+    backend.fleet_cube.dimensions()
+    backend.samples.build()
+    backend.timelines.get("bench")
+
+
+def bench(fn, body, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        reset_server()
+        start = time.thread_time()
+        n = fn(body)
+        best = min(best, time.thread_time() - start)
+    return best * 1e6 / n
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    body = make_payload(args.rows)
+    print(f"📦 Payload: {args.rows} rows, {len(body) / 1e6:.1f} MB")
+    model_us = bench(model_path, body, args.repeat)
+    fast_us = bench(fast_path, body, args.repeat)
+    print(f"🐢 Pydantic models : {model_us:6.2f} µs CPU / row")
+    print(f"🚀 Fast path       : {fast_us:6.2f} µs CPU / row  ({model_us / fast_us:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
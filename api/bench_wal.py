@@ -0,0 +1,81 @@
+"""
+Benchmark ingestion throughput and append latency under each WAL fsync policy.
+
+Usage:
+    python bench_wal.py --rows 50000 --batch-size 100
+    python bench_wal.py --policies batch periodic --batch-size 1
+
+Every policy appends the same batches through ``log_store.append_rows`` (the
+write path of every ingestion endpoint) into a throwaway directory; ``off``
+is the baseline without a WAL. Put ``--dir`` on the disk the API really writes
+to: fsync cost depends entirely on the device.
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+import numpy as np
+
+# Write into a throwaway directory, never into the real log
+_tmp = tempfile.mkdtemp(prefix="bench_wal_")
+os.environ["LATENCY_LOG_FILE"] = os.path.join(_tmp, "latency_logs.csv")
+os.environ["LATENCY_SEGMENT_DIR"] = os.path.join(_tmp, "log_segments")
+
+import log_store  # noqa: E402
+from wal import FSYNC_POLICIES, WriteAheadLog  # noqa: E402
+
+
+def make_batches(n_rows, batch_size):
+    rng = random.Random(0)
+    rows = [{
+        "run_id": "bench",
+        "request_id": str(1765787547979 + i * 1000),
+        "model_name": rng.choice(["SmolVLM-Instruct-4bit", "Qwen2.5-VL-3B-Instruct-4bit"]),
+        "latency_ms": rng.uniform(3000, 30000),
+        "device_model": "iPhone18,2",
+        "app_version": "Version 1.0 (Build 1)",
+        "crash_log": "",
+        "user_feedback": "",
+        "device_temperature": rng.randint(0, 3),
+        "battery_percentage": rng.uniform(10, 100),
+    } for i in range(n_rows)]
+    return [rows[i:i + batch_size] for i in range(0, n_rows, batch_size)]
+
+
+def bench(policy, batches, interval_ms):
+    log_store.clear_all()
+    log_store.ingest_wal = WriteAheadLog(log_store.WAL_FILE, policy, interval_ms)
+    log_store.ingest_wal.reset()
+    latencies = []
+    start = time.perf_counter()
+    for batch in batches:
+        t0 = time.perf_counter()
+        log_store.append_rows(batch)
+        latencies.append((time.perf_counter() - t0) * 1000)
+    elapsed = time.perf_counter() - start
+    rows = sum(len(b) for b in batches)
+    p50, p99 = np.percentile(latencies, [50, 99])
+    return rows / elapsed, p50, p99, log_store.ingest_wal.fsyncs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=50_000)
+    parser.add_argument("--batch-size", type=int, default=100, help="rows per append (one request)")
+    parser.add_argument("--policies", nargs="+", choices=FSYNC_POLICIES, default=["off", "none", "periodic", "batch"])
+    parser.add_argument("--interval-ms", type=float, default=log_store.WAL_FSYNC_INTERVAL_MS,
+                        help="fsync interval of the periodic policy")
+    args = parser.parse_args()
+
+    batches = make_batches(args.rows, args.batch_size)
+    print(f"📦 {args.rows} rows in {len(batches)} appends of {args.batch_size} (logs in {_tmp})")
+    print(f"{'policy':<10} {'rows/s':>10} {'p50 ms':>8} {'p99 ms':>8} {'fsyncs':>7}")
+    for policy in args.policies:
+        rate, p50, p99, fsyncs = bench(policy, batches, args.interval_ms)
+        print(f"{policy:<10} {rate:>10,.0f} {p50:>8.3f} {p99:>8.3f} {fsyncs:>7}")
+
+
+if __name__ == "__main__":
+    main()
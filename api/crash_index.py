@@ -0,0 +1,332 @@
+"""
+Crash log index: normalized signatures and full-text search in SQLite FTS5.
+
+Crash logs are large free text next to small numeric columns. Their full text
+is stored here instead, keyed by (run_id, request_id); the latency rows only
+keep the short signature in ``crash_log``, so every analytical scan reads a few
+bytes per crash instead of a stack trace. A signature groups crashes that have
+the same exception and top frames once addresses, offsets, line numbers and
+other volatile tokens are stripped.
+"""
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+
+import log_store
+from export import normalize_chunk
+
+# Lives next to the segments (persistent volume); readers only follow the manifest
+CRASH_INDEX_DB = os.environ.get("CRASH_INDEX_DB", os.path.join(log_store.SEGMENT_DIR, "crash_index.sqlite"))
+# What the latency rows keep in crash_log: "signature" (default) or "full" text
+CRASH_LOG_IN_CSV = os.environ.get("CRASH_LOG_IN_CSV", "signature")
+SIGNATURE_FRAMES = int(os.environ.get("CRASH_SIGNATURE_FRAMES", "3"))
+GROUP_BY = ("run_id", "model_name", "app_version", "device_model")
+
+_SIGNATURE_RE = re.compile(r"^[0-9a-f]{12}$")
+_EXCEPTION_RE = re.compile(
+    r"\b(EXC_[A-Z_]+|SIG[A-Z]{2,}|[A-Za-z_][\w.]*(?:Error|Exception|Fault)|Fatal error|fatalError)\b"
+)
+# Apple crash report: "3   MyApp   0x0000000102a3c4d8 -[Foo bar:] + 123"
+_APPLE_FRAME_RE = re.compile(r"^\s*\d+\s+(\S+)\s+0x[0-9a-fA-F]+\s+(.+?)(?:\s+\+\s+\d+)?\s*$")
+# Python traceback: 'File "x.py", line 12, in func'
+_PY_FRAME_RE = re.compile(r'^\s*File "([^"]+)", line \d+, in (\S+)')
+_VOLATILE_RES = [
+    (re.compile(r"0x[0-9a-fA-F]+"), "<addr>"),
+    (re.compile(r"\b[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}\b"), "<uuid>"),
+    (re.compile(r"(['\"]).*?\1"), "<str>"),
+    (re.compile(r"\d+(\.\d+)?"), "<n>"),
+    (re.compile(r"\s+"), " "),
+]
+
+_lock = threading.RLock()
+_conn = None
+# Rows per transaction when reindexing: ingestion waits for _lock at most this long
+REINDEX_BATCH = 500
+
+
+def normalize_line(line):
+    for pattern, repl in _VOLATILE_RES:
+        line = pattern.sub(repl, line)
+    return line.strip()
+
+
+def crash_signature(text):
+    """Return (signature, exception, top_frame) for one crash log"""
+    lines = [l for l in str(text).splitlines() if l.strip()]
+    match = _EXCEPTION_RE.search(str(text))
+    exception = match.group(1) if match else None
+
+    frames, py_frames = [], []
+    for line in lines:
+        apple, py = _APPLE_FRAME_RE.match(line), _PY_FRAME_RE.match(line)
+        if apple:
+            frames.append(f"{apple.group(1)} {normalize_line(apple.group(2))}")
+        elif py:
+            py_frames.append(f"{os.path.basename(py.group(1))}:{py.group(2)}")
+    # Python prints the innermost frame last
+    frames += py_frames[::-1]
+    # Without recognizable frames, the first normalized lines are the best key
+    key_parts = frames[:SIGNATURE_FRAMES] or [normalize_line(l) for l in lines[:SIGNATURE_FRAMES]]
+    digest = hashlib.sha1("\n".join([exception or ""] + key_parts).encode()).hexdigest()[:12]
+    return digest, exception, frames[0] if frames else (normalize_line(lines[0])[:200] if lines else None)
+
+
+def is_signature(value):
+    return bool(_SIGNATURE_RE.match(str(value)))
+
+
+def _connect():
+    global _conn
+    if _conn is None:
+        os.makedirs(os.path.dirname(CRASH_INDEX_DB) or ".", exist_ok=True)
+        conn = sqlite3.connect(CRASH_INDEX_DB, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS signatures (
+                signature TEXT PRIMARY KEY, exception TEXT, top_frame TEXT,
+                first_seen REAL, last_seen REAL
+            );
+            CREATE TABLE IF NOT EXISTS crashes (
+                id INTEGER PRIMARY KEY, run_id TEXT, request_id TEXT, model_name TEXT,
+                device_model TEXT, app_version TEXT, signature TEXT, crash_log TEXT,
+                UNIQUE (run_id, request_id)
+            );
+            CREATE INDEX IF NOT EXISTS crashes_signature ON crashes (signature);
+            CREATE VIRTUAL TABLE IF NOT EXISTS crash_fts USING fts5(
+                crash_log, content='crashes', content_rowid='id'
+            );
+        """)
+        _conn = conn
+    return _conn
+
+
+def _insert(conn, row, text, now, parsed=None):
+    """Store one crash; ``parsed`` is its ``crash_signature`` when already computed"""
+    signature, exception, top_frame = parsed or crash_signature(text)
+    conn.execute(
+        "INSERT INTO signatures VALUES (?, ?, ?, ?, ?) "
+        "ON CONFLICT (signature) DO UPDATE SET last_seen = excluded.last_seen",
+        (signature, exception, top_frame, now, now),
+    )
+    key = (str(row.get("run_id")), str(row.get("request_id")))
+    old = conn.execute("SELECT id, crash_log FROM crashes WHERE run_id = ? AND request_id = ?", key).fetchone()
+    if old:
+        # Keep the external-content FTS table in sync: delete the old tokens first
+        conn.execute("INSERT INTO crash_fts (crash_fts, rowid, crash_log) VALUES ('delete', ?, ?)", old)
+        conn.execute("DELETE FROM crashes WHERE id = ?", (old[0],))
+    cur = conn.execute(
+        "INSERT INTO crashes (run_id, request_id, model_name, device_model, app_version, signature, crash_log) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?)",
+        (*key, row.get("model_name"), row.get("device_model"), row.get("app_version"), signature, text),
+    )
+    conn.execute("INSERT INTO crash_fts (rowid, crash_log) VALUES (?, ?)", (cur.lastrowid, text))
+    return signature
+
+
+def index_rows(rows):
+    """
+    Index the crash logs of freshly ingested rows. Returns the rows to store,
+    with ``crash_log`` replaced by its signature (unless CRASH_LOG_IN_CSV=full).
+    """
+    crashed = [i for i, row in enumerate(rows) if row.get("crash_log") and not is_signature(row["crash_log"])]
+    if not crashed:
+        return rows
+    rows = list(rows)
+    now = time.time()
+    with _lock:
+        conn = _connect()
+        with conn:
+            for i in crashed:
+                signature = _insert(conn, rows[i], rows[i]["crash_log"], now)
+                if CRASH_LOG_IN_CSV == "signature":
+                    rows[i] = {**rows[i], "crash_log": signature}
+    return rows
+
+
+def _batches(items, size=REINDEX_BATCH):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _full_text_crashes():
+    """(row, crash_signature) of crash logs still stored as full text, parsed without the lock"""
+    for chunk in log_store.iter_log_chunks():
+        chunk = normalize_chunk(chunk)
+        chunk = chunk[chunk["crash_log"].fillna("") != ""]
+        for row in chunk.to_dict("records"):
+            if not is_signature(row["crash_log"]):
+                yield row, crash_signature(row["crash_log"])
+
+
+def _stored_crashes():
+    """(id, crash_signature) of every indexed crash, read in batches that each take the lock briefly"""
+    last_id = 0
+    while True:
+        with _lock:
+            rows = _connect().execute(
+                "SELECT id, crash_log FROM crashes WHERE id > ? ORDER BY id LIMIT ?", (last_id, REINDEX_BATCH)
+            ).fetchall()
+        if not rows:
+            return
+        last_id = rows[-1][0]
+        for crash_id, text in rows:
+            yield crash_id, crash_signature(text)
+
+
+def reindex():
+    """
+    Index crash logs still stored as full text in segments / the live file and
+    recompute every signature (e.g. after the normalization rules changed).
+    Signatures already written to the latency rows are left as they are; the
+    index is what crash grouping reads. Logs are scanned and parsed without the
+    lock; it is only held to write each batch, so ingestion keeps going.
+    """
+    now = time.time()
+    added = 0
+    for batch in _batches(_full_text_crashes()):
+        with _lock:
+            conn = _connect()
+            with conn:
+                for row, parsed in batch:
+                    _insert(conn, row, row["crash_log"], now, parsed)
+        added += len(batch)
+
+    signatures = {}
+    for batch in _batches(_stored_crashes()):
+        with _lock:
+            conn = _connect()
+            with conn:
+                for crash_id, (signature, exception, top_frame) in batch:
+                    signatures.setdefault(signature, (exception, top_frame))
+                    conn.execute("UPDATE crashes SET signature = ? WHERE id = ?", (signature, crash_id))
+    with _lock:
+        conn = _connect()
+        with conn:
+            conn.execute("DELETE FROM signatures WHERE signature NOT IN (SELECT signature FROM crashes)")
+            for signature, (exception, top_frame) in signatures.items():
+                conn.execute(
+                    "INSERT INTO signatures VALUES (?, ?, ?, ?, ?) ON CONFLICT (signature) DO NOTHING",
+                    (signature, exception, top_frame, now, now),
+                )
+    return {"indexed_from_logs": added, "crashes": count(), "signatures": len(signatures)}
+
+
+def count():
+    with _lock:
+        return _connect().execute("SELECT COUNT(*) FROM crashes").fetchone()[0]
+
+
+def _where(filters):
+    clauses, params = [], []
+    for col, key in (("run_id", "run_ids"), ("model_name", "models"),
+                     ("app_version", "versions"), ("c.signature", "signatures")):
+        if filters.get(key):
+            clauses.append(f"{col} IN ({', '.join('?' * len(filters[key]))})")
+            params.extend(str(v) for v in filters[key])
+    return clauses, params
+
+
+def top_signatures(filters, group_by=None, limit=20):
+    """Most frequent signatures (optionally per run / model / version) with counts"""
+    if group_by is not None and group_by not in GROUP_BY:
+        raise ValueError(f"group_by must be one of {GROUP_BY}")
+    clauses, params = _where(filters)
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    group_col = f"c.{group_by}, " if group_by else ""
+    sql = f"""
+        SELECT {group_col}c.signature, s.exception, s.top_frame, COUNT(*) AS count,
+               COUNT(DISTINCT c.run_id) AS runs, s.first_seen, s.last_seen,
+               MIN(c.request_id) AS first_request_id, MAX(c.request_id) AS last_request_id
+        FROM crashes c JOIN signatures s ON s.signature = c.signature
+        {where}
+        GROUP BY {group_col}c.signature
+        ORDER BY count DESC
+        LIMIT ?
+    """
+    with _lock:
+        cur = _connect().execute(sql, (*params, limit))
+        columns = [d[0] for d in cur.description]
+        return [dict(zip(columns, row)) for row in cur.fetchall()]
+
+
+def search(query, filters, limit=50):
+    """Full-text search (FTS5 query syntax); without ``query`` just lists matching crashes"""
+    clauses, params = _where(filters)
+    if query:
+        clauses.insert(0, "crash_fts MATCH ?")
+        params.insert(0, query)
+        source = "crash_fts JOIN crashes c ON c.id = crash_fts.rowid"
+        snippet, order = "snippet(crash_fts, 0, '[', ']', '…', 16)", "rank"
+    else:
+        source, snippet, order = "crashes c", "substr(c.crash_log, 1, 200)", "c.id DESC"
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    sql = f"""
+        SELECT c.run_id, c.request_id, c.model_name, c.device_model, c.app_version,
+               c.signature, {snippet} AS snippet, c.crash_log
+        FROM {source} {where}
+        ORDER BY {order}
+        LIMIT ?
+    """
+    with _lock:
+        cur = _connect().execute(sql, (*params, limit))
+        columns = [d[0] for d in cur.description]
+        return [dict(zip(columns, row)) for row in cur.fetchall()]
+
+
+def _overlaps(run_id, seg, other):
+    if run_id not in (other.get("run_ids") or []):
+        return False
+    if other.get("min_ts") is None or other.get("max_ts") is None:
+        return True
+    return other["min_ts"] <= seg["max_ts"] and seg["min_ts"] <= other["max_ts"]
+
+
+def forget_segments(segments):
+    """
+    Remove the crashes of rows that retention dropped with ``segments`` (manifest
+    entries), matched by run_id and request_id range. A run whose range overlaps
+    a segment that is still listed keeps its crashes, since they may belong to
+    rows that remain. Returns the number of crashes removed.
+    """
+    kept = log_store.list_segments()
+    removed = 0
+    with _lock:
+        conn = _connect()
+        with conn:
+            for seg in segments:
+                if seg.get("min_ts") is None or seg.get("max_ts") is None:
+                    continue  # non-numeric request ids: rows cannot be told apart
+                for run_id in seg.get("run_ids") or []:
+                    if any(_overlaps(run_id, seg, other) for other in kept):
+                        continue
+                    crashes = conn.execute(
+                        "SELECT id, crash_log FROM crashes "
+                        "WHERE run_id = ? AND CAST(request_id AS REAL) BETWEEN ? AND ?",
+                        (str(run_id), seg["min_ts"], seg["max_ts"]),
+                    ).fetchall()
+                    # External-content FTS table: delete the tokens along with the rows
+                    conn.executemany("INSERT INTO crash_fts (crash_fts, rowid, crash_log) VALUES ('delete', ?, ?)",
+                                     crashes)
+                    conn.executemany("DELETE FROM crashes WHERE id = ?", [(crash_id,) for crash_id, _ in crashes])
+                    removed += len(crashes)
+            if removed:
+                conn.execute("DELETE FROM signatures WHERE signature NOT IN (SELECT signature FROM crashes)")
+    return removed
+
+
+def clear():
+    with _lock:
+        conn = _connect()
+        with conn:
+            conn.execute("DELETE FROM crashes")
+            conn.execute("DELETE FROM signatures")
+            conn.execute("INSERT INTO crash_fts (crash_fts) VALUES ('delete-all')")
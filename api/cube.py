@@ -0,0 +1,271 @@
+"""
+Precomputed model x device x version x thermal-level aggregates.
+
+Every cell of the cube holds the count, sums, max, crash count and a latency
+sketch of the rows with that combination of canonical dimension IDs (see
+dimensions.py). The cube is built once from storage the first time it is
+queried and then updated with each ingested batch, so a pivot only merges the
+existing cells (a few hundred for a real fleet) and never rescans rows. The
+build aggregates whole chunks with group-bys and does not hold the storage
+lock while it scans: rows ingested meanwhile are buffered and applied after.
+"""
+import math
+import threading
+
+import numpy as np
+import pandas as pd
+
+from dimensions import Dimensions
+from sketch import LatencySketch
+
+CUBE_DIMENSIONS = ("model", "device", "version", "thermal")
+CUBE_METRICS = (
+    "count", "avg_latency_ms", "p50_latency_ms", "p95_latency_ms", "p99_latency_ms",
+    "max_latency_ms", "crash_rate_pct", "avg_battery_pct",
+)
+_COLUMNS = ["model_name", "device_model", "app_version", "device_temperature",
+            "latency_ms", "crash_log", "battery_percentage"]
+_TOTALS = {
+    "count": ("crashed", "size"),
+    "latency_n": ("latency", "count"),
+    "latency_sum": ("latency", "sum"),
+    "latency_max": ("latency", "max"),
+    "crashes": ("crashed", "sum"),
+    "battery_n": ("battery", "count"),
+    "battery_sum": ("battery", "sum"),
+}
+
+
+class CubeCell:
+    __slots__ = ("count", "latency_n", "latency_sum", "latency_max", "crashes",
+                 "battery_n", "battery_sum", "sketch")
+
+    def __init__(self):
+        self.count = self.latency_n = self.crashes = self.battery_n = 0
+        self.latency_sum = self.battery_sum = 0.0
+        self.latency_max = None
+        self.sketch = LatencySketch()
+
+    def add(self, latency, crashed, battery):
+        self.count += 1
+        if latency is not None:
+            self.latency_n += 1
+            self.latency_sum += latency
+            self.latency_max = latency if self.latency_max is None else max(self.latency_max, latency)
+            self.sketch.add(latency)
+        if crashed:
+            self.crashes += 1
+        if battery is not None:
+            self.battery_n += 1
+            self.battery_sum += battery
+
+    def merge(self, other):
+        self.count += other.count
+        self.latency_n += other.latency_n
+        self.latency_sum += other.latency_sum
+        if other.latency_max is not None:
+            self.latency_max = other.latency_max if self.latency_max is None else max(self.latency_max, other.latency_max)
+        self.crashes += other.crashes
+        self.battery_n += other.battery_n
+        self.battery_sum += other.battery_sum
+        self.sketch.merge(other.sketch)
+        return self
+
+    def metric(self, name):
+        if name == "count":
+            return self.count
+        if name == "crash_rate_pct":
+            return self.crashes / self.count * 100 if self.count else None
+        if name == "avg_battery_pct":
+            return self.battery_sum / self.battery_n if self.battery_n else None
+        if not self.latency_n:
+            return None
+        if name == "avg_latency_ms":
+            return self.latency_sum / self.latency_n
+        if name == "max_latency_ms":
+            return self.latency_max
+        return self.sketch.quantile({"p50": 0.50, "p95": 0.95, "p99": 0.99}[name.split("_")[0]])
+
+
+def _number(value):
+    if value is None or value == "":
+        return None
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    return None if math.isnan(value) else value
+
+
+class FleetCube:
+    """Cube cells keyed by (model, device, version, thermal) IDs, maintained incrementally"""
+
+    def __init__(self, loader, lock=None):
+        # loader(columns) is called under ``lock`` and must capture the storage there
+        # (log_store.capture_view); it returns a function that yields raw DataFrame
+        # chunks of that capture, parsing only ``columns``. Rows observed from then on are buffered and
+        # applied once the build is installed, so none is counted twice.
+        self._loader = loader
+        self._lock = lock or threading.RLock()
+        self._build_lock = threading.Lock()
+        self._cells = None
+        self._pending = None  # rows observed while the cells are being built
+        self._generation = 0  # bumped by reset(): a build that started before is discarded
+        self.dims = Dimensions()
+
+    def _add(self, model, device, version, thermal, latency, crash_log, battery):
+        dims = self.dims
+        key = (dims.model.lookup(model), dims.device.lookup(device),
+               dims.version.lookup(version), dims.thermal.lookup(thermal))
+        cell = self._cells.get(key)
+        if cell is None:
+            cell = self._cells[key] = CubeCell()
+        crashed = crash_log is not None and str(crash_log) not in ("", "nan", "<NA>")
+        cell.add(_number(latency), crashed, _number(battery))
+
+    @staticmethod
+    def _ids(dim, values):
+        """Dimension ID of every value, with one lookup per distinct raw value"""
+        codes, uniques = pd.factorize(values, use_na_sentinel=False)
+        ids = np.array([dim.lookup(None if pd.isna(raw) else raw) for raw in uniques], dtype=np.int64)
+        return ids[codes]
+
+    def _frame(self, chunk, sketch):
+        """
+        Dimension IDs, measures and sketch bucket of every row of a raw chunk.
+        Text is only looked at once per distinct value, which is what makes this
+        cheaper than normalizing the whole chunk first.
+        """
+        chunk = chunk.reindex(columns=_COLUMNS)
+        latency = pd.to_numeric(chunk["latency_ms"], errors="coerce").to_numpy(dtype=float)
+        crash_codes, crash_logs = pd.factorize(chunk["crash_log"], use_na_sentinel=False)
+        crashed = np.array([not pd.isna(log) and str(log) not in ("", "nan", "<NA>") for log in crash_logs], dtype=bool)
+        return pd.DataFrame({
+            "model": self._ids(self.dims.model, chunk["model_name"]),
+            "device": self._ids(self.dims.device, chunk["device_model"]),
+            "version": self._ids(self.dims.version, chunk["app_version"]),
+            "thermal": self._ids(self.dims.thermal, pd.to_numeric(
+                chunk["device_temperature"], errors="coerce").round().astype("Int64")),
+            "latency": latency,
+            "crashed": crashed[crash_codes],
+            "battery": pd.to_numeric(chunk["battery_percentage"], errors="coerce").to_numpy(dtype=float),
+            "bucket": sketch.bucket_keys(latency),
+        })
+
+    def _build(self, chunks):
+        """Cells of every row in ``chunks``: group-bys per chunk, one merge per cell at the end"""
+        keys = list(CUBE_DIMENSIONS)
+        sketch = LatencySketch()
+        totals, buckets = [], []
+        for chunk in chunks:
+            frame = self._frame(chunk, sketch)
+            totals.append(frame.groupby(keys, sort=False).agg(**_TOTALS))
+            timed = frame[frame["latency"].notna()]
+            buckets.append(timed.groupby(keys + ["bucket"], dropna=False, sort=False).size())
+        cells = {}
+        if not totals:
+            return cells
+
+        levels = list(range(len(keys)))
+        merged = pd.concat(totals).groupby(level=levels).agg(
+            {name: "max" if name == "latency_max" else "sum" for name in _TOTALS})
+        for key, row in zip(merged.index, merged.itertuples(index=False)):
+            cell = cells[key] = CubeCell()
+            cell.count, cell.crashes = int(row[0]), int(row[4])
+            cell.latency_n, cell.latency_sum = int(row[1]), float(row[2])
+            cell.latency_max = None if math.isnan(row[3]) else float(row[3])
+            cell.battery_n, cell.battery_sum = int(row[5]), float(row[6])
+        counts = pd.concat(buckets).groupby(level=levels + [len(keys)], dropna=False).sum()
+        for key, cell_counts in counts.groupby(level=levels):
+            cells[key].sketch.add_buckets(cell_counts.index.get_level_values(-1), cell_counts.to_numpy())
+        return cells
+
+    def _ensure(self):
+        """The cells, built once by scanning a capture of storage without holding the lock"""
+        with self._lock:
+            if self._cells is not None:
+                return self._cells
+        with self._build_lock:
+            while True:
+                with self._lock:
+                    if self._cells is not None:
+                        return self._cells
+                    generation = self._generation
+                    self._pending = []
+                    read_chunks = self._loader(_COLUMNS)
+                try:
+                    cells = self._build(read_chunks())
+                except BaseException:
+                    with self._lock:
+                        self._pending = None
+                    raise
+                with self._lock:
+                    if generation != self._generation:
+                        continue  # logs cleared / dropped while building: build again
+                    self._cells, pending, self._pending = cells, self._pending, None
+                    for row in pending:
+                        self._add(*(row.get(col) for col in _COLUMNS))
+                    return cells
+
+    def observe(self, rows):
+        """Apply freshly written rows (buffered while the cube is being built)"""
+        with self._lock:
+            if self._cells is None:
+                if self._pending is not None:
+                    self._pending.extend(rows)
+                return
+            for row in rows:
+                self._add(*(row.get(col) for col in _COLUMNS))
+
+    def reset(self):
+        with self._lock:
+            self._cells = None
+            self._pending = None
+            self._generation += 1
+
+    def pivot(self, rows="model", cols="device", metric="p95_latency_ms", filters=None):
+        """
+        Roll the cube up to a ``rows`` x ``cols`` matrix of ``metric``.
+        ``filters`` maps dimension names to raw or canonical values to keep.
+        """
+        if rows not in CUBE_DIMENSIONS or cols not in CUBE_DIMENSIONS or rows == cols:
+            raise ValueError(f"rows and cols must be two different dimensions of {CUBE_DIMENSIONS}")
+        if metric not in CUBE_METRICS:
+            raise ValueError(f"metric must be one of {CUBE_METRICS}")
+        row_axis, col_axis = CUBE_DIMENSIONS.index(rows), CUBE_DIMENSIONS.index(cols)
+
+        built = self._ensure()
+        with self._lock:
+            allowed = {}
+            for name, values in (filters or {}).items():
+                if values:
+                    dim = self.dims.by_name(name)
+                    allowed[CUBE_DIMENSIONS.index(name)] = {dim.find(v) for v in values}
+            merged = {}
+            for key, cell in built.items():
+                if any(key[axis] not in ids for axis, ids in allowed.items()):
+                    continue
+                target = merged.get((key[row_axis], key[col_axis]))
+                if target is None:
+                    target = merged[(key[row_axis], key[col_axis])] = CubeCell()
+                target.merge(cell)
+            row_labels, col_labels = self.dims.by_name(rows).labels, self.dims.by_name(cols).labels
+            cells = len(built)
+
+        row_ids = sorted({r for r, _ in merged}, key=lambda i: row_labels[i] if rows != "thermal" else i)
+        col_ids = sorted({c for _, c in merged}, key=lambda i: col_labels[i] if cols != "thermal" else i)
+        return {
+            "rows": rows,
+            "cols": cols,
+            "metric": metric,
+            "row_labels": [row_labels[i] for i in row_ids],
+            "col_labels": [col_labels[i] for i in col_ids],
+            "values": [[merged[(r, c)].metric(metric) if (r, c) in merged else None for c in col_ids] for r in row_ids],
+            "counts": [[merged[(r, c)].count if (r, c) in merged else 0 for c in col_ids] for r in row_ids],
+            "cells": cells,
+        }
+
+    def dimensions(self):
+        self._ensure()
+        with self._lock:
+            return self.dims.to_dict()
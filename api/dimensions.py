@@ -0,0 +1,139 @@
+"""
+Normalized dimension layer: raw device / version / model strings -> canonical IDs.
+
+Devices report themselves either by marketing name ("iphone 17 pro max") or by
+hardware identifier ("iPhone18,2"), and app versions come as "1.0", "1" or
+"Version 1.0 (Build 1)". Each ``Dimension`` keeps a lookup table from every raw
+string seen to a small integer ID of its canonical value, so grouping by device
+or version is a dict hit per row instead of string normalization. Extra aliases
+can be supplied as JSON through ``DIMENSION_ALIASES_FILE``::
+
+    {"device_model": {"iPad16,3": "iPad Pro 11-inch (M4)"}, "app_version": {"1.0-rc": "1.0"}}
+"""
+import json
+import os
+import re
+import threading
+
+from analysis import THERMAL_LEVELS
+
+DIMENSION_ALIASES_FILE = os.environ.get("DIMENSION_ALIASES_FILE")
+
+# Hardware identifier -> marketing name; marketing names map to themselves
+DEVICE_NAMES = {
+    "iPhone16,1": "iPhone 15 Pro",
+    "iPhone16,2": "iPhone 15 Pro Max",
+    "iPhone17,1": "iPhone 16 Pro",
+    "iPhone17,2": "iPhone 16 Pro Max",
+    "iPhone17,3": "iPhone 16",
+    "iPhone17,4": "iPhone 16 Plus",
+    "iPhone17,5": "iPhone 16e",
+    "iPhone18,1": "iPhone 17 Pro",
+    "iPhone18,2": "iPhone 17 Pro Max",
+    "iPhone18,3": "iPhone 17",
+    "iPhone18,4": "iPhone Air",
+}
+UNKNOWN = "unknown"
+
+_VERSION_RE = re.compile(r"^(?:version\s*)?v?(\d+(?:\.\d+)*)\s*(?:\((?:build\s*)?([^)]*)\))?$", re.IGNORECASE)
+
+
+def _fold(value):
+    return " ".join(str(value).split()).casefold()
+
+
+def _load_aliases():
+    if not DIMENSION_ALIASES_FILE:
+        return {}
+    with open(DIMENSION_ALIASES_FILE) as f:
+        return json.load(f)
+
+
+def canonical_device(raw, aliases=None):
+    folded = _fold(raw)
+    if not folded or folded in ("nan", "<na>", "none"):
+        return UNKNOWN
+    for source in (aliases or {}, DEVICE_NAMES):
+        for alias, name in source.items():
+            if _fold(alias) == folded or _fold(name) == folded:
+                return name
+    return " ".join(str(raw).split())
+
+
+def canonical_version(raw, aliases=None):
+    """'Version 1.0 (Build 1)', '1.0' and '1' all become '1.0' (builds are not a version)"""
+    text = " ".join(str(raw).split())
+    for alias, name in (aliases or {}).items():
+        if _fold(alias) == _fold(text):
+            return name
+    if not text or text.casefold() in ("nan", "<na>", "none"):
+        return UNKNOWN
+    match = _VERSION_RE.match(text)
+    if not match:
+        return text
+    parts = match.group(1).split(".")
+    return ".".join(parts + ["0"] * (2 - len(parts)))
+
+
+def canonical_thermal(raw):
+    try:
+        return THERMAL_LEVELS.get(int(float(raw)), UNKNOWN)
+    except (TypeError, ValueError):
+        return UNKNOWN
+
+
+class Dimension:
+    """Lookup table raw string -> canonical ID, plus ID -> canonical label"""
+
+    def __init__(self, name, normalize):
+        self.name = name
+        self._normalize = normalize
+        self.labels = []  # ID -> canonical value
+        self._ids = {}  # canonical value -> ID
+        self._raw = {}  # raw string -> ID
+        self._lock = threading.Lock()
+
+    def lookup(self, raw):
+        """ID of ``raw``'s canonical value (assigned on first sight)"""
+        key = str(raw)
+        dim_id = self._raw.get(key)
+        if dim_id is None:
+            with self._lock:
+                canonical = self._normalize(key)
+                dim_id = self._ids.get(canonical)
+                if dim_id is None:
+                    dim_id = self._ids[canonical] = len(self.labels)
+                    self.labels.append(canonical)
+                self._raw[key] = dim_id
+        return dim_id
+
+    def find(self, raw):
+        """ID for a raw or canonical value without registering it (None if unseen)"""
+        return self._ids.get(self._normalize(str(raw)))
+
+    def members(self):
+        aliases = [[] for _ in self.labels]
+        for raw, dim_id in self._raw.items():
+            aliases[dim_id].append(raw)
+        return [{"id": i, "canonical": label, "aliases": sorted(aliases[i])} for i, label in enumerate(self.labels)]
+
+
+class Dimensions:
+    """The four cube dimensions: model, device, version, thermal level"""
+
+    def __init__(self):
+        aliases = _load_aliases()
+        device_aliases, version_aliases = aliases.get("device_model", {}), aliases.get("app_version", {})
+        self.model = Dimension("model", lambda v: " ".join(v.split()) or UNKNOWN)
+        self.device = Dimension("device", lambda v: canonical_device(v, device_aliases))
+        self.version = Dimension("version", lambda v: canonical_version(v, version_aliases))
+        self.thermal = Dimension("thermal", canonical_thermal)
+        # Thermal IDs follow the level order
+        for level in THERMAL_LEVELS:
+            self.thermal.lookup(level)
+
+    def by_name(self, name):
+        return getattr(self, name)
+
+    def to_dict(self):
+        return {dim.name: dim.members() for dim in (self.model, self.device, self.version, self.thermal)}
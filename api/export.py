@@ -0,0 +1,142 @@
+"""
+Filtered, streaming export of latency logs as CSV or Parquet.
+
+Rows are read chunk by chunk across segments and the live file (segments whose
+manifest metadata cannot match the run / time filters are skipped entirely),
+filtered with the same semantics as the dashboard sidebar and encoded
+incrementally, so neither the API nor the client ever holds the full log.
+"""
+import os
+
+import pandas as pd
+
+import log_store
+from log_store import CSV_HEADERS, TEXT_COLUMNS
+
+EXPORT_CHUNK_ROWS = int(os.environ.get("EXPORT_CHUNK_ROWS", "50000"))
+
+FLOAT_COLUMNS = ["latency_ms", "battery_percentage", "image_preprocess_ms", "prefill_ms", "ttft_ms",
+                 "decode_tokens_per_s", "peak_memory_mb"]
+INT_COLUMNS = ["device_temperature", "prompt_tokens", "output_tokens"]
+
+
+def normalize_chunk(df):
+    """Give every chunk the same columns and dtypes, whatever segment it came from"""
+    df = df.reindex(columns=CSV_HEADERS)
+    for col in TEXT_COLUMNS:
+        # Storage reads these as text already (log_store.TEXT_DTYPES)
+        df[col] = df[col].astype("string")
+    for col in FLOAT_COLUMNS:
+        df[col] = pd.to_numeric(df[col], errors="coerce").astype("float64")
+    for col in INT_COLUMNS:
+        df[col] = pd.to_numeric(df[col], errors="coerce").round().astype("Int64")
+    return df
+
+
+def segment_may_match(entry, filters):
+    """Cheap pruning of whole segments from manifest metadata"""
+    run_ids = filters.get("run_ids")
+    if run_ids and entry.get("run_ids") and not set(entry["run_ids"]) & set(run_ids):
+        return False
+    start_ms, end_ms = filters.get("start_ms"), filters.get("end_ms")
+    if start_ms is not None and entry.get("max_ts") is not None and entry["max_ts"] < start_ms:
+        return False
+    if end_ms is not None and entry.get("min_ts") is not None and entry["min_ts"] > end_ms:
+        return False
+    return True
+
+
+def filter_mask(df, filters):
+    """Boolean mask of the rows of a normalized chunk that pass the dashboard's filters"""
+    mask = pd.Series(True, index=df.index)
+    for col, key in (("model_name", "models"), ("device_model", "devices"),
+                     ("app_version", "versions"), ("user_feedback", "feedback"),
+                     ("run_id", "run_ids")):
+        if filters.get(key):
+            mask &= df[col].isin(filters[key]).fillna(False)
+    if filters.get("temperatures"):
+        mask &= df["device_temperature"].isin(filters["temperatures"])
+    if filters.get("battery_min") is not None:
+        mask &= df["battery_percentage"] >= filters["battery_min"]
+    if filters.get("battery_max") is not None:
+        mask &= df["battery_percentage"] <= filters["battery_max"]
+    if filters.get("only_crashed"):
+        mask &= (df["crash_log"].fillna("") != "")
+    if filters.get("start_ms") is not None or filters.get("end_ms") is not None:
+        ts = pd.to_numeric(df["request_id"], errors="coerce")
+        if filters.get("start_ms") is not None:
+            mask &= ts >= filters["start_ms"]
+        if filters.get("end_ms") is not None:
+            mask &= ts <= filters["end_ms"]
+    return mask.astype(bool)
+
+
+def filter_chunk(df, filters):
+    """Apply the dashboard's filters to one normalized chunk"""
+    return df[filter_mask(df, filters)]
+
+
+def iter_filtered_chunks(filters, view=None):
+    """Normalized, filtered chunks of the log (of ``view``, a ``log_store.capture_view()``, if given)"""
+    for chunk in log_store.iter_log_chunks(
+        EXPORT_CHUNK_ROWS, segment_filter=lambda entry: segment_may_match(entry, filters), view=view
+    ):
+        chunk = filter_chunk(normalize_chunk(chunk), filters)
+        if not chunk.empty:
+            yield chunk
+
+
+def stream_csv(filters):
+    """Yield CSV bytes: header first, then one block per filtered chunk"""
+    yield (",".join(CSV_HEADERS) + "\n").encode()
+    for chunk in iter_filtered_chunks(filters):
+        yield chunk.to_csv(index=False, header=False).encode()
+
+
+class _ChunkSink:
+    """Write-only file object that hands written bytes back to the generator"""
+
+    def __init__(self):
+        self.parts = []
+        self.closed = False
+
+    def write(self, data):
+        self.parts.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data, self.parts = b"".join(self.parts), []
+        return data
+
+
+def arrow_schema():
+    """Arrow schema matching ``normalize_chunk``'s dtypes"""
+    import pyarrow as pa
+
+    types = {col: pa.string() for col in TEXT_COLUMNS}
+    types.update({col: pa.float64() for col in FLOAT_COLUMNS})
+    types.update({col: pa.int64() for col in INT_COLUMNS})
+    return pa.schema([(col, types[col]) for col in CSV_HEADERS])
+
+
+def stream_parquet(filters):
+    """Yield Parquet bytes, one row group per filtered chunk"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = arrow_schema()
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(pa.PythonFile(sink, mode="w"), schema, compression="zstd")
+    try:
+        for chunk in iter_filtered_chunks(filters):
+            writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+            yield sink.drain()
+    finally:
+        writer.close()
+    yield sink.drain()
@@ -0,0 +1,124 @@
+"""
+Compressed request bodies and incremental NDJSON parsing for log ingestion.
+
+``DecompressingRoute`` transparently inflates ``Content-Encoding: gzip|deflate|zstd``
+bodies for regular JSON endpoints (e.g. ``/api/logs/batch``). Streaming endpoints
+read ``request.stream()`` themselves and use ``make_decoder`` + ``iter_ndjson_lines``
+so memory stays bounded by one chunk plus one line, whatever the upload size.
+"""
+import os
+import zlib
+
+from fastapi import HTTPException, Request
+from fastapi.routing import APIRoute
+
+# Optional: zstd support only if the zstandard package is installed
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+_DECODE_ERRORS = (zlib.error, ValueError) + ((zstandard.ZstdError,) if zstandard else ())
+
+# Upper bound for a fully buffered (non-streaming) decompressed body
+MAX_DECOMPRESSED_BYTES = int(float(os.environ.get("INGEST_MAX_BODY_MB", "256")) * 1024 * 1024)
+# Rows buffered before each CSV append in streaming mode
+STREAM_FLUSH_ROWS = int(os.environ.get("INGEST_STREAM_FLUSH_ROWS", "1000"))
+
+
+class _Identity:
+    def decompress(self, data):
+        return data
+
+    def flush(self):
+        return b""
+
+
+class _Zstd:
+    def __init__(self):
+        self._dctx = zstandard.ZstdDecompressor()
+        self._obj = self._dctx.decompressobj()
+
+    def decompress(self, data):
+        # A body may hold several concatenated frames (e.g. one per flushed batch)
+        out = []
+        while data:
+            if self._obj.eof:
+                self._obj = self._dctx.decompressobj()
+            out.append(self._obj.decompress(data))
+            data = self._obj.unused_data if self._obj.eof else b""
+        return b"".join(out)
+
+    def flush(self):
+        return b""
+
+
+def make_decoder(content_encoding):
+    """Return an incremental decoder with ``decompress(chunk)`` / ``flush()``"""
+    encoding = (content_encoding or "identity").strip().lower()
+    if encoding == "identity":
+        return _Identity()
+    if encoding in ("gzip", "x-gzip"):
+        return zlib.decompressobj(16 + zlib.MAX_WBITS)
+    if encoding == "deflate":
+        return zlib.decompressobj()
+    if encoding == "zstd" and zstandard is not None:
+        return _Zstd()
+    raise HTTPException(status_code=415, detail=f"Unsupported Content-Encoding: {content_encoding}")
+
+
+async def iter_decoded_chunks(request: Request):
+    """Yield decompressed chunks of the request body as they arrive"""
+    decoder = make_decoder(request.headers.get("content-encoding"))
+    try:
+        async for chunk in request.stream():
+            if not chunk:
+                continue
+            data = decoder.decompress(chunk)
+            if data:
+                yield data
+        tail = decoder.flush()
+    except _DECODE_ERRORS as e:
+        raise HTTPException(status_code=400, detail=f"Corrupt compressed body: {e}")
+    if tail:
+        yield tail
+
+
+async def iter_ndjson_lines(request: Request):
+    """Yield non-empty NDJSON lines (bytes) from a possibly compressed body"""
+    pending = b""
+    async for data in iter_decoded_chunks(request):
+        pending += data
+        *lines, pending = pending.split(b"\n")
+        for line in lines:
+            if line.strip():
+                yield line
+    if pending.strip():
+        yield pending
+
+
+class _DecompressedRequest(Request):
+    async def body(self) -> bytes:
+        if not hasattr(self, "_body"):
+            chunks, size = [], 0
+            async for data in iter_decoded_chunks(self):
+                size += len(data)
+                if size > MAX_DECOMPRESSED_BYTES:
+                    raise HTTPException(status_code=413, detail="Decompressed body too large")
+                chunks.append(data)
+            self._body = b"".join(chunks)
+        return self._body
+
+
+class DecompressingRoute(APIRoute):
+    """Route class that inflates compressed request bodies before FastAPI parses them"""
+
+    def get_route_handler(self):
+        original_handler = super().get_route_handler()
+
+        async def handler(request: Request):
+            if request.headers.get("content-encoding", "identity").lower() != "identity":
+                request = _DecompressedRequest(request.scope, request.receive)
+            return await original_handler(request)
+
+        return handler
@@ -0,0 +1,266 @@
+"""
+Asyncio load generator: simulate a fleet of devices posting latency logs.
+
+Every simulated device runs one model profile learned from the recorded dumps
+in ``data/telemetry_data_*.csv``: latency is resampled from that model's
+recorded latencies at the device's current thermal level, the thermal level
+follows the model's recorded transition frequencies, and battery drains at the
+model's recorded rate per request. Devices generate requests as a Poisson
+process, send them in batches and can go offline, buffer, and flush a burst
+when they reconnect.
+
+Usage:
+    python loadgen.py --spawn --devices 200 --duration 30
+    python loadgen.py --url http://localhost:8000 --devices 50 --rate 2 --batch-size 20
+
+``--spawn`` starts a local uvicorn with a throwaway log directory, so the real
+log is never touched. Against an existing server the rows are written with
+run ids prefixed ``loadgen-`` (drop them with ``DELETE /api/logs/segments?run_id=``
+once rotated).
+"""
+import argparse
+import asyncio
+import glob
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+
+import httpx
+import numpy as np
+import pandas as pd
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data")
+ENDPOINTS = {
+    "single": "/api/logs",
+    "batch": "/api/logs/batch",
+    "fast": "/api/logs/batch/fast",
+    "stream": "/api/logs/stream",
+}
+
+
+class ModelProfile:
+    """Latency / thermal / battery behaviour of one model, learned from one dump"""
+
+    def __init__(self, df):
+        df = df.dropna(subset=["latency_ms"])
+        self.model_name = df["model_name"].iloc[0]
+        self.device_model = str(df["device_model"].iloc[0])
+        self.app_version = str(df["app_version"].iloc[0])
+        temps = pd.to_numeric(df["device_temperature"], errors="coerce").fillna(0).astype(int).to_numpy()
+        latency = df["latency_ms"].to_numpy(dtype=float)
+        self.latency_by_temp = {t: latency[temps == t] for t in np.unique(temps)}
+        self.latency_all = latency
+
+        # Transition frequencies between consecutive thermal levels (+1 smoothing on staying)
+        counts = np.ones((4, 4)) * np.eye(4)
+        for a, b in zip(temps[:-1], temps[1:]):
+            counts[min(a, 3), min(b, 3)] += 1
+        self.transitions = counts / counts.sum(axis=1, keepdims=True)
+        self.start_temp = int(temps[0])
+
+        battery = pd.to_numeric(df["battery_percentage"], errors="coerce").dropna()
+        self.drain_per_request = max(float(battery.iloc[0] - battery.iloc[-1]) / max(len(battery), 1), 0.0)
+
+    def sample_latency(self, rng, temp):
+        pool = self.latency_by_temp.get(temp)
+        if pool is None or len(pool) == 0:
+            pool = self.latency_all
+        return float(pool[rng.integers(len(pool))])
+
+    def next_temp(self, rng, temp):
+        return int(rng.choice(4, p=self.transitions[temp]))
+
+
+def load_profiles(data_dir=DATA_DIR):
+    profiles = []
+    for path in sorted(glob.glob(os.path.join(data_dir, "telemetry_data_*.csv"))):
+        # Labels as text: app_version "1.10" must not be replayed as 1.1
+        df = pd.read_csv(path, dtype={"model_name": str, "device_model": str, "app_version": str})
+        if len(df) > 1:
+            profiles.append(ModelProfile(df))
+    if not profiles:
+        raise SystemExit(f"No telemetry_data_*.csv dumps found in {data_dir}")
+    return profiles
+
+
+class Stats:
+    def __init__(self):
+        self.requests = 0
+        self.rows = 0
+        self.statuses = Counter()
+        self.errors = Counter()
+        self.client_ms = []
+        self.server_ms = []
+        self.max_buffered = 0
+
+    def report(self, elapsed):
+        def pct(values):
+            if not values:
+                return "n/a"
+            p50, p95, p99 = np.percentile(values, [50, 95, 99])
+            return f"p50 {p50:7.2f}  p95 {p95:7.2f}  p99 {p99:7.2f}  max {max(values):7.2f}"
+
+        failed = sum(n for code, n in self.statuses.items() if code >= 400) + sum(self.errors.values())
+        print(f"⏱️  Duration          : {elapsed:.1f} s")
+        print(f"📨 Requests          : {self.requests}  ({self.requests / elapsed:.1f} req/s)")
+        print(f"📦 Rows accepted     : {self.rows}  ({self.rows / elapsed:.1f} rows/s)")
+        print(f"❌ Error rate        : {failed / max(self.requests, 1) * 100:.2f}%  "
+              f"status {dict(self.statuses)}  exceptions {dict(self.errors)}")
+        print(f"🖥️  Server time (ms)  : {pct(self.server_ms)}")
+        print(f"🌐 Client time (ms)  : {pct(self.client_ms)}")
+        print(f"📴 Max offline buffer: {self.max_buffered} rows")
+
+
+async def send(client, endpoint, logs, stats):
+    if endpoint == "stream":
+        kwargs = {"content": "".join(json.dumps(log) + "\n" for log in logs).encode(),
+                  "headers": {"Content-Type": "application/x-ndjson"}}
+    else:
+        kwargs = {"json": logs[0] if endpoint == "single" else logs}
+    start = time.perf_counter()
+    try:
+        resp = await client.post(ENDPOINTS[endpoint], **kwargs)
+    except httpx.HTTPError as e:
+        stats.requests += 1
+        stats.errors[type(e).__name__] += 1
+        return False
+    stats.client_ms.append((time.perf_counter() - start) * 1000)
+    stats.requests += 1
+    stats.statuses[resp.status_code] += 1
+    if "X-Process-Time" in resp.headers:
+        stats.server_ms.append(float(resp.headers["X-Process-Time"]))
+    if resp.status_code < 400:
+        stats.rows += len(logs)
+        return True
+    return False
+
+
+async def device(index, profile, args, client, stats, deadline, seed):
+    """One simulated device: Poisson request arrivals, batching, offline bursts"""
+    rng = np.random.default_rng(seed)
+    run_id = f"loadgen-{args.run_tag}-{index}"
+    temp = profile.start_temp
+    battery = float(rng.uniform(40, 100))
+    buffer = []
+    offline_until = 0.0
+    batch_size = 1 if args.endpoint == "single" else args.batch_size
+    # A backlog left by an offline period is flushed in bursts of up to burst_size rows
+    per_request = 1 if args.endpoint == "single" else max(batch_size, args.burst_size)
+
+    while time.monotonic() < deadline:
+        await asyncio.sleep(rng.exponential(1 / args.rate))
+        now = time.monotonic()
+        buffer.append({
+            "run_id": run_id,
+            "request_id": str(int(time.time() * 1000)),
+            "model_name": profile.model_name,
+            "latency_ms": profile.sample_latency(rng, temp),
+            "device_model": profile.device_model,
+            "app_version": profile.app_version,
+            "crash_log": "",
+            "user_feedback": "",
+            "device_temperature": temp,
+            "battery_percentage": round(battery, 1),
+        })
+        temp = profile.next_temp(rng, temp)
+        battery = max(battery - profile.drain_per_request, 1.0)
+        stats.max_buffered = max(stats.max_buffered, len(buffer))
+
+        if now < offline_until:
+            continue
+        if rng.random() < args.offline_prob:
+            offline_until = now + rng.exponential(args.offline_s)
+            continue
+        while len(buffer) >= batch_size:
+            chunk, buffer = buffer[:per_request], buffer[per_request:]
+            if not await send(client, args.endpoint, chunk, stats):
+                buffer = chunk + buffer  # keep the rows, retry on the next request
+                break
+
+    for i in range(0, len(buffer), per_request):
+        await send(client, args.endpoint, buffer[i:i + per_request], stats)
+
+
+async def run(args, profiles):
+    stats = Stats()
+    limits = httpx.Limits(max_connections=args.connections, max_keepalive_connections=args.connections)
+    async with httpx.AsyncClient(base_url=args.url, limits=limits, timeout=args.timeout) as client:
+        deadline = time.monotonic() + args.duration
+        rng = random.Random(args.seed)
+        start = time.perf_counter()
+        await asyncio.gather(*(
+            device(i, rng.choice(profiles), args, client, stats, deadline, args.seed + i)
+            for i in range(args.devices)
+        ))
+        elapsed = time.perf_counter() - start
+    return stats, elapsed
+
+
+def spawn_server(port):
+    """Start uvicorn on a throwaway log directory; returns the process"""
+    tmp = tempfile.mkdtemp(prefix="loadgen_")
+    env = dict(os.environ,
+               LATENCY_LOG_FILE=os.path.join(tmp, "latency_logs.csv"),
+               LATENCY_SEGMENT_DIR=os.path.join(tmp, "log_segments"),
+               LATENCY_SNAPSHOT_DIR=os.path.join(tmp, "snapshots"))
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "backend:app", "--port", str(port), "--log-level", "warning",
+         "--app-dir", os.path.dirname(os.path.abspath(__file__))],
+        cwd=tmp, env=env,
+    )
+    for _ in range(100):
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/health").status_code == 200:
+                print(f"🚀 Spawned API on port {port} (logs in {tmp})")
+                return proc
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.1)
+    proc.terminate()
+    raise SystemExit("Spawned API did not become healthy")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--spawn", action="store_true", help="start a local uvicorn on a temp log dir")
+    parser.add_argument("--port", type=int, default=8765, help="port for --spawn")
+    parser.add_argument("--devices", type=int, default=100)
+    parser.add_argument("--duration", type=float, default=30, help="seconds")
+    parser.add_argument("--rate", type=float, default=1.0, help="requests per second per device")
+    parser.add_argument("--endpoint", choices=ENDPOINTS, default="batch")
+    parser.add_argument("--batch-size", type=int, default=10)
+    parser.add_argument("--burst-size", type=int, default=500, help="max rows per request when flushing a backlog")
+    parser.add_argument("--offline-prob", type=float, default=0.01, help="chance per request of going offline")
+    parser.add_argument("--offline-s", type=float, default=10, help="mean offline duration")
+    parser.add_argument("--connections", type=int, default=100)
+    parser.add_argument("--timeout", type=float, default=30)
+    parser.add_argument("--data-dir", default=DATA_DIR)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    args.run_tag = time.strftime("%Y%m%d%H%M%S")
+
+    profiles = load_profiles(args.data_dir)
+    print(f"📱 {args.devices} devices, {len(profiles)} model profiles, "
+          f"{args.rate} req/s each, endpoint {ENDPOINTS[args.endpoint]}, batch {args.batch_size}")
+
+    proc = None
+    if args.spawn:
+        proc = spawn_server(args.port)
+        args.url = f"http://127.0.0.1:{args.port}"
+    try:
+        stats, elapsed = asyncio.run(run(args, profiles))
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait()
+    stats.report(elapsed)
+
+
+if __name__ == "__main__":
+    main()
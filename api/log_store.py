@@ -0,0 +1,545 @@
+"""
+Segmented storage for latency logs.
+
+The live log (``latency_logs.csv``) is the only file that is ever appended to.
+When it grows past a size or age limit it is rotated into an immutable segment
+under ``SEGMENT_DIR``; segments are later compacted (Parquet / gzip CSV) and
+dropped by retention without touching live data. ``manifest.json`` is the
+source of truth for which segments exist, so readers never glob the directory.
+"""
+import csv
+import io
+import json
+import os
+import re
+import shutil
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+import pandas as pd
+
+from wal import WriteAheadLog
+
+# Configuration
+CSV_FILE = os.environ.get("LATENCY_LOG_FILE", "latency_logs.csv")
+SEGMENT_DIR = os.environ.get("LATENCY_SEGMENT_DIR", "log_segments")
+MANIFEST_FILE = os.path.join(SEGMENT_DIR, "manifest.json")
+ROTATE_MAX_BYTES = int(float(os.environ.get("LOG_ROTATE_MAX_MB", "64")) * 1024 * 1024)
+ROTATE_MAX_AGE_S = float(os.environ.get("LOG_ROTATE_MAX_AGE_H", "24")) * 3600
+COMPACT_FORMAT = os.environ.get("LOG_COMPACT_FORMAT", "parquet")  # parquet | csv.gz | none
+RETENTION_DAYS = float(os.environ.get("LOG_RETENTION_DAYS", "0"))  # 0 = keep forever
+MAINTENANCE_INTERVAL_S = float(os.environ.get("LOG_MAINTENANCE_INTERVAL_S", "60"))
+WAL_FILE = os.environ.get("LOG_WAL_FILE", os.path.join(SEGMENT_DIR, "ingest.wal"))
+WAL_FSYNC = os.environ.get("LOG_WAL_FSYNC", "batch")  # batch | periodic | none | off
+WAL_FSYNC_INTERVAL_MS = float(os.environ.get("LOG_WAL_FSYNC_INTERVAL_MS", "200"))
+WAL_CHECKPOINT_BYTES = int(float(os.environ.get("LOG_WAL_CHECKPOINT_MB", "16")) * 1024 * 1024)
+
+CSV_HEADERS = [
+    "run_id",
+    "request_id",
+    "model_name",
+    "latency_ms",
+    "device_model",
+    "app_version",
+    "crash_log",
+    "user_feedback",
+    "device_temperature",
+    "battery_percentage",
+]
+# Optional per-request stage timings and token counts (empty when not reported)
+STAGE_COLUMNS = [
+    "image_preprocess_ms",
+    "prefill_ms",
+    "ttft_ms",
+    "decode_tokens_per_s",
+    "prompt_tokens",
+    "output_tokens",
+    "peak_memory_mb",
+]
+CSV_HEADERS += STAGE_COLUMNS
+# Identifiers and labels: always parsed as text, never type-guessed, so app_version
+# "1.10", "1" and "01" stay distinct whatever else a chunk happens to hold
+TEXT_COLUMNS = ["run_id", "request_id", "model_name", "device_model", "app_version", "crash_log", "user_feedback"]
+TEXT_DTYPES = {col: str for col in TEXT_COLUMNS}
+
+# Serializes every write to the live file and to the manifest
+write_lock = threading.RLock()
+# One compaction at a time (maintenance loop and the API); it only takes write_lock to swap entries
+_compact_lock = threading.Lock()
+
+# Every append to the live file goes through the WAL first (see wal.py)
+ingest_wal = WriteAheadLog(WAL_FILE, WAL_FSYNC, WAL_FSYNC_INTERVAL_MS)
+
+
+def ensure_csv_exists():
+    """Ensure CSV file exists with headers"""
+    if not os.path.exists(CSV_FILE):
+        with open(CSV_FILE, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=CSV_HEADERS)
+            writer.writeheader()
+
+
+def _live_layout():
+    """Return (column order of the live file, whether it ends with a newline)"""
+    with open(CSV_FILE, 'rb') as f:
+        header = f.readline().decode().strip()
+        f.seek(0, os.SEEK_END)
+        f.seek(max(f.tell() - 1, 0))
+        ends_with_newline = f.read(1) in (b"\n", b"")
+    return next(csv.reader([header])), ends_with_newline
+
+
+def _encode_rows(rows, fieldnames, ends_with_newline):
+    buf = io.StringIO(newline='')
+    if not ends_with_newline:
+        buf.write("\n")
+    writer = csv.DictWriter(buf, fieldnames=fieldnames, extrasaction="ignore")
+    writer.writerows(rows)
+    return buf.getvalue().encode()
+
+
+def _upgrade_live_header(rows, fieldnames):
+    """
+    A live file written before some CSV_HEADERS columns existed would silently
+    drop them: move it into a segment (or just rewrite a header-only file) so
+    the new live file carries every column. Old segments keep their columns;
+    readers reindex to CSV_HEADERS.
+    """
+    missing = [col for col in CSV_HEADERS if col not in fieldnames]
+    if not any(row.get(col) not in (None, "") for row in rows for col in missing):
+        return False
+    if not rotate(force=True):
+        with open(CSV_FILE, 'w', newline='') as f:
+            csv.DictWriter(f, fieldnames=CSV_HEADERS).writeheader()
+        checkpoint()
+    return True
+
+
+def append_rows(rows):
+    """
+    Append already-serialized row dicts to the live file in one write. The
+    bytes are logged to the WAL first, so once this returns the rows survive a
+    crash (up to the WAL fsync policy) and a torn append is repaired on startup.
+    """
+    with write_lock:
+        ensure_csv_exists()
+        # Files produced by convert.py use a different column order and may lack a
+        # trailing newline; follow the file's own header so rows stay aligned.
+        fieldnames, ends_with_newline = _live_layout()
+        if _upgrade_live_header(rows, fieldnames):
+            fieldnames, ends_with_newline = _live_layout()
+        data = _encode_rows(rows, fieldnames, ends_with_newline)
+        ingest_wal.append(os.path.getsize(CSV_FILE), data)
+        with open(CSV_FILE, 'ab') as f:
+            f.write(data)
+        if ingest_wal.enabled and ingest_wal.size() >= WAL_CHECKPOINT_BYTES:
+            checkpoint()
+
+
+def checkpoint():
+    """Fsync the live file, after which the WAL records describing it can go"""
+    with write_lock:
+        if os.path.exists(CSV_FILE):
+            with open(CSV_FILE, 'rb') as f:
+                os.fsync(f.fileno())
+        ingest_wal.reset()
+
+
+def recover():
+    """
+    Startup recovery: truncate the WAL's torn tail, then make the live file
+    match every logged record, rewriting it from the first record whose bytes
+    are missing or torn (a partial last line included). Returns what was done.
+    """
+    with write_lock:
+        records, torn_wal = ingest_wal.read_records()
+        result = {"wal_records": len(records), "wal_torn_bytes": torn_wal, "replayed": 0, "csv_truncated_bytes": 0}
+        if not records:
+            return result
+
+        ensure_csv_exists()
+        with open(CSV_FILE, 'r+b') as f:
+            size = f.seek(0, os.SEEK_END)
+            first_missing = len(records)
+            for i, (offset, data) in enumerate(records):
+                f.seek(offset)
+                if offset + len(data) > size or f.read(len(data)) != data:
+                    first_missing = i
+                    break
+            replay = records[first_missing:]
+            if replay:
+                start = min(replay[0][0], size)
+                f.truncate(start)
+                f.seek(start)
+                for _, data in replay:
+                    f.write(data)
+                result.update(replayed=len(replay), csv_truncated_bytes=size - start)
+        checkpoint()
+        return result
+
+
+def _header_size():
+    with open(CSV_FILE, 'rb') as f:
+        return len(f.readline())
+
+
+# ---------------------------------------------------------------------------
+# Manifest
+# ---------------------------------------------------------------------------
+
+def load_manifest():
+    """Return the manifest dict (empty manifest if none was written yet)"""
+    try:
+        with open(MANIFEST_FILE, 'r') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {"active_since": None, "segments": []}
+
+
+def _save_manifest(manifest):
+    os.makedirs(SEGMENT_DIR, exist_ok=True)
+    tmp = MANIFEST_FILE + ".tmp"
+    with open(tmp, 'w') as f:
+        json.dump(manifest, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, MANIFEST_FILE)
+
+
+def list_segments():
+    return load_manifest()["segments"]
+
+
+def _segment_path(entry):
+    return os.path.join(SEGMENT_DIR, entry["name"])
+
+
+def _next_sequence(manifest):
+    """Take the next segment number: it only ever grows, so names are never reused after drops"""
+    seq = manifest.get("next_sequence")
+    if seq is None:
+        # Manifest written before the counter existed: continue after the highest number in use
+        numbers = [int(m.group(1)) for m in (re.search(r"-(\d+)\.", seg["name"]) for seg in manifest["segments"]) if m]
+        seq = max(numbers, default=-1) + 1
+    manifest["next_sequence"] = seq + 1
+    return seq
+
+
+# ---------------------------------------------------------------------------
+# Reading
+# ---------------------------------------------------------------------------
+
+def read_csv(source, **kwargs):
+    """``pd.read_csv`` with the text columns read as text (csv and csv.gz, compression inferred)"""
+    return pd.read_csv(source, dtype=TEXT_DTYPES, **kwargs)
+
+
+def _text_columns(df):
+    """Parquet segments compacted before TEXT_COLUMNS were kept as text may hold numbers"""
+    for col in TEXT_COLUMNS:
+        if col in df.columns and not (pd.api.types.is_object_dtype(df[col]) or pd.api.types.is_string_dtype(df[col])):
+            df[col] = df[col].astype("string")
+    return df
+
+
+def _read_chunks(path, fmt, chunksize, columns=None):
+    if fmt == "parquet":
+        import pyarrow.parquet as pq
+        parquet = pq.ParquetFile(path)
+        if columns is not None:
+            columns = [col for col in columns if col in parquet.schema_arrow.names]
+        for batch in parquet.iter_batches(batch_size=chunksize, columns=columns):
+            yield _text_columns(batch.to_pandas())
+    else:
+        usecols = None if columns is None else (lambda col: col in columns)
+        yield from read_csv(path, chunksize=chunksize, usecols=usecols)
+
+
+def _current_entry(entry):
+    """The manifest entry of ``entry``'s segment now (compaction renames it), or None once dropped"""
+    stem = entry["name"].split(".")[0]
+    return next((seg for seg in list_segments() if seg["name"].split(".")[0] == stem), None)
+
+
+def iter_segment_chunks(entry, chunksize=50_000, columns=None):
+    """Yield bounded DataFrame chunks of one segment (nothing if it was dropped)"""
+    try:
+        yield from _read_chunks(_segment_path(entry), entry["format"], chunksize, columns)
+    except FileNotFoundError:
+        # Compacted since the manifest was read (same rows, new name) or dropped
+        entry = _current_entry(entry)
+        if entry is not None:
+            yield from _read_chunks(_segment_path(entry), entry["format"], chunksize, columns)
+
+
+def capture_view():
+    """
+    The segment list and the live file's bytes as of now, taken under the write
+    lock. ``iter_log_chunks(view=...)`` then reads exactly those rows without the
+    lock, so a reader that starts observing new rows at the capture (under the
+    same lock) sees every row once, however long the scan takes.
+    """
+    with write_lock:
+        ensure_csv_exists()
+        segments = list_segments()
+        with open(CSV_FILE, 'rb') as f:
+            live = f.read()
+    return {"segments": segments, "live": live}
+
+
+def iter_log_chunks(chunksize=50_000, segment_filter=None, columns=None, view=None):
+    """
+    Yield bounded DataFrame chunks from every segment, then the live file.
+    ``segment_filter(entry)`` can skip whole segments using manifest metadata;
+    ``columns`` limits what is parsed; ``view`` (``capture_view()``) reads a
+    fixed state of the storage instead of the current one.
+    """
+    for entry in (view["segments"] if view is not None else list_segments()):
+        if segment_filter is not None and not segment_filter(entry):
+            continue
+        yield from iter_segment_chunks(entry, chunksize, columns)
+    if view is not None:
+        yield from _read_chunks(io.BytesIO(view["live"]), "csv", chunksize, columns)
+    else:
+        ensure_csv_exists()
+        yield from _read_chunks(CSV_FILE, "csv", chunksize, columns)
+
+
+def _count_lines(path):
+    """Rows of a CSV file (lines minus the header)"""
+    with open(path, 'r') as f:
+        return sum(1 for _ in f) - 1
+
+
+def count_logs():
+    """Total number of rows across segments and the live file"""
+    ensure_csv_exists()
+    live = _count_lines(CSV_FILE)
+    segments = 0
+    for entry in list_segments():
+        if entry["rows"] is None:
+            # Just rotated, its stats are still being computed: the raw CSV is there
+            try:
+                segments += _count_lines(_segment_path(entry))
+                continue
+            except FileNotFoundError:
+                entry = _current_entry(entry) or {"rows": 0}
+        segments += entry["rows"] or 0
+    return live + segments
+
+
+def log_statistics():
+    """Overview of every row, streamed chunk by chunk (distinct values in order of appearance)"""
+    columns = ["run_id", "latency_ms", "model_name", "device_model", "app_version"]
+    distinct = {col: {} for col in ("run_id", "model_name", "device_model", "app_version")}
+    rows = latency_n = 0
+    latency_sum, latency_min, latency_max = 0.0, float("inf"), float("-inf")
+    for chunk in iter_log_chunks(columns=columns):
+        chunk = chunk.reindex(columns=columns)
+        rows += len(chunk)
+        latency = pd.to_numeric(chunk["latency_ms"], errors="coerce").dropna()
+        if len(latency):
+            latency_n += len(latency)
+            latency_sum += float(latency.sum())
+            latency_min = min(latency_min, float(latency.min()))
+            latency_max = max(latency_max, float(latency.max()))
+        for col, seen in distinct.items():
+            seen.update(dict.fromkeys(chunk[col].dropna().unique().tolist()))
+    if not rows:
+        return {"total_records": 0, "stats": "No data available"}
+    return {
+        "runs": list(distinct["run_id"]),
+        "total_records": rows,
+        "avg_latency_ms": latency_sum / latency_n if latency_n else None,
+        "min_latency_ms": latency_min if latency_n else None,
+        "max_latency_ms": latency_max if latency_n else None,
+        "models": list(distinct["model_name"]),
+        "devices": list(distinct["device_model"]),
+        "versions": list(distinct["app_version"])
+    }
+
+
+# ---------------------------------------------------------------------------
+# Rotation / compaction / retention
+# ---------------------------------------------------------------------------
+
+def _segment_stats(entry):
+    """Row count, request_id (timestamp) range and runs of one segment, read chunk by chunk"""
+    rows, min_ts, max_ts, run_ids = 0, None, None, set()
+    for chunk in iter_segment_chunks(entry, columns=["run_id", "request_id"]):
+        rows += len(chunk)
+        if "request_id" in chunk.columns:
+            ts = pd.to_numeric(chunk["request_id"], errors="coerce")
+            if not ts.isna().all():
+                min_ts = int(ts.min()) if min_ts is None else min(min_ts, int(ts.min()))
+                max_ts = int(ts.max()) if max_ts is None else max(max_ts, int(ts.max()))
+        if "run_id" in chunk.columns:
+            run_ids.update(chunk["run_id"].dropna().astype(str))
+    return {"rows": rows, "min_ts": min_ts, "max_ts": max_ts, "run_ids": sorted(run_ids)}
+
+
+def rotate(force=False):
+    """
+    Move the live file into a new immutable segment if it is over the size/age
+    limit (or ``force``). Returns the segment entry, or None if nothing rotated.
+    Only the rename happens under the write lock: the segment is listed with
+    ``rows`` None (and no timestamps / runs, so retention keeps it) until its
+    stats are read from the immutable file afterwards.
+    """
+    with write_lock:
+        ensure_csv_exists()
+        manifest = load_manifest()
+        now = time.time()
+        if manifest.get("active_since") is None:
+            manifest["active_since"] = now
+            _save_manifest(manifest)
+
+        size = os.path.getsize(CSV_FILE)
+        if size <= _header_size():
+            return None
+        too_big = size >= ROTATE_MAX_BYTES
+        too_old = now - manifest["active_since"] >= ROTATE_MAX_AGE_S
+        if not (force or too_big or too_old):
+            return None
+
+        # Make the live file durable first: the WAL never refers to a rotated file
+        checkpoint()
+        os.makedirs(SEGMENT_DIR, exist_ok=True)
+        name = f"segment-{datetime.utcfromtimestamp(now):%Y%m%dT%H%M%S}-{_next_sequence(manifest):05d}.csv"
+        path = os.path.join(SEGMENT_DIR, name)
+        try:
+            os.replace(CSV_FILE, path)
+        except OSError:
+            # The live file is a bind mount (docker-compose) and cannot be renamed:
+            # copy it out and truncate in place, still under the write lock.
+            shutil.copyfile(CSV_FILE, path)
+            with open(CSV_FILE, 'w', newline='') as f:
+                csv.DictWriter(f, fieldnames=CSV_HEADERS).writeheader()
+        with open(path, 'rb') as f:
+            os.fsync(f.fileno())
+
+        entry = {"name": name, "format": "csv", "created_at": now,
+                 "rows": None, "min_ts": None, "max_ts": None, "run_ids": []}
+        manifest["segments"].append(entry)
+        manifest["active_since"] = now
+        _save_manifest(manifest)
+        ensure_csv_exists()
+
+    stats = _segment_stats(entry)
+    with write_lock:
+        manifest = load_manifest()
+        # Compaction may have renamed it (same stem) already
+        seg = next((seg for seg in manifest["segments"] if seg["name"].split(".")[0] == name.split(".")[0]), None)
+        if seg is None:
+            return {**entry, **stats}  # dropped meanwhile
+        seg.update(stats)
+        _save_manifest(manifest)
+        return dict(seg)
+
+
+def compact_segments(fmt=None):
+    """
+    Rewrite raw CSV segments as ``fmt`` (parquet or csv.gz). Returns names compacted.
+    Files are converted without the write lock; the manifest entry is swapped
+    under it, and a segment dropped by retention in the meantime stays dropped.
+    """
+    fmt = fmt or COMPACT_FORMAT
+    if fmt not in ("parquet", "csv.gz"):
+        return []
+
+    compacted = []
+    with _compact_lock:
+        for entry in list_segments():
+            if entry["format"] != "csv":
+                continue
+            src = _segment_path(entry)
+            try:
+                df = read_csv(src)
+            except FileNotFoundError:
+                continue  # dropped since the manifest was read
+            new_name = Path(entry["name"]).stem + "." + fmt
+            dst = os.path.join(SEGMENT_DIR, new_name)
+            tmp = dst + ".tmp"
+            if fmt == "parquet":
+                df.to_parquet(tmp, index=False, compression="zstd")
+            else:
+                df.to_csv(tmp, index=False, compression="gzip")
+            os.replace(tmp, dst)
+
+            # Swap the manifest entry first, then delete the raw file
+            with write_lock:
+                manifest = load_manifest()
+                seg = next((seg for seg in manifest["segments"] if seg["name"] == entry["name"]), None)
+                if seg is not None:
+                    seg["name"], seg["format"] = new_name, fmt
+                    _save_manifest(manifest)
+            if seg is None:
+                os.remove(dst)
+                continue
+            try:
+                os.remove(src)
+            except FileNotFoundError:
+                pass
+            compacted.append(new_name)
+    return compacted
+
+
+def apply_retention(older_than_days=None, run_ids=None):
+    """
+    Drop whole segments whose newest row is older than ``older_than_days`` or
+    whose rows all belong to ``run_ids``. The live file is never rewritten.
+    Returns the manifest entries of the dropped segments.
+    """
+    run_ids = {str(r) for r in run_ids} if run_ids else set()
+    cutoff_ms = (time.time() - older_than_days * 86400) * 1000 if older_than_days else None
+
+    def expired(seg):
+        if cutoff_ms is not None:
+            newest = seg["max_ts"] if seg.get("max_ts") is not None else seg["created_at"] * 1000
+            if newest < cutoff_ms:
+                return True
+        return bool(run_ids) and bool(seg["run_ids"]) and set(seg["run_ids"]) <= run_ids
+
+    with write_lock:
+        manifest = load_manifest()
+        dropped = [seg for seg in manifest["segments"] if expired(seg)]
+        if not dropped:
+            return []
+        manifest["segments"] = [seg for seg in manifest["segments"] if not expired(seg)]
+        _save_manifest(manifest)
+
+    for seg in dropped:
+        try:
+            os.remove(_segment_path(seg))
+        except FileNotFoundError:
+            pass
+    return dropped
+
+
+def clear_all():
+    """Remove every segment and reset the live file to headers only"""
+    with write_lock:
+        manifest = load_manifest()
+        segments = manifest["segments"]
+        manifest["segments"] = []
+        manifest["active_since"] = time.time()
+        _save_manifest(manifest)
+        for seg in segments:
+            try:
+                os.remove(_segment_path(seg))
+            except FileNotFoundError:
+                pass
+        ingest_wal.reset()
+        with open(CSV_FILE, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=CSV_HEADERS)
+            writer.writeheader()
+
+
+def run_maintenance():
+    """One pass of rotation, compaction and age-based retention (``dropped``: manifest entries)"""
+    rotated = rotate()
+    compacted = compact_segments()
+    dropped = apply_retention(older_than_days=RETENTION_DAYS) if RETENTION_DAYS > 0 else []
+    return {"rotated": rotated["name"] if rotated else None, "compacted": compacted, "dropped": dropped}
@@ -0,0 +1,168 @@
+"""
+Replay recorded telemetry dumps through the ingestion API.
+
+Every dump in ``data/`` (``telemetry_*.txt``, ``logs+stepladder_*.txt``) is
+parsed with ``convert.parse_telemetry`` and becomes one stream with its own run
+id. A stream sends each record at its original time, taken from the
+``request_id`` millisecond timestamps, divided by ``--speed``; with
+``--speed 0`` records go out as fast as the API accepts them. All streams
+run concurrently, so the live ingestion path, the dashboard and the
+incremental aggregates (timelines, fleet cube) see the same load.
+
+With a fixed ``--run-tag`` and ``--speed 0`` the requests are identical
+on every run, so the tool doubles as an end-to-end performance test.
+``--verify`` then checks that each run's timeline on the API has exactly
+the replayed number of rows.
+
+Usage:
+    python replay.py --spawn --speed 0 --verify
+    python replay.py --speed 60 --copies 4 "../data/telemetry_*.txt"
+    python replay.py --url http://localhost:8000 --speed 1 --retime
+"""
+import argparse
+import asyncio
+import glob
+import os
+import sys
+import time
+
+import httpx
+import numpy as np
+
+from loadgen import DATA_DIR, ENDPOINTS, Stats, send, spawn_server
+
+sys.path.insert(0, DATA_DIR)
+from convert import parse_telemetry  # noqa: E402
+
+DEFAULT_PATTERNS = ("telemetry_*.txt", "logs+stepladder_*.txt")
+FIELDS = ("model_name", "latency_ms", "device_model", "app_version", "crash_log",
+          "user_feedback", "device_temperature", "battery_percentage")
+
+
+def load_stream(path):
+    """Records of one dump, sorted by their request_id timestamp"""
+    with open(path, encoding="utf-8") as f:
+        records = [r for r in parse_telemetry(f.read()) if str(r.get("request_id", "")).isdigit()]
+    return sorted(records, key=lambda r: int(r["request_id"]))
+
+
+def to_log(record, run_id, request_id):
+    log = {field: record.get(field) for field in FIELDS}
+    for field in ("model_name", "device_model", "app_version"):
+        log[field] = str(log[field]) if log[field] is not None else ""
+    return {**log, "run_id": run_id, "request_id": str(request_id),
+            "crash_log": log["crash_log"] or "", "user_feedback": log["user_feedback"] or ""}
+
+
+async def replay_stream(run_id, records, args, client, stats, lags, start, wall_start_ms):
+    base_ts = int(records[0]["request_id"])
+    offsets_s = [(int(r["request_id"]) - base_ts) / 1000 for r in records]
+    schedule = [start + offset / args.speed for offset in offsets_s] if args.speed > 0 else None
+    logs = []
+    for record, offset in zip(records, offsets_s):
+        # --retime shifts the recorded timeline so the first record happens now
+        request_id = int(wall_start_ms + offset * 1000 / (args.speed or 1)) if args.retime else record["request_id"]
+        logs.append(to_log(record, run_id, request_id))
+
+    batch_size = 1 if args.endpoint == "single" else args.batch_size
+    i = 0
+    while i < len(logs):
+        if schedule is not None:
+            delay = schedule[i] - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+        now = time.monotonic()
+        # Everything already due goes out together (up to batch_size rows)
+        j = i + 1
+        while j < len(logs) and j - i < batch_size and (schedule is None or schedule[j] <= now):
+            j += 1
+        if schedule is not None:
+            lags.extend((now - schedule[k]) * 1000 for k in range(i, j))
+        await send(client, args.endpoint, logs[i:j], stats)
+        i = j
+
+
+async def run(args, streams):
+    stats = Stats()
+    lags = []
+    limits = httpx.Limits(max_connections=args.connections, max_keepalive_connections=args.connections)
+    async with httpx.AsyncClient(base_url=args.url, limits=limits, timeout=args.timeout) as client:
+        start = time.monotonic()
+        wall_start_ms = time.time() * 1000
+        begin = time.perf_counter()
+        await asyncio.gather(*(
+            replay_stream(run_id, records, args, client, stats, lags, start, wall_start_ms)
+            for run_id, _, records in streams
+        ))
+        elapsed = time.perf_counter() - begin
+    return stats, lags, elapsed
+
+
+def verify(url, streams):
+    """Every replayed run must show exactly its number of records on the API"""
+    ok = True
+    for run_id, path, records in streams:
+        resp = httpx.get(f"{url}/api/runs/{run_id}/timeline", params={"since": len(records)}, timeout=60)
+        count = resp.json().get("count") if resp.status_code == 200 else None
+        status = "✅" if count == len(records) else "❌"
+        ok &= count == len(records)
+        print(f"{status} {run_id}: {count} / {len(records)} rows ({os.path.basename(path)})")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("files", nargs="*", help=f"dump files or globs (default: {' '.join(DEFAULT_PATTERNS)} in data/)")
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--spawn", action="store_true", help="start a local uvicorn on a temp log dir")
+    parser.add_argument("--port", type=int, default=8766, help="port for --spawn")
+    parser.add_argument("--speed", type=float, default=1.0, help="time compression (60 = one minute per second, 0 = max)")
+    parser.add_argument("--copies", type=int, default=1, help="parallel streams per file (distinct run ids)")
+    parser.add_argument("--endpoint", choices=ENDPOINTS, default="batch")
+    parser.add_argument("--batch-size", type=int, default=100, help="max rows per request")
+    parser.add_argument("--retime", action="store_true", help="shift request_id timestamps to the replay time")
+    parser.add_argument("--run-tag", default=time.strftime("%Y%m%d%H%M%S"), help="run ids are replay-<tag>-<n>")
+    parser.add_argument("--verify", action="store_true", help="check per-run row counts on the API afterwards")
+    parser.add_argument("--connections", type=int, default=100)
+    parser.add_argument("--timeout", type=float, default=30)
+    args = parser.parse_args()
+
+    patterns = args.files or [os.path.join(DATA_DIR, p) for p in DEFAULT_PATTERNS]
+    paths = sorted({path for pattern in patterns for path in glob.glob(pattern)})
+    if not paths:
+        raise SystemExit(f"No dumps matched {patterns}")
+    streams = []
+    for path in paths:
+        records = load_stream(path)
+        if not records:
+            continue
+        for copy in range(args.copies):
+            streams.append((f"replay-{args.run_tag}-{len(streams)}", path, records))
+
+    rows = sum(len(records) for _, _, records in streams)
+    recorded_s = max((int(r[-1]["request_id"]) - int(r[0]["request_id"])) / 1000 for _, _, r in streams)
+    expected = f"~{recorded_s / args.speed:.0f} s" if args.speed > 0 else "as fast as possible"
+    print(f"🎞️  {len(streams)} streams from {len(paths)} dumps, {rows} rows, "
+          f"recorded over {recorded_s / 60:.1f} min, replay {expected}")
+
+    proc = None
+    if args.spawn:
+        proc = spawn_server(args.port)
+        args.url = f"http://127.0.0.1:{args.port}"
+    try:
+        stats, lags, elapsed = asyncio.run(run(args, streams))
+        stats.report(elapsed)
+        if lags:
+            p50, p99 = np.percentile(lags, [50, 99])
+            print(f"🕰️  Schedule lag (ms) : p50 {p50:7.2f}  p99 {p99:7.2f}  max {max(lags):7.2f}")
+        ok = verify(args.url, streams) if args.verify else True
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait()
+    if not ok:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
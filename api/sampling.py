@@ -0,0 +1,688 @@
+"""
+Stratified reservoir samples for approximate aggregates over huge logs.
+
+Every (model, run) stratum keeps a uniform random sample of at most
+``SAMPLE_RESERVOIR_SIZE`` rows (Algorithm R) plus its exact row count. All
+strata share a budget of ``SAMPLE_MAX_ROWS``: as strata appear, every
+reservoir is cut down to an even share of it, so the sample (and a query's
+cost) stays bounded however many runs the log holds. Like the
+fleet cube, the samples are built once from storage on the first query and then
+updated with each ingested batch. A query applies the export / dashboard
+filters to the samples only, so its cost depends on the number of strata and
+not on the size of the log.
+
+Estimates weight each sampled row by N_h / n_h (rows / sampled rows of its
+stratum). Means and rates are ratio estimators with a linearized
+stratified-sampling variance (finite population correction included), counts
+use the stratified variance of the match indicator, and quantile intervals are
+Woodruff's: the CDF's confidence interval at the estimate mapped back through
+the weighted quantile. A stratum smaller than the reservoir is held entirely,
+so small logs come back exact with zero-width bounds.
+
+Exact summaries stream the filtered log (export.py) chunk by chunk into running
+totals with the snapshot's summary definitions (the dashboard's); ``ExactSummaries``
+runs them on demand or in a background thread, keeping only the latest few
+requests queued.
+"""
+import json
+import math
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from statistics import NormalDist
+
+import numpy as np
+import pandas as pd
+
+import log_store
+from analysis import THERMAL_LEVELS
+from export import filter_mask, iter_filtered_chunks, normalize_chunk
+from sketch import LatencySketch
+
+SAMPLE_RESERVOIR_SIZE = int(os.environ.get("SAMPLE_RESERVOIR_SIZE", "2000"))  # max rows kept per (model, run)
+SAMPLE_MAX_ROWS = int(os.environ.get("SAMPLE_MAX_ROWS", "200000"))  # total budget, shared by all strata
+SAMPLE_MIN_RESERVOIR = 100  # per-stratum floor when many strata split the budget
+SAMPLE_SEED = int(os.environ.get("SAMPLE_SEED", "0"))
+EXACT_CACHE_SIZE = int(os.environ.get("SAMPLE_EXACT_CACHE", "64"))  # exact summaries kept per filter set
+# Latencies an exact summary keeps for its p95s before it switches to a second, bucket-bounded pass
+SUMMARY_MAX_VALUES = int(os.environ.get("SUMMARY_MAX_VALUES", "4000000"))  # 8 bytes each
+
+_COLUMNS = ["run_id", "request_id", "model_name", "device_model", "app_version", "crash_log",
+            "user_feedback", "device_temperature", "battery_percentage", "latency_ms"]
+_NUMERIC_COLUMNS = ["device_temperature", "battery_percentage", "latency_ms"]
+# Columns the exact summary needs (keeps memory down when scanning tens of millions of rows)
+_SUMMARY_COLUMNS = ["run_id", "request_id", "model_name", "latency_ms", "crash_log",
+                    "user_feedback", "device_temperature", "battery_percentage"]
+
+
+class Reservoir:
+    __slots__ = ("size", "seen", "rows", "changes", "block")
+
+    def __init__(self, size):
+        self.size = size
+        self.seen = 0
+        self.rows = []
+        self.changes = 0  # bumped whenever ``rows`` changes
+        self.block = None  # (changes, normalized frame, numeric arrays) of ``rows``
+
+    def offer(self, count, rng, rows_at):
+        """
+        Algorithm R over ``count`` new rows of the stratum. ``rows_at(positions)``
+        returns the new rows at those positions; only rows entering the sample
+        are ever materialized.
+        """
+        fill = min(max(self.size - self.seen, 0), count)
+        self.changes += 1
+        if fill:
+            self.rows.extend(rows_at(np.arange(fill)))
+        if count > fill:
+            # Row t (1-based within the stratum) replaces a random slot with probability size / t
+            positions = np.arange(self.seen + fill + 1, self.seen + count + 1)
+            slots = (rng.random(len(positions)) * positions).astype(np.int64)
+            kept = np.flatnonzero(slots < self.size)
+            # In arrival order, so a later row overwrites an earlier one drawn for the same slot
+            for slot, row in zip(slots[kept], rows_at(fill + kept)):
+                self.rows[slot] = row
+        self.seen += count
+
+    def shrink(self, size, rng):
+        """Keep a uniform subset of ``size`` rows (still a uniform sample of the stratum)"""
+        self.size = size
+        if len(self.rows) > size:
+            keep = np.sort(rng.choice(len(self.rows), size, replace=False))
+            self.rows = [self.rows[i] for i in keep]
+            self.changes += 1
+
+
+def _key(model, run_id):
+    return (str(model), str(run_id))
+
+
+def filter_key(filters):
+    return json.dumps(filters, sort_keys=True, default=str)
+
+
+def _weighted_quantile(values, weights, q):
+    """``values`` sorted; the first value whose cumulative weight share reaches ``q``"""
+    cum = np.cumsum(weights)
+    idx = np.searchsorted(cum, min(max(q, 0.0), 1.0) * cum[-1], side="left")
+    return float(values[min(idx, len(values) - 1)])
+
+
+class _Estimator:
+    """Stratified estimates over the rows of the sample that match a filter"""
+
+    def __init__(self, codes, population, sampled, z):
+        self.codes = codes  # stratum code of every matched sampled row
+        self.N = population  # rows per stratum
+        self.n = sampled  # sampled rows per stratum
+        self.z = z
+        self.weights = np.divide(population, sampled, out=np.zeros(len(sampled)), where=sampled > 0)
+        # N_h^2 (1 - f_h) / n_h: zero for strata held entirely
+        fpc = 1 - sampled / np.maximum(population, 1)
+        self._var_factor = np.where(sampled > 0, population ** 2 * fpc / np.maximum(sampled, 1), 0.0)
+
+    def _bincount(self, codes, values=None):
+        return np.bincount(codes, weights=values, minlength=len(self.N)).astype(float)
+
+    def _stratum_variance(self, sum_z, sum_zz):
+        n = self.n
+        with np.errstate(divide="ignore", invalid="ignore"):
+            s2 = np.where(n > 1, (sum_zz - sum_z ** 2 / np.maximum(n, 1)) / np.maximum(n - 1, 1), 0.0)
+        return float(np.sum(self._var_factor * np.maximum(s2, 0.0)))
+
+    def count(self):
+        m = self._bincount(self.codes)
+        estimate = float(np.sum(self.weights * m))
+        half = self.z * math.sqrt(self._stratum_variance(m, m))
+        return estimate, (max(estimate - half, 0.0), estimate + half)
+
+    def mean(self, values):
+        """Ratio estimate of the mean of ``values`` (NaN = row not counted) and its interval"""
+        present = ~np.isnan(values)
+        codes, y = self.codes[present], values[present]
+        if not len(y):
+            return None, None
+        m, sy, syy = self._bincount(codes), self._bincount(codes, y), self._bincount(codes, y * y)
+        total = float(np.sum(self.weights * m))
+        ratio = float(np.sum(self.weights * sy)) / total
+        # Linearized residuals z = y - R over matched rows (0 elsewhere in the stratum)
+        sum_z = sy - ratio * m
+        sum_zz = syy - 2 * ratio * sy + ratio ** 2 * m
+        half = self.z * math.sqrt(self._stratum_variance(sum_z, sum_zz)) / total
+        return ratio, (ratio - half, ratio + half)
+
+    def quantiles(self, values, qs):
+        """Estimate and Woodruff interval for each quantile in ``qs`` (one sort for all)"""
+        present = ~np.isnan(values)
+        codes, y = self.codes[present], values[present]
+        if not len(y):
+            return [(None, None) for _ in qs]
+        order = np.argsort(y, kind="stable")
+        y_sorted, w_sorted = y[order], self.weights[codes[order]]
+        results = []
+        for q in qs:
+            estimate = _weighted_quantile(y_sorted, w_sorted, q)
+            # Interval of F(estimate), mapped back through the quantile function
+            _, bounds = _Estimator(codes, self.N, self.n, self.z).mean(np.where(y <= estimate, 1.0, 0.0))
+            half = (bounds[1] - bounds[0]) / 2
+            results.append((estimate, (_weighted_quantile(y_sorted, w_sorted, q - half),
+                                       _weighted_quantile(y_sorted, w_sorted, q + half))))
+        return results
+
+    def mode(self, values):
+        present = ~np.isnan(values)
+        if not present.any():
+            return None
+        totals = pd.Series(self.weights[self.codes[present]]).groupby(values[present]).sum()
+        return totals.idxmax()
+
+
+def _round(value):
+    return None if value is None or (isinstance(value, float) and math.isnan(value)) else float(value)
+
+
+def _block_frame(rows):
+    """
+    Sampled rows as a frame: numbers as float64, text left as Python objects
+    (None when missing), which filter the same way and concatenate much faster
+    than pandas strings
+    """
+    frame = pd.DataFrame.from_records(rows, columns=_COLUMNS)
+    for col in _COLUMNS:
+        if col in _NUMERIC_COLUMNS:
+            frame[col] = pd.to_numeric(frame[col], errors="coerce").astype("float64")
+        else:
+            frame[col] = frame[col].astype(object).where(frame[col].notna(), None)
+    return frame
+
+
+def _arrays(frame):
+    """Numeric columns the estimates need, computed once per sample frame"""
+    return {
+        "latency": frame["latency_ms"].to_numpy(dtype=float),
+        "crashed": (frame["crash_log"].fillna("") != "").to_numpy(dtype=float) * 100,
+        "positive": (frame["user_feedback"] == "up").fillna(False).to_numpy(dtype=float) * 100,
+        "temperature": frame["device_temperature"].astype("float64").to_numpy(),
+        "battery": frame["battery_percentage"].to_numpy(dtype=float),
+        "ts": pd.to_numeric(frame["request_id"], errors="coerce").to_numpy(dtype=float),
+    }
+
+
+def _headline(est, arrays):
+    """Same metrics as snapshot.summarize / the dashboard tiles, with confidence bounds"""
+    latency = arrays["latency"]
+    (p50, p50_bounds), (p95, p95_bounds) = est.quantiles(latency, (0.50, 0.95))
+    metrics, bounds = {}, {}
+    for key, (value, interval) in {
+        "avg_latency_ms": est.mean(latency),
+        "p50_latency_ms": (p50, p50_bounds),
+        "p95_latency_ms": (p95, p95_bounds),
+        "crash_rate_pct": est.mean(arrays["crashed"]),
+        "positive_feedback_pct": est.mean(arrays["positive"]),
+        "avg_battery_pct": est.mean(arrays["battery"]),
+    }.items():
+        metrics[key] = _round(value)
+        bounds[key] = [_round(interval[0]), _round(interval[1])] if interval else None
+    # Extremes of the sample: the true min / max can only be further out
+    has_latency = not np.isnan(latency).all()
+    metrics["min_latency_ms"] = _round(np.nanmin(latency)) if has_latency else None
+    metrics["max_latency_ms"] = _round(np.nanmax(latency)) if has_latency else None
+    temp = est.mode(arrays["temperature"])
+    metrics["most_common_temperature"] = THERMAL_LEVELS.get(int(temp), str(temp)) if temp is not None else None
+    return metrics, bounds
+
+
+class StratifiedSample:
+    """Reservoirs per (model, run), maintained incrementally like the fleet cube"""
+
+    def __init__(self, loader, lock=None, size=SAMPLE_RESERVOIR_SIZE, max_rows=SAMPLE_MAX_ROWS, seed=SAMPLE_SEED):
+        # loader(columns) is called under ``lock`` and must capture the storage
+        # there (log_store.capture_view); it returns a function that yields raw
+        # DataFrame chunks of that capture. Rows observed while the reservoirs are
+        # built from it are buffered and offered afterwards, like the fleet cube.
+        self._loader = loader
+        self._lock = lock or threading.RLock()
+        self._build_lock = threading.Lock()
+        self._pending = None  # rows observed while the reservoirs are being built
+        self._generation = 0  # bumped by reset(): a build that started before is discarded
+        self.max_size = size
+        self.max_rows = max_rows
+        self.size = size  # current per-stratum size
+        self.seed = seed
+        self._rng = np.random.default_rng(seed)
+        self._strata = None
+        self._frame = None  # (version, sample frame, populations, sample sizes)
+        self.version = 0  # bumped on every change; exact summaries are tagged with it
+
+    def _reservoir(self, key):
+        reservoir = self._strata.get(key)
+        if reservoir is None:
+            reservoir = self._strata[key] = Reservoir(self.size)
+            share = max(SAMPLE_MIN_RESERVOIR, min(self.max_size, self.max_rows // len(self._strata)))
+            if share < self.size:
+                self.size = share
+                for other in self._strata.values():
+                    other.shrink(share, self._rng)
+        return reservoir
+
+    def _offer_chunk(self, chunk):
+        chunk = normalize_chunk(chunk)[_COLUMNS]
+        records = chunk.to_numpy(dtype=object)
+        groups = chunk.groupby(["model_name", "run_id"], dropna=False, sort=False).indices
+        for (model, run_id), idx in groups.items():
+            self._reservoir(_key(model, run_id)).offer(
+                len(idx), self._rng, lambda positions, idx=idx: records[idx[positions]].tolist())
+
+    def _offer_rows(self, rows):
+        groups = {}
+        for row in rows:
+            groups.setdefault(_key(row.get("model_name"), row.get("run_id")), []).append(row)
+        for key, group in groups.items():
+            self._reservoir(key).offer(
+                len(group), self._rng,
+                lambda positions, group=group: [[group[i].get(c) for c in _COLUMNS] for i in positions])
+
+    def _ensure(self):
+        """Build the reservoirs once, scanning a capture of storage without holding the lock"""
+        with self._lock:
+            if self._strata is not None:
+                return
+        with self._build_lock:
+            while True:
+                with self._lock:
+                    if self._strata is not None:
+                        return
+                    generation = self._generation
+                    self._pending = []
+                    read_chunks = self._loader(_COLUMNS)
+                # A private instance holds the reservoirs (and sizes, RNG) while they fill up
+                build = StratifiedSample(None, size=self.max_size, max_rows=self.max_rows, seed=self.seed)
+                build._strata = {}
+                try:
+                    for chunk in read_chunks():
+                        build._offer_chunk(chunk)
+                except BaseException:
+                    with self._lock:
+                        self._pending = None
+                    raise
+                with self._lock:
+                    if generation != self._generation:
+                        continue  # logs cleared / dropped while building: build again
+                    self._strata, self.size, self._rng = build._strata, build.size, build._rng
+                    pending, self._pending = self._pending, None
+                    self._offer_rows(pending)
+                    return
+
+    def observe(self, rows):
+        """Offer freshly written rows to their strata (buffered while the samples are being built)"""
+        with self._lock:
+            self.version += 1
+            if self._strata is None:
+                if self._pending is not None:
+                    self._pending.extend(rows)
+                return
+            self._offer_rows(rows)
+
+    def reset(self):
+        with self._lock:
+            self._strata = None
+            self._pending = None
+            self._generation += 1
+            self._frame = None
+            self.size = self.max_size
+            self._rng = np.random.default_rng(self.seed)
+            self.version += 1
+
+    def build(self):
+        """Load the samples from storage now instead of on the first query"""
+        self._sample_frame()
+
+    def _sample_frame(self):
+        """
+        All sampled rows with their stratum code. Each stratum's block is
+        normalized once per change, so after an ingest only the strata it
+        touched are rebuilt.
+        """
+        strata = None
+        while strata is None:
+            self._ensure()
+            with self._lock:
+                if self._strata is None:
+                    continue  # reset since it was built
+                if self._frame is not None and self._frame[0] == self.version:
+                    return self._frame[1:]
+                version = self.version
+                # Cached block of each stratum, or a copy of its rows to normalize outside the lock
+                strata = []
+                for reservoir in self._strata.values():
+                    block = reservoir.block if reservoir.block and reservoir.block[0] == reservoir.changes else None
+                    strata.append((reservoir, reservoir.changes, reservoir.seen, block,
+                                   None if block else list(reservoir.rows)))
+                keys = list(self._strata)
+
+        blocks = []
+        for reservoir, changes, _, block, rows in strata:
+            if block is None:
+                frame = _block_frame(rows)
+                block = (changes, frame, _arrays(frame))
+            blocks.append(block)
+        if blocks:
+            frame = pd.concat([block[1] for block in blocks], ignore_index=True)
+            arrays = {name: np.concatenate([block[2][name] for block in blocks]) for name in blocks[0][2]}
+        else:
+            frame = _block_frame([])
+            arrays = _arrays(frame)
+        sampled = np.array([len(block[1]) for block in blocks], dtype=float)
+        arrays["stratum"] = np.repeat(np.arange(len(blocks)), sampled.astype(np.int64))
+        population = np.array([seen for _, _, seen, _, _ in strata], dtype=float)
+        result = (frame, arrays, population, sampled, keys)
+
+        with self._lock:
+            for (reservoir, changes, _, _, _), block in zip(strata, blocks):
+                if reservoir.changes == changes:
+                    reservoir.block = block
+            if version == self.version:
+                self._frame = (version,) + result
+        return result
+
+    def estimate(self, filters, confidence=0.95):
+        """Approximate summary of the rows matching ``filters`` (export filter semantics)"""
+        started = time.perf_counter()
+        frame, frame_arrays, population, sampled, keys = self._sample_frame()
+        matched = np.flatnonzero(filter_mask(frame, filters).to_numpy())
+        z = NormalDist().inv_cdf(0.5 + confidence / 2)
+        arrays = {name: values[matched] for name, values in frame_arrays.items()}
+        codes = arrays.pop("stratum")
+        est = _Estimator(codes, population, sampled, z)
+        rows, rows_bounds = est.count()
+        metrics, bounds = _headline(est, arrays)
+
+        # Models and runs come from the stratum keys, no string column is touched
+        hit = np.unique(codes)
+        model_names = sorted({keys[code][0] for code in hit})
+        model_ids = {name: i for i, name in enumerate(model_names)}
+        row_models = np.array([model_ids.get(key[0], -1) for key in keys], dtype=np.int64)[codes]
+        order = np.argsort(row_models, kind="stable")
+        splits = np.searchsorted(row_models[order], np.arange(1, len(model_names)))
+        models = []
+        for model, idx in zip(model_names, np.split(order, splits)):
+            sub_arrays = {name: values[idx] for name, values in arrays.items()}
+            sub_est = _Estimator(codes[idx], population, sampled, z)
+            sub_metrics, sub_bounds = _headline(sub_est, sub_arrays)
+            ts = sub_arrays["ts"]
+            models.append({
+                "model_name": model,
+                "requests": round(sub_est.count()[0]),
+                **sub_metrics,
+                "runtime_min": _round((np.nanmax(ts) - np.nanmin(ts)) / 60000) if not np.isnan(ts).all() else None,
+                "bounds": sub_bounds,
+            })
+        return {
+            "exact": bool(np.all(sampled == population)),
+            "confidence": confidence,
+            "rows": round(rows),
+            "rows_bounds": [round(rows_bounds[0]), round(rows_bounds[1])],
+            "runs": len({keys[code][1] for code in hit}),
+            "metrics": metrics,
+            "bounds": bounds,
+            "models": models,
+            "population": int(population.sum()),
+            "sampled": int(sampled.sum()),
+            "matched_sample": int(len(matched)),
+            "strata": int(len(population)),
+            "reservoir_size": self.size,
+            "elapsed_ms": (time.perf_counter() - started) * 1000,
+        }
+
+
+class _Totals:
+    """Running aggregates of one group of rows, for snapshot.summarize's metrics"""
+
+    __slots__ = ("rows", "latency_n", "latency_sum", "latency_min", "latency_max", "crashed", "positive",
+                 "battery_n", "battery_sum", "temperatures", "ts_min", "ts_max", "sketch", "values")
+
+    def __init__(self):
+        self.rows = self.latency_n = self.crashed = self.positive = self.battery_n = 0
+        self.latency_sum = self.battery_sum = 0.0
+        self.latency_min = self.ts_min = math.inf
+        self.latency_max = self.ts_max = -math.inf
+        self.temperatures = {}
+        self.sketch = LatencySketch()
+        self.values = []  # latencies while every group's fit SUMMARY_MAX_VALUES
+
+    def add(self, arrays, keep_values):
+        latency = arrays["latency"][~np.isnan(arrays["latency"])]
+        self.rows += len(arrays["latency"])
+        if len(latency):
+            self.latency_n += len(latency)
+            self.latency_sum += float(latency.sum())
+            self.latency_min = min(self.latency_min, float(latency.min()))
+            self.latency_max = max(self.latency_max, float(latency.max()))
+            keys, counts = np.unique(self.sketch.bucket_keys(latency), return_counts=True)
+            self.sketch.add_buckets(keys, counts)
+            if keep_values:
+                self.values.append(latency)
+        self.crashed += int(arrays["crashed"].sum())
+        self.positive += int(arrays["positive"].sum())
+        battery = arrays["battery"][~np.isnan(arrays["battery"])]
+        self.battery_n += len(battery)
+        self.battery_sum += float(battery.sum())
+        temps, counts = np.unique(arrays["temperature"][~np.isnan(arrays["temperature"])], return_counts=True)
+        for temp, n in zip(temps.tolist(), counts.tolist()):
+            self.temperatures[temp] = self.temperatures.get(temp, 0) + n
+        ts = arrays["ts"][~np.isnan(arrays["ts"])]
+        if len(ts):
+            self.ts_min = min(self.ts_min, float(ts.min()))
+            self.ts_max = max(self.ts_max, float(ts.max()))
+
+    def p95_ranks(self):
+        """Order statistics (0-based) that pandas' linear-interpolated p95 reads, and the weight of the upper one"""
+        position = 0.95 * (self.latency_n - 1)
+        low = math.floor(position)
+        return low, min(low + 1, self.latency_n - 1), position - low
+
+    def headline(self, p95):
+        rows = self.rows
+        temp = min(self.temperatures, key=lambda t: (-self.temperatures[t], t)) if self.temperatures else None
+        return {
+            "avg_latency_ms": self.latency_sum / self.latency_n if self.latency_n else None,
+            "min_latency_ms": self.latency_min if self.latency_n else None,
+            "max_latency_ms": self.latency_max if self.latency_n else None,
+            "p95_latency_ms": p95,
+            "crash_rate_pct": self.crashed / rows * 100 if rows else None,
+            "positive_feedback_pct": self.positive / rows * 100 if rows else None,
+            "most_common_temperature": THERMAL_LEVELS.get(int(temp), str(temp)) if temp is not None else None,
+            "avg_battery_pct": self.battery_sum / self.battery_n if self.battery_n else None,
+        }
+
+
+def _summary_arrays(chunk):
+    return {
+        "latency": chunk["latency_ms"].to_numpy(dtype=float),
+        "crashed": (chunk["crash_log"].fillna("") != "").to_numpy(dtype=bool),
+        "positive": (chunk["user_feedback"] == "up").fillna(False).to_numpy(dtype=bool),
+        "temperature": chunk["device_temperature"].astype("float64").to_numpy(),
+        "battery": chunk["battery_percentage"].to_numpy(dtype=float),
+        "ts": _timestamps(chunk["request_id"]),
+    }
+
+
+def _timestamps(request_ids):
+    """request_id as float; the plain cast is several times faster than to_numeric when every id is a number"""
+    try:
+        return request_ids.to_numpy(dtype=float, na_value=np.nan)
+    except (TypeError, ValueError):
+        return pd.to_numeric(request_ids, errors="coerce").to_numpy(dtype=float)
+
+
+def _summary_groups(chunk):
+    """(model or None for every row, arrays) of one filtered chunk"""
+    arrays = _summary_arrays(chunk)
+    yield None, arrays
+    for model, idx in chunk.groupby("model_name", sort=False).indices.items():
+        yield model, {name: values[idx] for name, values in arrays.items()}
+
+
+def _bucket_ranks(sketch, ranks):
+    """Sketch bucket holding each order statistic of ``ranks``, and how many values lie below it"""
+    found = {}
+    below = 0
+    for key in sorted(sketch.counts, key=lambda k: -math.inf if k is None else k):
+        count = sketch.counts[key]
+        for rank in ranks:
+            if rank not in found and rank < below + count:
+                found[rank] = (-math.inf if key is None else key, below)
+        below += count
+    return found
+
+
+def _bucket_values(sketch, latency, keys):
+    """The latencies of ``latency`` that fall in the sketch buckets ``keys`` (zero bucket: -inf)"""
+    buckets = sketch.bucket_keys(latency)
+    buckets[np.isnan(buckets)] = -math.inf
+    return latency[np.isin(buckets, list(keys))]
+
+
+def exact_summary(filters):
+    """
+    Exact summary of the rows matching ``filters`` (snapshot.summarize's output),
+    streamed chunk by chunk into running totals per model. Exact p95s need order
+    statistics: while every group's latencies fit SUMMARY_MAX_VALUES they are
+    kept and read directly; past that, a second pass over the same captured
+    storage keeps only the one or two sketch buckets (about 2% wide) holding them.
+    """
+    started = time.perf_counter()
+    view = log_store.capture_view()
+    groups, runs = {}, set()
+    kept = 0
+    for chunk in iter_filtered_chunks(filters, view=view):
+        chunk = chunk[_SUMMARY_COLUMNS]
+        runs.update(chunk["run_id"].dropna().unique().tolist())
+        keep_values = kept is not None
+        for model, arrays in _summary_groups(chunk):
+            groups.setdefault(model, _Totals()).add(arrays, keep_values)
+        if keep_values:
+            kept += 2 * int((~np.isnan(chunk["latency_ms"].to_numpy(dtype=float))).sum())
+            if kept > SUMMARY_MAX_VALUES:
+                kept = None
+                for totals in groups.values():
+                    totals.values = []
+
+    p95 = {}
+    if kept is not None:
+        for model, totals in groups.items():
+            values = np.concatenate(totals.values) if totals.values else np.empty(0)
+            p95[model] = float(np.quantile(values, 0.95)) if len(values) else None
+    else:
+        targets = {}
+        for model, totals in groups.items():
+            if totals.latency_n:
+                low, high, _ = totals.p95_ranks()
+                targets[model] = _bucket_ranks(totals.sketch, (low, high))
+        found = {model: [] for model in targets}
+        for chunk in iter_filtered_chunks(filters, view=view):
+            for model, arrays in _summary_groups(chunk[_SUMMARY_COLUMNS]):
+                if model in targets:
+                    latency = arrays["latency"][~np.isnan(arrays["latency"])]
+                    keys = {key for key, _ in targets[model].values()}
+                    found[model].append(_bucket_values(groups[model].sketch, latency, keys))
+        for model, totals in groups.items():
+            if model not in targets:
+                p95[model] = None
+                continue
+            values = np.sort(np.concatenate(found[model]))
+            low, high, weight = totals.p95_ranks()
+            below = min(below for _, below in targets[model].values())
+            x_low, x_high = values[low - below], values[high - below]
+            p95[model] = float(x_low + (x_high - x_low) * weight)
+
+    overall = groups.get(None, _Totals())
+    models = []
+    for model in sorted(m for m in groups if m is not None):
+        totals = groups[model]
+        models.append({
+            "model_name": model,
+            "requests": totals.rows,
+            **totals.headline(p95[model]),
+            "runtime_min": (totals.ts_max - totals.ts_min) / 60000 if totals.ts_max >= totals.ts_min else None,
+        })
+    return {
+        "rows": overall.rows,
+        "runs": len(runs),
+        "metrics": overall.headline(p95.get(None)),
+        "models": models,
+        "elapsed_ms": (time.perf_counter() - started) * 1000,
+    }
+
+
+class ExactSummaries:
+    """Exact summaries per filter set, computed on demand or by one background worker"""
+
+    def __init__(self, compute=exact_summary, max_pending=4, max_results=EXACT_CACHE_SIZE):
+        self._compute = compute
+        self._results = OrderedDict()  # filter key -> entry
+        self._pending = deque(maxlen=max_pending)  # newest requests win; older ones are dropped
+        self._max_results = max_results
+        self._cond = threading.Condition()
+        self._worker = None
+
+    def _store(self, key, entry):
+        self._results[key] = entry
+        self._results.move_to_end(key)
+        while len(self._results) > self._max_results:
+            self._results.popitem(last=False)
+
+    def _run(self, key, filters, version):
+        with self._cond:
+            previous = self._results.get(key)
+            self._store(key, {**(previous or {}), "status": "running", "requested_version": version})
+        try:
+            result = self._compute(filters)
+            entry = {"status": "done", "version": version, "computed_at": time.time(), "result": result}
+        except Exception as e:  # reported to the client, the worker keeps going
+            entry = {"status": "failed", "version": version, "error": str(e)}
+        with self._cond:
+            self._store(key, entry)
+        return entry
+
+    def compute(self, filters, version):
+        """Compute now (blocking) and remember the result"""
+        return self._run(filter_key(filters), filters, version)
+
+    def lookup(self, filters, version, background=True):
+        """
+        Latest known exact summary for ``filters`` (possibly older than
+        ``version``, flagged ``stale``); queues a background computation when it
+        is missing or stale
+        """
+        key = filter_key(filters)
+        with self._cond:
+            entry = self._results.get(key)
+            fresh = entry is not None and (entry.get("version") == version or entry.get("requested_version") == version)
+            if background and not fresh and all(k != key for k, _, _ in self._pending):
+                self._pending.append((key, filters, version))
+                if entry is None:
+                    entry = {"status": "queued"}
+                    self._store(key, entry)
+                self._cond.notify()
+                if self._worker is None:
+                    self._worker = threading.Thread(target=self._loop, name="exact-summaries", daemon=True)
+                    self._worker.start()
+            if entry is None:
+                return None
+            return {**entry, "stale": entry.get("version") is not None and entry["version"] != version}
+
+    def _loop(self):
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+                key, filters, version = self._pending.pop()  # newest first
+            self._run(key, filters, version)
+
+    def clear(self):
+        with self._cond:
+            self._results.clear()
+            self._pending.clear()
@@ -0,0 +1,89 @@
+"""
+Mergeable log-bucketed histogram for latency quantiles.
+
+Values are counted in buckets whose bounds grow geometrically by ``gamma``, so
+every quantile comes back within ``relative_accuracy`` of an actual sample
+(DDSketch-style) while memory depends only on the range of values, never on
+how many were added. Sketches merge and subtract by adding bucket counts, which
+is what makes cube roll-ups and sliding windows O(1) per row.
+"""
+import math
+import os
+
+import numpy as np
+
+RELATIVE_ACCURACY = float(os.environ.get("SKETCH_RELATIVE_ACCURACY", "0.01"))
+MIN_VALUE = 1e-3  # smaller values (and zeros) share one bucket
+
+
+class LatencySketch:
+    """Bucket counts of log(value) / log(gamma); add / remove / merge are O(1) per value"""
+
+    __slots__ = ("relative_accuracy", "_log_gamma", "counts", "count")
+
+    def __init__(self, relative_accuracy=RELATIVE_ACCURACY):
+        self.relative_accuracy = relative_accuracy
+        self._log_gamma = math.log((1 + relative_accuracy) / (1 - relative_accuracy))
+        self.counts = {}
+        self.count = 0
+
+    def _key(self, value):
+        if value <= MIN_VALUE:
+            return None
+        return math.ceil(math.log(value) / self._log_gamma)
+
+    def _value(self, key):
+        if key is None:
+            return 0.0
+        gamma = math.exp(self._log_gamma)
+        # Midpoint (in relative terms) of the bucket (gamma^(k-1), gamma^k]
+        return 2 * gamma ** key / (gamma + 1)
+
+    def add(self, value, n=1):
+        key = self._key(value)
+        self.counts[key] = self.counts.get(key, 0) + n
+        self.count += n
+
+    def bucket_keys(self, values):
+        """``_key`` of every value of a float array at once (NaN marks the zero bucket)"""
+        values = np.asarray(values, dtype=float)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            keys = np.ceil(np.log(values) / self._log_gamma)
+        keys[values <= MIN_VALUE] = np.nan
+        return keys
+
+    def add_buckets(self, keys, counts):
+        """Add counts per ``bucket_keys`` key (bulk form of ``add``)"""
+        for key, n in zip(keys, counts):
+            key = None if math.isnan(key) else int(key)
+            self.counts[key] = self.counts.get(key, 0) + int(n)
+            self.count += int(n)
+
+    def remove(self, value, n=1):
+        """Undo ``add(value, n)`` (sliding windows)"""
+        key = self._key(value)
+        left = self.counts.get(key, 0) - n
+        if left > 0:
+            self.counts[key] = left
+        else:
+            self.counts.pop(key, None)
+        self.count -= n
+
+    def merge(self, other):
+        for key, n in other.counts.items():
+            self.counts[key] = self.counts.get(key, 0) + n
+        self.count += other.count
+        return self
+
+    def quantile(self, q):
+        """Value at quantile ``q`` (lower-median rank), or None when empty"""
+        if self.count <= 0:
+            return None
+        rank = q * (self.count - 1)
+        seen = 0
+        keys = sorted(self.counts, key=lambda k: -math.inf if k is None else k)
+        for key in keys:
+            seen += self.counts[key]
+            if seen > rank:
+                return self._value(key)
+        return self._value(keys[-1])
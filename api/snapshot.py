@@ -0,0 +1,355 @@
+"""
+Immutable Arrow IPC snapshot of the whole log, shared with the dashboard.
+
+The API periodically writes every segment plus the live file into a single
+uncompressed Arrow IPC file and publishes it with an atomic rename, so readers
+only ever open a complete snapshot (a reader that still maps the previous one
+keeps its inode alive). The dashboard memory-maps the file: columns are read
+without parsing and pages are shared between processes through the OS page
+cache. The schema metadata records which segments and how many bytes of the
+live file the snapshot covers, so readers can append newer rows themselves.
+A small ``summary.json`` (headline metrics and the per-model table) is
+published next to it for the dashboard's cold start.
+
+Segments are immutable, so each one is converted once into a normalized Arrow
+IPC file of its own under ``snapshots/segments``; every publish streams their
+record batches from memory maps into the new snapshot and only parses the
+live-file bytes written since the previous one, so the API never holds the whole
+log. The summary is computed with Arrow compute on the published, memory-mapped file.
+"""
+import io
+import json
+import os
+import threading
+import time
+
+import pandas as pd
+
+import log_store
+from analysis import THERMAL_LEVELS
+from export import EXPORT_CHUNK_ROWS, arrow_schema, normalize_chunk
+
+SNAPSHOT_DIR = os.environ.get("LATENCY_SNAPSHOT_DIR", "snapshots")
+SNAPSHOT_FILE = os.path.join(SNAPSHOT_DIR, "latency.arrow")
+SUMMARY_FILE = os.path.join(SNAPSHOT_DIR, "summary.json")
+# One normalized Arrow IPC file per segment, streamed into every snapshot
+SEGMENT_CACHE_DIR = os.path.join(SNAPSHOT_DIR, "segments")
+SNAPSHOT_INTERVAL_S = float(os.environ.get("SNAPSHOT_INTERVAL_S", "60"))  # 0 = disabled
+METADATA_KEY = b"snapshot"
+
+# Published as int64 when every value is numeric, as the dashboard expects
+NUMERIC_ID_COLUMNS = ("run_id", "request_id")
+
+_last_published = None  # storage state covered by the current snapshot
+_segment_files = {}  # segment stem -> (rows, numeric id columns) of the IPC file converted by this process
+_live = {"active_since": None, "offset": 0, "tables": [], "numeric_ids": set(NUMERIC_ID_COLUMNS)}  # parsed so far
+_publish_lock = threading.Lock()
+
+
+def storage_state(manifest):
+    """Segments (by stem, so compaction is not a change) and the live file's epoch"""
+    return {
+        "segments": [seg["name"].split(".")[0] for seg in manifest["segments"]],
+        "active_since": manifest.get("active_since"),
+    }
+
+
+def _to_table(frame):
+    import pyarrow as pa
+
+    return pa.Table.from_pandas(normalize_chunk(frame), schema=arrow_schema(), preserve_index=False)
+
+
+def _numeric_ids(table):
+    """The NUMERIC_ID_COLUMNS of ``table`` whose values are all integers"""
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    numeric = set()
+    for col in NUMERIC_ID_COLUMNS:
+        try:
+            pc.cast(table[col], pa.int64())
+        except pa.ArrowInvalid:
+            continue
+        numeric.add(col)
+    return numeric
+
+
+def _parse_csv(data):
+    """Arrow tables of CSV bytes (header included), one per export chunk"""
+    if not data.strip():
+        return []
+    return [_to_table(chunk) for chunk in log_store.read_csv(io.BytesIO(data), chunksize=EXPORT_CHUNK_ROWS)
+            if not chunk.empty]
+
+
+def _segment_file(stem):
+    return os.path.join(SEGMENT_CACHE_DIR, stem + ".arrow")
+
+
+def _convert_segment(entry):
+    """
+    The segment as a normalized Arrow IPC file, converted chunk by chunk the first
+    time this process publishes it: (rows, numeric id columns)
+    """
+    import pyarrow as pa
+
+    stem = entry["name"].split(".")[0]
+    if stem not in _segment_files:
+        rows, numeric = 0, set(NUMERIC_ID_COLUMNS)
+        os.makedirs(SEGMENT_CACHE_DIR, exist_ok=True)
+        tmp = _segment_file(stem) + ".tmp"
+        with pa.OSFile(tmp, "wb") as sink:
+            with pa.ipc.new_file(sink, arrow_schema()) as writer:
+                for chunk in log_store.iter_segment_chunks(entry, EXPORT_CHUNK_ROWS):
+                    table = _to_table(chunk)
+                    rows += table.num_rows
+                    numeric &= _numeric_ids(table)
+                    writer.write_table(table)
+        os.replace(tmp, _segment_file(stem))
+        _segment_files[stem] = (rows, numeric)
+    return _segment_files[stem]
+
+
+def _forget_segments(stems):
+    """Delete the converted files of segments that are no longer in the manifest"""
+    for stem in [stem for stem in _segment_files if stem not in stems]:
+        del _segment_files[stem]
+    try:
+        names = os.listdir(SEGMENT_CACHE_DIR)
+    except FileNotFoundError:
+        return
+    for name in names:
+        # Files of dropped segments, or left by an earlier process (not trusted, converted again)
+        if name.split(".")[0] not in _segment_files:
+            try:
+                os.remove(os.path.join(SEGMENT_CACHE_DIR, name))
+            except FileNotFoundError:
+                pass
+
+
+def _segment_batches(stem):
+    import pyarrow as pa
+
+    with pa.memory_map(_segment_file(stem)) as source:
+        reader = pa.ipc.open_file(source)
+        for i in range(reader.num_record_batches):
+            yield reader.get_batch(i)
+
+
+def _snapshot_schema(numeric_ids):
+    """``arrow_schema`` with the ids stored as int64 when every value is numeric"""
+    import pyarrow as pa
+
+    schema = arrow_schema()
+    for col in numeric_ids:
+        schema = schema.set(schema.get_field_index(col), pa.field(col, pa.int64()))
+    return schema
+
+
+def _conform_batch(batch, schema):
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    columns = [column if column.type == field.type else pc.cast(column, field.type)
+               for column, field in zip(batch.columns, schema)]
+    return pa.RecordBatch.from_arrays(columns, schema=schema)
+
+
+def _read_live(manifest):
+    """
+    Capture the live-file bytes not parsed yet (caller holds write_lock).
+    Returns (state to parse them into, header, new bytes).
+    """
+    live = _live
+    with open(log_store.CSV_FILE, 'rb') as f:
+        header = f.readline()
+        size = os.fstat(f.fileno()).st_size
+        if live["active_since"] != manifest.get("active_since") or size < live["offset"]:
+            # Rotated or cleared since the last publish: start over
+            live = {"active_since": manifest.get("active_since"), "offset": 0, "tables": [],
+                    "numeric_ids": set(NUMERIC_ID_COLUMNS)}
+        f.seek(live["offset"])
+        data = f.read()
+    return live, header, data
+
+
+def _extend_live(live, header, data):
+    """Parse the newly captured bytes and return the live state covering them"""
+    if not data:
+        return live
+    tables = _parse_csv(data if live["offset"] == 0 else header + data)
+    numeric = set(live["numeric_ids"])
+    for table in tables:
+        numeric &= _numeric_ids(table)
+    return {**live, "offset": live["offset"] + len(data), "tables": live["tables"] + tables, "numeric_ids": numeric}
+
+
+def _num(value):
+    return None if value is None or pd.isna(value) else float(value)
+
+
+def _temp_label(temps):
+    mode = temps.dropna().mode()
+    return THERMAL_LEVELS.get(int(mode.iloc[0]), str(mode.iloc[0])) if len(mode) else None
+
+
+def _headline(df):
+    latency = df["latency_ms"]
+    return {
+        "avg_latency_ms": _num(latency.mean()),
+        "min_latency_ms": _num(latency.min()),
+        "max_latency_ms": _num(latency.max()),
+        "p95_latency_ms": _num(latency.quantile(0.95)),
+        "crash_rate_pct": _num((df["crash_log"].fillna("") != "").mean() * 100) if len(df) else None,
+        "positive_feedback_pct": _num((df["user_feedback"] == "up").mean() * 100) if len(df) else None,
+        "most_common_temperature": _temp_label(df["device_temperature"]),
+        "avg_battery_pct": _num(df["battery_percentage"].mean()),
+    }
+
+
+def summarize(df):
+    """Headline metrics and per-model table over the whole log (same definitions as the dashboard)"""
+    ts = pd.to_numeric(df["request_id"], errors="coerce")
+    models = []
+    for model, sub in df.groupby("model_name"):
+        sub_ts = ts.loc[sub.index]
+        models.append({
+            "model_name": model,
+            "requests": int(len(sub)),
+            **_headline(sub),
+            "runtime_min": _num((sub_ts.max() - sub_ts.min()) / 60000),
+        })
+    return {
+        "rows": int(len(df)),
+        "runs": int(df["run_id"].nunique()),
+        "metrics": _headline(df),
+        "models": models,
+    }
+
+
+def _arrow_num(scalar):
+    return _num(scalar.as_py())
+
+
+def _arrow_headline(table):
+    """``_headline`` with Arrow compute, without converting the table to pandas"""
+    import pyarrow.compute as pc
+
+    rows = table.num_rows
+    latency = table["latency_ms"]
+    extremes = pc.min_max(latency)
+    crashed = pc.not_equal(pc.fill_null(table["crash_log"], ""), "")
+    positive = pc.fill_null(pc.equal(table["user_feedback"], "up"), False)
+    temps = pc.mode(table["device_temperature"]).to_pylist()
+    return {
+        "avg_latency_ms": _arrow_num(pc.mean(latency)),
+        "min_latency_ms": _arrow_num(extremes["min"]),
+        "max_latency_ms": _arrow_num(extremes["max"]),
+        "p95_latency_ms": _num(pc.quantile(latency, q=0.95).to_pylist()[0]) if rows else None,
+        "crash_rate_pct": _num(pc.sum(crashed).as_py() / rows * 100) if rows else None,
+        "positive_feedback_pct": _num(pc.sum(positive).as_py() / rows * 100) if rows else None,
+        "most_common_temperature": (THERMAL_LEVELS.get(temps[0]["mode"], str(temps[0]["mode"]))
+                                    if temps else None),
+        "avg_battery_pct": _arrow_num(pc.mean(table["battery_percentage"])),
+    }
+
+
+def summarize_table(table):
+    """``summarize`` over an Arrow table (the published snapshot) with Arrow compute"""
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    ts = table["request_id"]
+    if not pa.types.is_integer(ts.type):
+        ts = pa.chunked_array([pa.array(pd.to_numeric(ts.to_pandas(), errors="coerce"), pa.float64())])
+    table = table.append_column("_ts", ts)
+    models = []
+    for model in sorted(pc.unique(table["model_name"]).drop_null().to_pylist()):
+        sub = table.filter(pc.equal(table["model_name"], model))
+        span = pc.min_max(sub["_ts"])
+        start, end = span["min"].as_py(), span["max"].as_py()
+        models.append({
+            "model_name": model,
+            "requests": int(sub.num_rows),
+            **_arrow_headline(sub),
+            "runtime_min": _num((end - start) / 60000) if start is not None else None,
+        })
+    return {
+        "rows": int(table.num_rows),
+        "runs": int(pc.count_distinct(table["run_id"]).as_py()),
+        "metrics": _arrow_headline(table),
+        "models": models,
+    }
+
+
+def _write_json(path, data):
+    tmp = path + ".tmp"
+    with open(tmp, 'w') as f:
+        json.dump(data, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def publish(force=False):
+    """
+    Write and atomically publish a new snapshot if the log changed since the
+    last one (or ``force``). Returns the snapshot metadata, or None if skipped.
+    """
+    global _last_published, _live
+    import pyarrow as pa
+
+    with _publish_lock:
+        # Only the live bytes written since the last publish are read under the lock
+        with log_store.write_lock:
+            log_store.ensure_csv_exists()
+            manifest = log_store.load_manifest()
+            live, header, data = _read_live(manifest)
+
+        state = {**storage_state(manifest), "live_offset": live["offset"] + len(data)}
+        if not force and state == _last_published and os.path.exists(SNAPSHOT_FILE):
+            return None
+
+        start = time.perf_counter()
+        live = _extend_live(live, header, data)
+        _forget_segments(set(state["segments"]))
+        segments = [(entry["name"].split(".")[0], _convert_segment(entry)) for entry in manifest["segments"]]
+        _live = live
+        numeric = set(live["numeric_ids"]).intersection(*(ids for _, (_, ids) in segments))
+        rows = sum(n for _, (n, _) in segments) + sum(table.num_rows for table in live["tables"])
+        meta = {**state, "rows": rows, "created_at": time.time()}
+        schema = _snapshot_schema(sorted(numeric)).with_metadata({METADATA_KEY: json.dumps(meta)})
+
+        os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+        tmp = SNAPSHOT_FILE + ".tmp"
+        with pa.OSFile(tmp, "wb") as sink:
+            with pa.ipc.new_file(sink, schema) as writer:
+                for stem, _ in segments:
+                    for batch in _segment_batches(stem):
+                        writer.write_batch(_conform_batch(batch, schema))
+                for table in live["tables"]:
+                    for batch in table.to_batches():
+                        writer.write_batch(_conform_batch(batch, schema))
+        with open(tmp, 'rb') as f:
+            os.fsync(f.fileno())
+        os.replace(tmp, SNAPSHOT_FILE)
+        with pa.memory_map(SNAPSHOT_FILE) as source:
+            summary = summarize_table(pa.ipc.open_file(source).read_all())
+        _write_json(SUMMARY_FILE, {**meta, **summary})
+
+        _last_published = state
+        return {**meta, "size_bytes": os.path.getsize(SNAPSHOT_FILE),
+                "build_ms": round((time.perf_counter() - start) * 1000, 1)}
+
+
+def snapshot_info():
+    """Metadata of the published snapshot, or None if there is none yet"""
+    import pyarrow as pa
+
+    try:
+        with pa.memory_map(SNAPSHOT_FILE) as source:
+            schema = pa.ipc.open_file(source).schema
+    except FileNotFoundError:
+        return None
+    return {**json.loads(schema.metadata[METADATA_KEY]), "size_bytes": os.path.getsize(SNAPSHOT_FILE)}
@@ -0,0 +1,43 @@
+"""
+Run the API modules against throwaway storage. The env vars must be set before
+any of them is imported: they read their configuration at import time.
+"""
+import os
+import sys
+import tempfile
+
+import pytest
+
+_STORAGE = tempfile.mkdtemp(prefix="latency_api_tests_")
+os.environ["LATENCY_LOG_FILE"] = os.path.join(_STORAGE, "latency_logs.csv")
+os.environ["LATENCY_SEGMENT_DIR"] = os.path.join(_STORAGE, "log_segments")
+os.environ["LATENCY_SNAPSHOT_DIR"] = os.path.join(_STORAGE, "snapshots")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import log_store  # noqa: E402
+
+
+@pytest.fixture
+def storage():
+    """An empty log (live file, no segments) for the test"""
+    log_store.clear_all()
+    yield log_store
+    log_store.clear_all()
+
+
+@pytest.fixture
+def make_rows():
+    """make_rows(n, **fields) -> n CSV row dicts of one run, one second apart"""
+    def make(n, run_id="1", start_ms=1765787547979, **fields):
+        return [{
+            "run_id": run_id,
+            "request_id": str(start_ms + i * 1000),
+            "model_name": "model-a",
+            "latency_ms": 1000.0 + i,
+            "device_model": "iPhone18,2",
+            "app_version": "1.0",
+            "device_temperature": 0,
+            "battery_percentage": 90.0,
+            **fields,
+        } for i in range(n)]
+    return make
@@ -0,0 +1,63 @@
+import pandas as pd
+
+import analysis
+from export import normalize_chunk
+
+
+def run_frame(latency, temperature, run_id="1"):
+    return normalize_chunk(pd.DataFrame({
+        "run_id": run_id,
+        "request_id": [str(1765787547979 + i * 1000) for i in range(len(latency))],
+        "model_name": "model-a",
+        "device_model": "iPhone18,2",
+        "latency_ms": latency,
+        "device_temperature": temperature,
+        "battery_percentage": 80.0,
+    }))[analysis.PHASE_COLUMNS]
+
+
+def test_missing_temperature_does_not_fail():
+    df = run_frame([1000.0] * 6, [0, None, 2, None, 2, 0])
+    assert df["device_temperature"].isna().sum() == 2
+    phases = analysis.annotate_thermal_phases(df, sustain=2)
+    # The gaps break every hot streak of 2, so nothing is throttled
+    assert (phases["phase"] != "throttled").all()
+    summary = analysis.thermal_summary(df, sustain=2)
+    assert summary["runs"][0]["requests"] == 6
+
+
+def test_single_hot_trailing_request_is_not_throttling():
+    df = run_frame([1000.0] * 8, [0] * 7 + [3])
+    phases = analysis.annotate_thermal_phases(df, sustain=3)
+    assert (phases["phase"] != "throttled").all()
+
+
+def test_throttling_starts_at_sustained_heat():
+    df = pd.concat([
+        run_frame([1000.0] * 10, [0, 0, 0, 0, 2, 2, 2, 2, 2, 2], run_id="1"),
+        run_frame([1000.0] * 10, [0, 3, 0, 0, 0, 0, 0, 0, 3, 3], run_id="2"),
+    ], ignore_index=True)
+    summary = analysis.thermal_summary(df, sustain=3)
+    runs = {run["run_id"]: run for run in summary["runs"]}
+    assert runs["1"]["throttle_onset_request_id"] == df["request_id"].iloc[4]
+    assert runs["2"]["throttle_onset_request_id"] is None
+
+
+def test_warmup_is_detected_per_run():
+    df = pd.concat([
+        run_frame([5000.0, 4000.0] + [1000.0] * 38, [0] * 40, run_id="1"),
+        run_frame([1000.0] * 40, [0] * 40, run_id="2"),
+    ], ignore_index=True)
+    phases = analysis.annotate_thermal_phases(df)
+    warmup = phases[phases["phase"] == "warmup"].groupby("run_id").size()
+    assert warmup.to_dict() == {"1": 2}
+
+
+def test_regression_between_numeric_looking_versions(storage, make_rows):
+    storage.append_rows(make_rows(60, app_version="1.0")
+                        + make_rows(50, run_id="2", app_version="1.10", latency_ms=1500.0)
+                        + make_rows(10, run_id="3", app_version="1"))
+    groups = analysis.load_latency_groups("app_version", ["1.0", "1.10"])
+    assert {version: len(values) for version, values in groups.items()} == {"1.0": 60, "1.10": 50}
+    result = analysis.compare_latency(groups["1.0"], groups["1.10"], n_boot=200)
+    assert result["regressed_metrics"] == ["p50", "p95"]
@@ -0,0 +1,12 @@
+import json
+
+import backend
+import log_store
+
+
+def test_stream_lines_are_validated_and_written_per_flush(storage, make_rows):
+    good = [json.dumps(row).encode() for row in make_rows(3)]
+    written, errors = backend.ingest_ndjson_lines(good[:2] + [b'{"run_id": "1"}'] + good[2:], 10)
+    assert written == 3
+    assert [line_no for line_no, _ in errors] == [12]
+    assert log_store.count_logs() == 3
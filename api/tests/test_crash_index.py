@@ -0,0 +1,33 @@
+import threading
+
+import backend
+import crash_index
+import log_store
+
+
+def test_reindex_does_not_block_ingestion(storage, make_rows, monkeypatch):
+    crash_index.clear()
+    monkeypatch.setattr(crash_index, "CRASH_LOG_IN_CSV", "full")
+    backend.publish_rows(make_rows(3, crash_log="Fatal error: OldFailure in loader"))
+    crash_index.clear()  # full text left in the log, as before the index existed
+
+    scanning, resume = threading.Event(), threading.Event()
+    iter_log_chunks = log_store.iter_log_chunks
+
+    def slow_chunks(*args, **kwargs):
+        scanning.set()
+        assert resume.wait(5)
+        yield from iter_log_chunks(*args, **kwargs)
+
+    monkeypatch.setattr(log_store, "iter_log_chunks", slow_chunks)
+    result = {}
+    worker = threading.Thread(target=lambda: result.update(crash_index.reindex()))
+    worker.start()
+    assert scanning.wait(5)
+    # Ingestion indexes its crashes while the logs are being scanned
+    backend.publish_rows(make_rows(2, run_id="2", crash_log="Fatal error: NewFailure in decoder"))
+    resume.set()
+    worker.join()
+    assert result["indexed_from_logs"] == 5
+    assert crash_index.count() == 5
+    assert result["signatures"] == 2
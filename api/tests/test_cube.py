@@ -0,0 +1,95 @@
+import threading
+
+import pytest
+
+import cube
+import log_store
+from cube import CUBE_METRICS, FleetCube
+
+
+def storage_cube():
+    def reader(columns):
+        view = log_store.capture_view()
+        return lambda: log_store.iter_log_chunks(chunksize=7, columns=columns, view=view)
+    return FleetCube(reader, lock=log_store.write_lock)
+
+
+def fleet_rows(make_rows):
+    rows = (make_rows(20, device_temperature=1)
+            + make_rows(15, run_id="2", model_name="model-b", device_model="iPhone 17 Pro Max",
+                        app_version="Version 1.0 (Build 3)", crash_log="boom")
+            + make_rows(10, run_id="3", app_version="2.0", device_temperature=""))
+    rows[3]["latency_ms"] = ""
+    rows[4]["battery_percentage"] = ""
+    rows[5]["latency_ms"] = 0.0
+    return rows
+
+
+def test_build_matches_row_by_row_updates(storage, make_rows):
+    rows = fleet_rows(make_rows)
+    storage.append_rows(rows)
+    built = storage_cube()
+
+    observed = FleetCube(lambda columns: (lambda: iter(())))
+    observed.dimensions()
+    observed.observe(rows)
+
+    for metric in CUBE_METRICS:
+        for axes in (("model", "device"), ("version", "thermal")):
+            expected = observed.pivot(*axes, metric=metric)
+            actual = built.pivot(*axes, metric=metric)
+            assert actual["row_labels"] == expected["row_labels"]
+            assert actual["col_labels"] == expected["col_labels"]
+            assert actual["counts"] == expected["counts"]
+            assert actual["values"] == [[pytest.approx(v) for v in row] for row in expected["values"]], metric
+
+
+def test_rows_written_during_the_build_count_once(storage, make_rows, monkeypatch):
+    storage.append_rows(make_rows(30))
+    fleet = storage_cube()
+    scanning, resume = threading.Event(), threading.Event()
+    build = fleet._build
+
+    def slow_build(chunks):
+        scanning.set()
+        assert resume.wait(5)
+        return build(chunks)
+
+    monkeypatch.setattr(fleet, "_build", slow_build)
+    worker = threading.Thread(target=fleet.dimensions)
+    worker.start()
+    assert scanning.wait(5)
+    # The scan does not hold the write lock: ingestion goes through meanwhile
+    with log_store.write_lock:
+        new_rows = make_rows(5, run_id="2", start_ms=1865787547979)
+        log_store.append_rows(new_rows)
+        fleet.observe(new_rows)
+    resume.set()
+    worker.join()
+    assert fleet.pivot("model", "device", "count")["counts"] == [[35]]
+
+
+def test_reset_during_build_rebuilds(storage, make_rows, monkeypatch):
+    storage.append_rows(make_rows(10))
+    fleet = storage_cube()
+    calls = []
+    build = fleet._build
+
+    def build_then_reset(chunks):
+        cells = build(chunks)
+        if not calls:
+            storage.clear_all()
+            fleet.reset()
+        calls.append(1)
+        return cells
+
+    monkeypatch.setattr(fleet, "_build", build_then_reset)
+    assert fleet.pivot("model", "device", "count")["counts"] == []
+    assert len(calls) == 2
+
+
+def test_vectorized_buckets_match_add():
+    sketch = cube.LatencySketch()
+    values = [0.0, 0.0005, 1.0, 12.5, 999.9, 1000.0, 25000.0]
+    keys = sketch.bucket_keys(values)
+    assert [None if k != k else int(k) for k in keys] == [sketch._key(v) for v in values]
@@ -0,0 +1,39 @@
+import io
+
+import pandas as pd
+
+import export
+import log_store
+
+
+def test_text_columns_are_read_as_text():
+    data = "run_id,request_id,app_version\n01,10,1.10\n2,,1\n"
+    out = export.normalize_chunk(log_store.read_csv(io.StringIO(data)))
+    assert out["app_version"].tolist() == ["1.10", "1"]
+    assert out["run_id"].tolist() == ["01", "2"]
+    assert out["request_id"].tolist()[0] == "10"
+    assert out["request_id"].isna().tolist() == [False, True]
+
+
+def test_version_filter_matches_decimal_version(storage, make_rows):
+    storage.append_rows(make_rows(3, app_version="1.0") + make_rows(2, run_id="2", app_version="2.0"))
+    rows = pd.concat(export.iter_filtered_chunks({"versions": ["1.0"]}))
+    assert len(rows) == 3
+    assert set(rows["app_version"]) == {"1.0"}
+
+    body = b"".join(export.stream_csv({"versions": ["1.0"]})).decode()
+    assert len(body.strip().splitlines()) == 1 + 3
+
+
+def test_numeric_looking_versions_stay_distinct(storage, make_rows):
+    versions = ["1.10", "1", "01"]
+    rows = [row for i, version in enumerate(versions)
+            for row in make_rows(2 + i, run_id=str(i), app_version=version)]
+    # One chunk may hold a single version, another all of them: same answer either way
+    storage.append_rows(rows[:2])
+    storage.rotate(force=True)
+    storage.append_rows(rows[2:])
+    for i, version in enumerate(versions):
+        matched = pd.concat(export.iter_filtered_chunks({"versions": [version]}))
+        assert matched["app_version"].tolist() == [version] * (2 + i)
+    assert sum(len(chunk) for chunk in export.iter_filtered_chunks({"versions": ["1.1", "1.0"]})) == 0
@@ -0,0 +1,40 @@
+import threading
+
+import log_store
+
+
+def test_rotation_reads_segment_stats_outside_the_write_lock(storage, make_rows, monkeypatch):
+    storage.append_rows(make_rows(4) + make_rows(2, run_id="2"))
+    segment_stats = log_store._segment_stats
+    pending = []
+
+    def stats_while_ingesting(entry):
+        # Another thread can take the write lock: ingestion is not blocked
+        writer = threading.Thread(target=log_store.append_rows, args=(make_rows(1, run_id="3"),))
+        writer.start()
+        writer.join(5)
+        assert not writer.is_alive()
+        pending.append(log_store.list_segments()[-1]["rows"])
+        return segment_stats(entry)
+
+    monkeypatch.setattr(log_store, "_segment_stats", stats_while_ingesting)
+    entry = storage.rotate(force=True)
+    assert pending == [None]
+    assert storage.count_logs() == 7
+    assert entry["rows"] == 6 and entry["run_ids"] == ["1", "2"]
+    assert storage.list_segments() == [entry]
+    assert entry["min_ts"] == 1765787547979 and entry["max_ts"] == 1765787547979 + 3000
+
+
+def test_statistics_stream_every_row(storage, make_rows):
+    assert storage.log_statistics()["total_records"] == 0
+    storage.append_rows(make_rows(3, app_version="1.10"))
+    storage.rotate(force=True)
+    storage.append_rows(make_rows(2, run_id="2", model_name="model-b", app_version="1"))
+    stats = storage.log_statistics()
+    assert stats["total_records"] == 5
+    assert stats["runs"] == ["1", "2"]
+    assert stats["models"] == ["model-a", "model-b"]
+    assert stats["versions"] == ["1.10", "1"]
+    assert stats["min_latency_ms"] == 1000.0 and stats["max_latency_ms"] == 1002.0
+    assert stats["avg_latency_ms"] == 1000.8
@@ -0,0 +1,78 @@
+import time
+
+import backend
+import crash_index
+import log_store
+
+OLD_MS = 1577836800000  # 2020-01-01
+
+
+def warm(run_id):
+    backend.fleet_cube.dimensions()
+    backend.samples.build()
+    backend.timelines.get(run_id)
+    backend.exact_summaries.compute({}, backend.samples.version)
+
+
+def cube_count():
+    counts = backend.fleet_cube.pivot("model", "device", "count")["counts"]
+    return sum(sum(row) for row in counts)
+
+
+def test_maintenance_retention_invalidates_derived_state(storage, make_rows, monkeypatch):
+    backend.forget_derived()
+    storage.append_rows(make_rows(5, start_ms=OLD_MS))
+    storage.rotate(force=True)
+    storage.append_rows(make_rows(3, run_id="2"))
+    warm("1")
+    assert cube_count() == 8
+    assert backend.timelines.get("1").count == 5
+
+    monkeypatch.setattr(log_store, "RETENTION_DAYS", 30)
+    result = backend.run_maintenance()
+    assert [seg["run_ids"] for seg in result["dropped"]] == [["1"]]
+    assert cube_count() == 3
+    assert backend.timelines.get("1").count == 0
+    assert backend.samples.estimate({}, 0.95)["population"] == 3
+    assert backend.exact_summaries.lookup({}, backend.samples.version, background=False) is None
+
+
+def test_dropping_nothing_keeps_derived_state(storage, make_rows):
+    backend.forget_derived()
+    storage.append_rows(make_rows(4))
+    warm("1")
+    backend.segments_dropped(log_store.apply_retention(run_ids=["9"]))
+    assert backend.exact_summaries.lookup({}, backend.samples.version, background=False) is not None
+
+
+def crash_runs(query=None):
+    return sorted((row["run_id"], row["request_id"]) for row in crash_index.search(query, {}, limit=100))
+
+
+def test_retention_prunes_the_crash_index(storage, make_rows, monkeypatch):
+    crash_index.clear()
+    old = make_rows(3, start_ms=OLD_MS, crash_log="Fatal error: OldFailure in loader")
+    backend.publish_rows(old)
+    storage.rotate(force=True)
+    backend.publish_rows(make_rows(2, run_id="2", crash_log="Fatal error: NewFailure in decoder"))
+    assert len(crash_runs()) == 5
+
+    monkeypatch.setattr(log_store, "RETENTION_DAYS", 30)
+    backend.run_maintenance()
+    assert crash_runs() == [("2", str(1765787547979)), ("2", str(1765787548979))]
+    assert crash_runs("OldFailure") == []
+    assert [row["count"] for row in crash_index.top_signatures({})] == [2]
+
+
+def test_crashes_of_a_run_still_stored_elsewhere_are_kept(storage, make_rows, monkeypatch):
+    crash_index.clear()
+    backend.publish_rows(make_rows(3, start_ms=OLD_MS, crash_log="Fatal error: OldFailure in loader"))
+    storage.rotate(force=True)
+    # Same run, overlapping request ids, in a segment retention keeps
+    backend.publish_rows(make_rows(1, start_ms=OLD_MS + 1500, crash_log="Fatal error: LateFailure in loader")
+                         + make_rows(1, run_id="2", start_ms=int(time.time() * 1000)))
+    storage.rotate(force=True)
+
+    monkeypatch.setattr(log_store, "RETENTION_DAYS", 30)
+    assert len(backend.run_maintenance()["dropped"]) == 1
+    assert crash_runs("LateFailure") == [("1", str(OLD_MS + 1500))]
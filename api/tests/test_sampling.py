@@ -0,0 +1,67 @@
+import threading
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import export
+import log_store
+import sampling
+import snapshot
+from sampling import StratifiedSample
+from test_snapshot import assert_same_summary
+
+
+def test_rows_written_during_the_build_count_once(storage, make_rows):
+    storage.append_rows(make_rows(30))
+    scanning, resume = threading.Event(), threading.Event()
+
+    def slow_reader(columns):
+        view = log_store.capture_view()
+
+        def chunks():
+            scanning.set()
+            assert resume.wait(5)
+            yield from log_store.iter_log_chunks(chunksize=7, columns=columns, view=view)
+        return chunks
+
+    samples = StratifiedSample(slow_reader, lock=log_store.write_lock)
+    worker = threading.Thread(target=samples.build)
+    worker.start()
+    assert scanning.wait(5)
+    # The scan does not hold the write lock: ingestion goes through meanwhile
+    with log_store.write_lock:
+        new_rows = make_rows(5, run_id="2", start_ms=1865787547979)
+        log_store.append_rows(new_rows)
+        samples.observe(new_rows)
+    resume.set()
+    worker.join()
+    summary = samples.estimate({})
+    assert summary["exact"]
+    assert summary["population"] == 35
+    assert summary["strata"] == 2
+
+
+@pytest.mark.parametrize("max_values", [sampling.SUMMARY_MAX_VALUES, 10])
+def test_exact_summary_streams_the_snapshot_definitions(storage, make_rows, monkeypatch, max_values):
+    monkeypatch.setattr(sampling, "SUMMARY_MAX_VALUES", max_values)
+    monkeypatch.setattr(export, "EXPORT_CHUNK_ROWS", 7)
+    rng = np.random.default_rng(1)
+    rows = (make_rows(40, device_temperature=2) + make_rows(25, run_id="2", model_name="model-b", user_feedback="up")
+            + make_rows(3, run_id="3", model_name="model-c", latency_ms="", crash_log="boom"))
+    for row in rows[:65]:
+        row["latency_ms"] = float(rng.lognormal(7, 0.5))
+    rows[1]["latency_ms"] = 0.0
+    rows[2]["battery_percentage"] = ""
+    rows[3]["device_temperature"] = ""
+    storage.append_rows(rows[:30])
+    storage.rotate(force=True)
+    storage.append_rows(rows[30:])
+
+    frame = pd.concat(export.iter_filtered_chunks({}), ignore_index=True)
+    frame["user_feedback"] = frame["user_feedback"].fillna("")
+    expected = snapshot.summarize(frame)
+    actual = sampling.exact_summary({})
+    del actual["elapsed_ms"]
+    assert_same_summary(actual, expected)
+    assert actual["metrics"]["p95_latency_ms"] == pytest.approx(frame["latency_ms"].quantile(0.95))
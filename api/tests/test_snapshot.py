@@ -0,0 +1,106 @@
+import json
+import os
+
+import pyarrow as pa
+import pytest
+
+import log_store
+import snapshot
+
+
+def read_published():
+    table = pa.ipc.open_file(pa.memory_map(snapshot.SNAPSHOT_FILE)).read_all()
+    with open(snapshot.SUMMARY_FILE) as f:
+        return table, json.load(f)
+
+
+def assert_same_summary(actual, expected):
+    assert actual.keys() == expected.keys()
+    for key, value in expected.items():
+        if isinstance(value, float):
+            assert actual[key] == pytest.approx(value), key
+        elif isinstance(value, dict):
+            assert_same_summary(actual[key], value)
+        elif isinstance(value, list):
+            assert len(actual[key]) == len(value), key
+            for got, want in zip(actual[key], value):
+                assert_same_summary(got, want)
+        else:
+            assert actual[key] == value, key
+
+
+def test_summary_from_arrow_matches_pandas(storage, make_rows):
+    rows = make_rows(5, device_temperature=2) + make_rows(4, run_id="2", model_name="model-b",
+                                                         user_feedback="up", crash_log="boom")
+    rows[1]["latency_ms"] = ""
+    rows[2]["battery_percentage"] = ""
+    rows[3]["user_feedback"] = "up"
+    storage.append_rows(rows)
+    snapshot.publish(force=True)
+    table, summary = read_published()
+    assert_same_summary(snapshot.summarize_table(table), snapshot.summarize(table.to_pandas()))
+    assert summary["rows"] == 9 and summary["runs"] == 2
+    assert [m["model_name"] for m in summary["models"]] == ["model-a", "model-b"]
+    assert summary["models"][1]["crash_rate_pct"] == 100.0
+
+
+def test_publish_parses_each_segment_once(storage, make_rows, monkeypatch):
+    storage.append_rows(make_rows(3))
+    storage.rotate(force=True)
+    storage.append_rows(make_rows(2, run_id="2"))
+    snapshot.publish()
+
+    reads = []
+    iter_segment_chunks = log_store.iter_segment_chunks
+
+    def counted(entry, *args, **kwargs):
+        if "columns" not in kwargs:  # rotation reads the ids for the segment's stats
+            reads.append(entry["name"])
+        return iter_segment_chunks(entry, *args, **kwargs)
+
+    monkeypatch.setattr(log_store, "iter_segment_chunks", counted)
+    storage.append_rows(make_rows(4, run_id="3"))
+    meta = snapshot.publish()
+    assert reads == []
+    assert meta["rows"] == 9
+
+    table, summary = read_published()
+    assert table["run_id"].to_pylist() == [1] * 3 + [2] * 2 + [3] * 4
+    assert summary["rows"] == 9 and summary["runs"] == 3
+    assert snapshot.publish() is None
+
+    storage.rotate(force=True)
+    storage.append_rows(make_rows(1, run_id="4"))
+    assert snapshot.publish()["rows"] == 10
+    assert len(reads) == 1  # only the newly rotated segment
+
+
+def test_publish_after_clear_starts_over(storage, make_rows):
+    storage.append_rows(make_rows(3))
+    snapshot.publish()
+    storage.clear_all()
+    storage.append_rows(make_rows(2, run_id="2"))
+    assert snapshot.publish()["rows"] == 2
+    table, _ = read_published()
+    assert table["run_id"].to_pylist() == [2, 2]
+
+
+def test_segments_are_streamed_from_their_own_files(storage, make_rows):
+    storage.append_rows(make_rows(3))
+    first = storage.rotate(force=True)
+    storage.append_rows(make_rows(2, run_id="loadgen-a"))
+    second = storage.rotate(force=True)
+    storage.append_rows(make_rows(1, run_id="2"))
+    snapshot.publish()
+    table, _ = read_published()
+    # One non-numeric run id keeps the column text everywhere
+    assert table["run_id"].to_pylist() == ["1"] * 3 + ["loadgen-a"] * 2 + ["2"]
+    assert table["request_id"].type == pa.int64()
+
+    storage.apply_retention(run_ids=["loadgen-a"])
+    assert snapshot.publish()["rows"] == 4
+    table, _ = read_published()
+    assert table["run_id"].to_pylist() == [1] * 3 + [2]
+    cached = sorted(name.split(".")[0] for name in os.listdir(snapshot.SEGMENT_CACHE_DIR))
+    assert cached == [first["name"].split(".")[0]]
+    assert second["name"].split(".")[0] not in snapshot._segment_files
@@ -0,0 +1,25 @@
+import timeline
+from timeline import RunTimeline
+
+
+def test_requests_without_timestamp_stay_out_of_the_time_window(monkeypatch):
+    monkeypatch.setattr(timeline, "MAX_POINTS", 100)
+    state = RunTimeline("1")
+    for i in range(300):
+        state.update(f"req-{i}", float(i))
+    assert len(state.by_time._sorted) == 0
+    points = state.to_dict()["points"]
+    assert points["p50_time"][-1] is None and points["p95_time"][-1] is None
+    assert points["p50"][-1] is not None
+
+    state.update("1765787547979", 10.0)
+    assert state.to_dict()["points"]["p50_time"][-1] == 10.0
+
+
+def test_time_window_is_capped(monkeypatch):
+    monkeypatch.setattr(timeline, "MAX_POINTS", 100)
+    state = RunTimeline("1")
+    for i in range(300):  # all inside one window of TIMELINE_WINDOW_S
+        state.update(str(1765787547979 + i), float(i))
+    assert len(state.by_time._sorted) == 100
+    assert state.to_dict()["points"]["p50_time"][-1] == 249.5
@@ -0,0 +1,232 @@
+"""
+Incremental rolling statistics and change-point detection per run.
+
+Every run keeps a small state object that is updated row by row as logs are
+ingested: rolling p50/p95 over the last N requests and over the last T seconds,
+an EWMA, and a two-sided CUSUM on log-latency that marks where the latency
+regime shifted. States are built lazily from storage the first time a run is
+requested, then only ever updated with new rows, so no request recomputes a
+run's full history. A state keeps the points of the last ``TIMELINE_MAX_POINTS``
+requests (and as many change points), so a long run costs bounded memory.
+"""
+import bisect
+import itertools
+import math
+import os
+import threading
+from collections import deque
+
+import pandas as pd
+
+ROLLING_WINDOW = int(os.environ.get("TIMELINE_WINDOW", "50"))  # requests
+ROLLING_WINDOW_S = float(os.environ.get("TIMELINE_WINDOW_S", "300"))  # seconds
+EWMA_ALPHA = float(os.environ.get("TIMELINE_EWMA_ALPHA", "0.1"))
+CUSUM_K = float(os.environ.get("TIMELINE_CUSUM_K", "0.5"))  # drift, in std units
+CUSUM_H = float(os.environ.get("TIMELINE_CUSUM_H", "5.0"))  # alarm threshold, in std units
+CUSUM_WARMUP = int(os.environ.get("TIMELINE_CUSUM_WARMUP", "20"))  # samples to estimate a regime
+MAX_POINTS = int(os.environ.get("TIMELINE_MAX_POINTS", "10000"))  # latest points kept per run
+
+
+class RollingWindow:
+    """Sliding window over the last ``size`` samples and/or ``seconds``, with quantiles"""
+
+    def __init__(self, size=None, seconds=None):
+        self.size = size
+        self.seconds = seconds
+        self._items = deque()  # (ts_ms, value) in arrival order
+        self._sorted = []
+
+    def add(self, ts_ms, value):
+        self._items.append((ts_ms, value))
+        bisect.insort(self._sorted, value)
+        while self._items and (
+            (self.size is not None and len(self._items) > self.size)
+            or (self.seconds is not None and ts_ms is not None and self._items[0][0] is not None
+                and ts_ms - self._items[0][0] > self.seconds * 1000)
+        ):
+            _, old = self._items.popleft()
+            del self._sorted[bisect.bisect_left(self._sorted, old)]
+
+    def quantile(self, q):
+        """Linear-interpolated quantile (same definition as pandas' default)"""
+        n = len(self._sorted)
+        if n == 0:
+            return None
+        pos = q * (n - 1)
+        lo = int(pos)
+        hi = min(lo + 1, n - 1)
+        return self._sorted[lo] + (self._sorted[hi] - self._sorted[lo]) * (pos - lo)
+
+
+class Cusum:
+    """Two-sided CUSUM; the regime's mean/std are re-estimated after every alarm"""
+
+    def __init__(self, k=CUSUM_K, h=CUSUM_H, warmup=CUSUM_WARMUP):
+        self.k, self.h, self.warmup = k, h, warmup
+        self._reset()
+
+    def _reset(self):
+        self.n, self.mean, self.m2 = 0, 0.0, 0.0
+        self.s_hi = self.s_lo = 0.0
+
+    def update(self, x):
+        """Feed one sample; returns "up" / "down" when a shift is detected"""
+        if self.n < self.warmup:
+            # Welford's running mean / variance for the current regime
+            self.n += 1
+            delta = x - self.mean
+            self.mean += delta / self.n
+            self.m2 += delta * (x - self.mean)
+            return None
+        std = math.sqrt(self.m2 / (self.n - 1)) or 1e-9
+        z = (x - self.mean) / std
+        self.s_hi = max(0.0, self.s_hi + z - self.k)
+        self.s_lo = max(0.0, self.s_lo - z - self.k)
+        if self.s_hi > self.h or self.s_lo > self.h:
+            direction = "up" if self.s_hi > self.h else "down"
+            self._reset()
+            return direction
+        return None
+
+
+class RunTimeline:
+    """Rolling stats and change points of one run, updated one request at a time"""
+
+    COLUMNS = ["request_id", "latency_ms", "p50", "p95", "p50_time", "p95_time", "ewma"]
+
+    def __init__(self, run_id):
+        self.run_id = run_id
+        self.by_count = RollingWindow(size=ROLLING_WINDOW)
+        # Capped as well: a burst of requests inside the window must not grow it without bound
+        self.by_time = RollingWindow(size=MAX_POINTS, seconds=ROLLING_WINDOW_S)
+        self.ewma = None
+        self.cusum = Cusum()
+        self.count = 0  # requests seen; only the last MAX_POINTS are kept
+        self.series = {col: deque(maxlen=MAX_POINTS) for col in self.COLUMNS}
+        self.change_points = deque(maxlen=MAX_POINTS)
+
+    def update(self, request_id, latency_ms):
+        try:
+            ts = float(request_id)
+        except (TypeError, ValueError):
+            ts = None
+        if ts is not None and not math.isfinite(ts):
+            ts = None
+        self.by_count.add(ts, latency_ms)
+        if ts is not None:
+            # A request without a timestamp has no place in the time window: its
+            # time-based quantiles are reported as null instead
+            self.by_time.add(ts, latency_ms)
+        p50_time = self.by_time.quantile(0.5) if ts is not None else None
+        p95_time = self.by_time.quantile(0.95) if ts is not None else None
+        self.ewma = latency_ms if self.ewma is None else EWMA_ALPHA * latency_ms + (1 - EWMA_ALPHA) * self.ewma
+
+        for col, value in zip(self.COLUMNS, (
+            request_id, latency_ms,
+            self.by_count.quantile(0.5), self.by_count.quantile(0.95),
+            p50_time, p95_time,
+            self.ewma,
+        )):
+            self.series[col].append(value)
+        self.count += 1
+
+        direction = self.cusum.update(math.log(max(latency_ms, 1e-3)))
+        if direction:
+            self.change_points.append({
+                "index": self.count - 1,
+                "request_id": request_id,
+                "direction": direction,
+                "rolling_p50": self.series["p50"][-1],
+            })
+
+    def to_dict(self, since=0):
+        """Points from request index ``since`` on (indexes count from the run's first request)"""
+        first = self.count - len(self.series["request_id"])
+        skip = max(since - first, 0)
+        return {
+            "run_id": self.run_id,
+            "count": self.count,
+            "first_index": max(since, first),
+            "window": ROLLING_WINDOW,
+            "window_s": ROLLING_WINDOW_S,
+            "ewma_alpha": EWMA_ALPHA,
+            "points": {col: list(itertools.islice(values, skip, None)) for col, values in self.series.items()},
+            "change_points": list(self.change_points),
+        }
+
+
+class TimelineCache:
+    """Process-wide cache of RunTimeline states"""
+
+    def __init__(self, loader, lock=None):
+        # loader(run_id) is called under ``lock`` and must capture the storage
+        # there (log_store.capture_view); it returns a function that reads that
+        # run's request_id / latency_ms from the capture without the lock. Rows
+        # observed from then on are buffered and applied after the history, so
+        # none is counted twice and ingestion never waits for the load.
+        self._loader = loader
+        self._runs = {}
+        self._pending = {}  # run_id -> rows observed while its history loads
+        self._generation = 0  # bumped by reset(): a load that started before is discarded
+        self._lock = lock or threading.RLock()
+        self._load_lock = threading.Lock()
+
+    def get(self, run_id):
+        run_id = str(run_id)
+        with self._lock:
+            if run_id in self._runs:
+                return self._runs[run_id]
+        with self._load_lock:
+            while True:
+                with self._lock:
+                    if run_id in self._runs:
+                        return self._runs[run_id]
+                    generation = self._generation
+                    self._pending[run_id] = []
+                    read_history = self._loader(run_id)
+                try:
+                    state = self._replay(run_id, read_history())
+                except BaseException:
+                    with self._lock:
+                        self._pending.pop(run_id, None)
+                    raise
+                with self._lock:
+                    if generation != self._generation:
+                        continue  # logs cleared / dropped while loading: load again
+                    for row in self._pending.pop(run_id):
+                        self._apply(state, row)
+                    self._runs[run_id] = state
+                    return state
+
+    @staticmethod
+    def _replay(run_id, history):
+        state = RunTimeline(run_id)
+        history = history.assign(ts=pd.to_numeric(history["request_id"], errors="coerce"))
+        for request_id, latency in history.sort_values("ts", kind="stable")[
+            ["request_id", "latency_ms"]
+        ].itertuples(index=False):
+            if pd.notna(latency):
+                state.update(request_id, float(latency))
+        return state
+
+    @staticmethod
+    def _apply(state, row):
+        if row.get("latency_ms") not in (None, ""):
+            state.update(row["request_id"], float(row["latency_ms"]))
+
+    def observe(self, rows):
+        """Apply freshly written rows to runs that are cached (or loading)"""
+        with self._lock:
+            for row in rows:
+                run_id = str(row["run_id"])
+                state = self._runs.get(run_id)
+                if state is not None:
+                    self._apply(state, row)
+                elif run_id in self._pending:
+                    self._pending[run_id].append(row)
+
+    def reset(self):
+        with self._lock:
+            self._runs.clear()
+            self._pending.clear()
+            self._generation += 1
@@ -1,10 +1,115 @@
 import os
-import pandas as pd
+import json
+import threading
+import time
 import streamlit as st
-import plotly.express as px
-import plotly.graph_objects as go
 
-SHARED_LOG = "/app/latency_logs.csv"
+# Headline metrics precomputed by the API next to the snapshot (see api/snapshot.py)
+SHARED_SUMMARY = "/app/snapshots/summary.json"
+
+SUMMARY_METRICS = [
+    ("Avg latency (ms)", "avg_latency_ms"),
+    ("Min latency (ms)", "min_latency_ms"),
+    ("Max latency (ms)", "max_latency_ms"),
+    ("P95 latency (ms)", "p95_latency_ms"),
+    ("Crash rate (%)", "crash_rate_pct"),
+    ("👍 Positive feedback (%)", "positive_feedback_pct"),
+    ("Most common temperature", "most_common_temperature"),
+    ("Avg battery (%)", "avg_battery_pct"),
+]
+SUMMARY_MODEL_COLUMNS = [
+    ("Avg Latency (ms)", "avg_latency_ms"),
+    ("Min Latency (ms)", "min_latency_ms"),
+    ("Max Latency (ms)", "max_latency_ms"),
+    ("P95 Latency (ms)", "p95_latency_ms"),
+    ("Total Runtime (min)", "runtime_min"),
+    ("Avg Temperature", "most_common_temperature"),
+    ("Crash Rate (%)", "crash_rate_pct"),
+    ("Positive Feedback (%)", "positive_feedback_pct"),
+]
+
+def preload_heavy_modules():
+    import pandas, pyarrow, requests, plotly.express, plotly.graph_objects  # noqa: F401
+
+@st.cache_resource(show_spinner=False)
+def start_preload():
+    """Import pandas / plotly on a background thread while the summary renders"""
+    thread = threading.Thread(target=preload_heavy_modules, daemon=True)
+    thread.start()
+    return thread
+
+def read_summary():
+    try:
+        with open(SHARED_SUMMARY) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+def format_metric(value):
+    if value is None:
+        return "N/A"
+    return value if isinstance(value, str) else f"{value:.1f}"
+
+def render_summary(summary):
+    """Cold-start view: headline metrics and model table from summary.json (no pandas needed)"""
+    st.title("📊 On-device Latency Dashboard")
+    published = time.strftime("%H:%M:%S", time.localtime(summary["created_at"]))
+    st.caption(
+        f"⚡ All data: {summary['rows']} rows, {summary['runs']} runs "
+        f"(summary published at {published}) — loading full data…"
+    )
+    for metrics_row in (SUMMARY_METRICS[:4], SUMMARY_METRICS[4:]):
+        for col, (label, key) in zip(st.columns(4), metrics_row):
+            col.metric(label, format_metric(summary["metrics"][key]))
+
+    st.subheader("📌 Model Summary Table")
+    lines = [
+        "| model_name | " + " | ".join(label for label, _ in SUMMARY_MODEL_COLUMNS) + " |",
+        "|---" * (len(SUMMARY_MODEL_COLUMNS) + 1) + "|",
+    ]
+    for model in summary["models"]:
+        cells = " | ".join(format_metric(model[key]) for _, key in SUMMARY_MODEL_COLUMNS)
+        lines.append(f"| {model['model_name']} | {cells} |")
+    st.markdown("\n".join(lines))
+
+# Page configuration
+st.set_page_config(
+    page_title="On-device Latency Dashboard",
+    page_icon="📊",
+    layout="wide",
+    initial_sidebar_state="expanded"
+)
+
+# Cold start: paint the precomputed summary before the heavy modules and the
+# full data are loaded; it is cleared as soon as the real view is ready
+start_preload()
+cold_start = st.empty()
+if not st.session_state.get("full_data_shown"):
+    cold_summary = read_summary()
+    if cold_summary is not None:
+        with cold_start.container():
+            render_summary(cold_summary)
+
+from urllib.parse import urlencode  # noqa: E402
+import pandas as pd  # noqa: E402
+import requests  # noqa: E402
+import plotly.express as px  # noqa: E402
+import plotly.graph_objects as go  # noqa: E402
+
+from data_cache import SharedDataCache  # noqa: E402
+from figures import prepare_figure  # noqa: E402
+from profiling import CAPTURE_MODES, RerunProfiler  # noqa: E402
+from shared_log import (  # noqa: E402
+    SHARED_LOG, data_version, extend_frame, read_filter_rows, read_latency, read_runs, read_sample, snapshot_rows
+)
+
+# API address as seen from the user's browser (used for download links)
+API_PUBLIC_URL = os.environ.get("API_PUBLIC_URL", "http://localhost:8000")
+# API address as seen from this process (analysis endpoints)
+API_URL = os.environ.get("API_URL", "http://localhost:8000")
+# Approximate mode (default above this many rows): metrics from the API's samples, charts from a local sample
+DASHBOARD_APPROX_ROWS = int(os.environ.get("DASHBOARD_APPROX_ROWS", "1000000"))
+DASHBOARD_SAMPLE_ROWS = int(os.environ.get("DASHBOARD_SAMPLE_ROWS", "200000"))
 
 # Temperature mapping: numeric to text
 TEMP_MAP_NUM_TO_TEXT = {
@@ -33,31 +138,231 @@ def get_temp_label(temp_value):
         # Handle old text format for backward compatibility
         return str(temp_value)
 
-def load_latency():
+def fetch_api(path, params=None, timeout=30):
+    """GET an API endpoint; returns (json, error message)"""
+    try:
+        resp = requests.get(f"{API_URL}{path}", params=params, timeout=timeout)
+    except requests.RequestException as e:
+        return None, f"API not reachable at {API_URL}: {e}"
+    if resp.status_code != 200:
+        try:
+            return None, resp.json().get("detail", resp.text)
+        except ValueError:
+            return None, resp.text
+    return resp.json(), None
+
+@st.cache_data(ttl=30, show_spinner=False)
+def fetch_thermal(run_ids=(), models=()):
+    """Warm-up / steady-state / throttling analysis from the API (cached 30s)"""
+    return fetch_api("/api/analysis/thermal", {"run_id": list(run_ids), "model": list(models)})
+
+@st.cache_data(ttl=30, show_spinner=False)
+def fetch_crash_signatures(run_ids=(), group_by=None):
+    return fetch_api("/api/crashes/signatures", {"run_id": list(run_ids), "group_by": group_by, "limit": 50})
+
+STAGE_LABELS = {
+    "image_preprocess_ms": "Image preprocessing",
+    "prefill_ms": "Prefill",
+    "first_token_other_ms": "Other (to first token)",
+    "decode_ms": "Decode",
+}
+
+@st.cache_data(ttl=30, show_spinner=False)
+def fetch_stages(models=(), devices=()):
+    """Per model / device latency breakdown by stage from the API (cached 30s)"""
+    return fetch_api("/api/analysis/stages", {"model": list(models), "device": list(devices)})
+
+CUBE_DIMENSIONS = ["model", "device", "version", "thermal"]
+CUBE_METRICS = {
+    "p95_latency_ms": "P95 latency (ms)",
+    "p50_latency_ms": "P50 latency (ms)",
+    "p99_latency_ms": "P99 latency (ms)",
+    "avg_latency_ms": "Avg latency (ms)",
+    "max_latency_ms": "Max latency (ms)",
+    "crash_rate_pct": "Crash rate (%)",
+    "avg_battery_pct": "Avg battery (%)",
+    "count": "Requests",
+}
+
+@st.cache_data(ttl=10, show_spinner=False)
+def fetch_cube(rows, cols, metric, models=(), devices=(), versions=(), temperatures=()):
+    """Pivot of the API's precomputed fleet cube (independent of the number of rows)"""
+    return fetch_api("/api/cube", {
+        "rows": rows, "cols": cols, "metric": metric, "model": list(models),
+        "device": list(devices), "version": list(versions), "temperature": list(temperatures),
+    })
+
+@st.cache_data(ttl=10, show_spinner=False)
+def fetch_summary(params, mode="approx"):
+    """Headline metrics and model table: estimates from the API's stratified samples, or a full scan"""
+    return fetch_api("/api/stats/summary", {**params, "mode": mode}, timeout=30 if mode == "approx" else 600)
+
+@st.cache_data(ttl=10, show_spinner=False)
+def fetch_alerts():
+    """Alerts currently firing on the API (rules evaluated at ingest)"""
+    return fetch_api("/api/alerts", {"limit": 1}, timeout=5)
+
+@st.cache_resource
+def get_shared_cache(kind="full"):
+    """
+    One data cache per process and kind (the "full" log, or approximate mode's
+    "sample"), shared read-only by every browser session
+    """
+    return SharedDataCache()
+
+def load_latency(sampled=False):
     # Always use the shared volume file; do not prompt user to upload
     if os.path.exists(SHARED_LOG):
         st.info(f"Loading latency data from shared volume: {SHARED_LOG}")
         try:
-            return pd.read_csv(SHARED_LOG)
+            if sampled:
+                # Only the sampled rows of the snapshot are ever converted to pandas
+                return shared_cache.get_frame(data_version(), lambda: read_sample(DASHBOARD_SAMPLE_ROWS), extend_frame)
+            return shared_cache.get_frame(data_version(), read_latency, extend_frame)
         except Exception as e:
             st.error(f"Failed to read {SHARED_LOG}: {e}")
             return None
     st.warning(f"No latency data available at {SHARED_LOG}")
     return None
 
+def apply_filters(df, selected_models, selected_devices, selected_versions, selected_feedback,
+                  only_crashed, selected_temps, batt_min, batt_max):
+    """Apply the sidebar filters (memoized per filter combination in the shared cache)"""
+    filtered_df = df[
+        (df['model_name'].isin(selected_models)) &
+        (df['device_model'].isin(selected_devices)) &
+        (df['app_version'].isin(selected_versions))
+    ]
+    perf.mark("filter: model/device/version", len(filtered_df))
+
+    if 'user_feedback' in filtered_df.columns and selected_feedback:
+        filtered_df = filtered_df[filtered_df['user_feedback'].isin(selected_feedback)]
+        perf.mark("filter: feedback", len(filtered_df))
+
+    if 'crash_log' in filtered_df.columns and only_crashed:
+        filtered_df = filtered_df[filtered_df['crash_log'].notna() & (filtered_df['crash_log'] != "")]
+        perf.mark("filter: crashed", len(filtered_df))
+
+    if selected_temps:
+        filtered_df = filtered_df[filtered_df["device_temperature"].isin(selected_temps)]
+        perf.mark("filter: temperature", len(filtered_df))
+
+    if 'battery_percentage' in filtered_df.columns and batt_min is not None and batt_max is not None:
+        filtered_df = filtered_df[
+            (filtered_df['battery_percentage'] >= batt_min) &
+            (filtered_df['battery_percentage'] <= batt_max)
+        ]
+        perf.mark("filter: battery", len(filtered_df))
+    return filtered_df
+
+def add_derived_columns(filtered_df):
+    """Timestamp / runtime columns used by the Overview charts"""
+    # Ensure request_id is numeric
+    filtered_df["request_id"] = pd.to_numeric(filtered_df["request_id"], errors="coerce")
+
+    # Convert timestamp (ms) to datetime
+    filtered_df["timestamp"] = pd.to_datetime(
+        filtered_df["request_id"], unit="ms")
+    filtered_df = filtered_df.sort_values("timestamp")
+
+    filtered_df["runtime_sec"] = (
+        filtered_df["timestamp"]
+        - filtered_df.groupby("model_name")["timestamp"].transform("min")
+    ).dt.total_seconds()
+
+    filtered_df["runtime_min"] = filtered_df["runtime_sec"] / 60
+    return filtered_df
+
+def model_summary(filtered_df):
+    """Per-model summary table of the Overview tab"""
+    summary_df = filtered_df.groupby("model_name").agg({
+        "latency_ms": ["mean", "min", "max", lambda x: x.quantile(0.95)],
+        "runtime_min": "max",
+        "device_temperature": lambda x: get_temp_label(x.mode().iloc[0]) if len(x.mode()) > 0 else "N/A",
+        "crash_log": lambda x: (x.notna() & (x != "")).mean() * 100,
+        "user_feedback": lambda x: (x == "up").mean() * 100
+    })
+
+    summary_df.columns = [
+        "Avg Latency (ms)",
+        "Min Latency (ms)",
+        "Max Latency (ms)",
+        "P95 Latency (ms)",
+        "Total Runtime (min)",
+        "Avg Temperature",
+        "Crash Rate (%)",
+        "Positive Feedback (%)"
+    ]
+    return summary_df
+
+def filter_options(df):
+    """Sidebar choices: models, devices, versions, feedback values, temperature levels, battery range"""
+    def distinct(col):
+        return sorted(df[col].dropna().unique()) if col in df.columns else []
+    temps = sorted(int(t) for t in df['device_temperature'].dropna().unique()) if 'device_temperature' in df.columns else []
+    battery = (float(df['battery_percentage'].min()), float(df['battery_percentage'].max())) \
+        if 'battery_percentage' in df.columns else (None, None)
+    return (distinct('model_name'), distinct('device_model'), distinct('app_version'),
+            distinct('user_feedback'), temps, battery)
+
+def sample_filter_options(df):
+    """filter_options in approximate mode: every value in the log, not only the sampled ones"""
+    rows = read_filter_rows(["model_name", "device_model", "app_version", "user_feedback", "device_temperature"],
+                            ["battery_percentage"])
+    return filter_options(df if rows is None else rows)
+
+def summary_table(summary):
+    """Model Summary Table built from an API summary's per-model rows"""
+    return pd.DataFrame(
+        [[model[key] for _, key in SUMMARY_MODEL_COLUMNS] for model in summary["models"]],
+        index=pd.Index([model["model_name"] for model in summary["models"]], name="model_name"),
+        columns=[label for label, _ in SUMMARY_MODEL_COLUMNS],
+    )
+
+def render_overview_summary(summary, bounds=None):
+    """Headline tiles and model table from an API summary (bounds shown as tooltips)"""
+    bounds = bounds or {}
+    for metrics_row in (SUMMARY_METRICS[:4], SUMMARY_METRICS[4:]):
+        for col, (label, key) in zip(st.columns(4), metrics_row):
+            value, bound = summary["metrics"].get(key), bounds.get(key)
+            if bound and value is not None and bound[0] is not None:
+                col.metric(label, f"≈ {value:.1f}", help=f"{summary['confidence']:.0%} CI: {bound[0]:.1f} – {bound[1]:.1f}")
+            else:
+                col.metric(label, format_metric(value))
+
+def approximate_summary(params):
+    """
+    Summary for the current filters in approximate mode: the exact one when the
+    API already has it for the current data, the sample estimate otherwise.
+    Returns (summary, bounds, caption), or (None, None, error).
+    """
+    data, err = fetch_summary(params)
+    if err:
+        return None, None, err
+    background = data.get("background") or {}
+    if data["exact"]:
+        return data, None, f"Exact: every one of the {data['population']} rows is in the samples."
+    if background.get("status") == "done" and not background.get("stale"):
+        age = time.time() - background["computed_at"]
+        return background["result"], None, f"Exact (computed in the background {age:.0f} s ago)."
+    status = {"queued": "queued", "running": "running in the background", "done": "refreshing for new rows",
+              "failed": f"failed ({background.get('error')})"}.get(background.get("status"), "not requested")
+    return data, data["bounds"], (
+        f"≈ Estimated from {data['matched_sample']} of {data['sampled']} sampled rows "
+        f"({data['strata']} model × run strata, {data['population']} rows in total) in "
+        f"{data['elapsed_ms']:.0f} ms; hover a metric for its {data['confidence']:.0%} interval. "
+        f"Exact computation: {status}."
+    )
+
+def cached_figure(key, build):
+    """Build and prepare (WebGL / decimation) a figure once per data version and key, for all sessions"""
+    return shared_cache.memo(("figure",) + key, lambda: prepare_figure(build()))
+
 # Remove proxy
 for proxy_var in ['http_proxy', 'https_proxy', 'HTTP_PROXY', 'HTTPS_PROXY']:
     os.environ.pop(proxy_var, None)
 
 
-# Page configuration
-st.set_page_config(
-    page_title="On-device Latency Dashboard",
-    page_icon="📊",
-    layout="wide",
-    initial_sidebar_state="expanded"
-)
-
 # Custom CSS for styling
 st.markdown("""
     <style>
@@ -81,24 +386,74 @@ st.markdown("""
     </style>
 """, unsafe_allow_html=True)
 
+# Opt-in debug panel: per-stage timings and an optional profile of one rerun
+debug_box = st.sidebar.expander("🐞 Debug")
+with debug_box:
+    debug_enabled = st.checkbox(
+        "Show rerun timings",
+        value=os.environ.get("DASHBOARD_DEBUG", "") == "1",
+        key="debug_enabled"
+    )
+    debug_capture = st.selectbox(
+        "Profile this rerun",
+        options=CAPTURE_MODES,
+        disabled=not debug_enabled,
+        key="debug_capture"
+    )
+perf = RerunProfiler(enabled=debug_enabled, capture=debug_capture)
+shared_cache = get_shared_cache()
+
+def finish_rerun():
+    """Cache stats and the profiler panel (which also stops the profiler)"""
+    cache_stats = shared_cache.stats()
+    debug_box.caption(
+        f"Shared cache: {cache_stats['rows']} rows ({cache_stats['frame_mb']:.1f} MB), "
+        f"{cache_stats['results']} results ({cache_stats['results_mb']:.1f}/{cache_stats['budget_mb']:.0f} MB), "
+        f"hits {cache_stats['hits']} / misses {cache_stats['misses']} / evictions {cache_stats['evictions']}"
+    )
+    perf.render()
+
+def stop_rerun():
+    """st.stop() that still finishes the rerun's debug output"""
+    finish_rerun()
+    st.stop()
+
 # Sidebar for filters
 st.sidebar.header("🔧 Filters")
 
+# Approximate mode reads a sample of the snapshot instead of the whole log, so it
+# is decided before anything is loaded
+snapshot_total = snapshot_rows()
+approx_mode = st.sidebar.toggle(
+    "⚡ Approximate mode",
+    value=snapshot_total is not None and snapshot_total > DASHBOARD_APPROX_ROWS,
+    help="Overview metrics are estimated from per (model, run) samples kept by the API, with error "
+         "bounds, and charts draw a sample of each run read from the snapshot; the exact numbers are "
+         "computed in the background.",
+    key="approx_mode"
+)
+if approx_mode:
+    shared_cache = get_shared_cache("sample")
+
 # Always load from shared file (no uploader)
-df = load_latency()
+df = load_latency(sampled=approx_mode)
+perf.mark("load", len(df) if df is not None else 0)
+cold_start.empty()
+st.session_state["full_data_shown"] = True
 
 if df is not None:
     # Display data info
-    st.sidebar.success(f"✅ File loaded! ({len(df)} rows)")
+    if approx_mode:
+        st.sidebar.success(f"✅ File loaded! ({len(df)} sampled rows of about {snapshot_total or len(df)})")
+    else:
+        st.sidebar.success(f"✅ File loaded! ({len(df)} rows)")
     
     # Data source info (show path)
     st.markdown(f"**Data source:** {SHARED_LOG}")
     
-    # Get unique values for filters
-    model_names = sorted(df['model_name'].unique()) if 'model_name' in df.columns else []
-    device_models = sorted(df['device_model'].unique()) if 'device_model' in df.columns else []
-    app_versions = sorted(df['app_version'].unique()) if 'app_version' in df.columns else []
-    feedback_values = sorted([v for v in df['user_feedback'].dropna().unique()]) if 'user_feedback' in df.columns else []
+    # Get unique values for filters (one scan per data version, shared by all sessions)
+    model_names, device_models, app_versions, feedback_values, existing_temps, batt_range = \
+        shared_cache.memo(("filter_options",), lambda: (sample_filter_options if approx_mode else filter_options)(df))
     
     # Filters
     st.sidebar.subheader("Model name")
@@ -147,9 +502,6 @@ if df is not None:
     if 'device_temperature' in df.columns:
         st.sidebar.subheader("Device temperature")
         
-        # Get unique numeric values that exist in the data
-        existing_temps = sorted([int(t) for t in df['device_temperature'].dropna().unique()])
-        
         # Create display options with labels
         temp_options = {get_temp_label(t): t for t in existing_temps}
         
@@ -169,8 +521,7 @@ if df is not None:
     batt_min = batt_max = None
     if 'battery_percentage' in df.columns:
         st.sidebar.subheader("Battery level (%)")
-        batt_min_val = float(df['battery_percentage'].min())
-        batt_max_val = float(df['battery_percentage'].max())
+        batt_min_val, batt_max_val = batt_range
         batt_min, batt_max = st.sidebar.slider(
             "Battery range",
             min_value=float(batt_min_val),
@@ -178,139 +529,138 @@ if df is not None:
             value=(float(batt_min_val), float(batt_max_val))
         )
 
-    # Filter dataframe
-    filtered_df = df[
-        (df['model_name'].isin(selected_models)) &
-        (df['device_model'].isin(selected_devices)) &
-        (df['app_version'].isin(selected_versions))
-    ]
-
-    if 'user_feedback' in filtered_df.columns and selected_feedback:
-        filtered_df = filtered_df[filtered_df['user_feedback'].isin(selected_feedback)]
-
-    if 'crash_log' in filtered_df.columns and only_crashed:
-        filtered_df = filtered_df[filtered_df['crash_log'].notna() & (filtered_df['crash_log'] != "")]
-
-    if selected_temps:
-        filtered_df = filtered_df[filtered_df["device_temperature"].isin(selected_temps)]
-
-
-    if 'battery_percentage' in filtered_df.columns and batt_min is not None and batt_max is not None:
-        filtered_df = filtered_df[
-            (filtered_df['battery_percentage'] >= batt_min) &
-            (filtered_df['battery_percentage'] <= batt_max)
-        ]
+    # Filter dataframe (shared across sessions with the same filter combination)
+    filter_args = (
+        tuple(selected_models), tuple(selected_devices), tuple(selected_versions),
+        tuple(selected_feedback), only_crashed, tuple(selected_temps), batt_min, batt_max
+    )
+    # In approximate mode df is already a stratified sample of every (model, run)
+    view_key = filter_args + (approx_mode,)
+    filtered_df = shared_cache.memo(("filtered", view_key), lambda: apply_filters(df, *filter_args))
+    perf.mark("filter (shared cache)", len(filtered_df))
+    # The same filters as API parameters (approximate summary, export)
+    api_filters = {
+        "model": selected_models,
+        "device": selected_devices,
+        "version": selected_versions,
+        "feedback": selected_feedback,
+        "temperature": [int(t) for t in selected_temps],
+        "only_crashed": str(only_crashed).lower(),
+    }
+    if batt_min is not None and batt_max is not None:
+        api_filters.update(battery_min=batt_min, battery_max=batt_max)
     tab1, tab2, tab3 = st.tabs(["📊 Overview", "📌 Per-Run Analysis", "🆚 Compare Runs"])
     with tab1:
     
     # Main content
         st.title("📊 On-device Latency Dashboard")
+
+        alert_data, _ = fetch_alerts()
+        for alert in (alert_data or {}).get("active", []):
+            group = " / ".join(str(v) for v in alert["group"].values())
+            message = (f"🚨 **{alert['rule']}** on {group}: {alert['metric']} = {alert['value']:.1f} "
+                       f"({alert['condition']}, last {alert['samples']} requests)")
+            (st.error if alert["severity"] == "critical" else st.warning)(message)
     
     # Metrics row
-        col1, col2, col3, col4 = st.columns(4)
+        approx_summary = None
+        if approx_mode:
+            approx_summary, approx_bounds, approx_note = approximate_summary(api_filters)
+            if approx_summary is None:
+                st.warning(f"Approximate summary unavailable ({approx_note}); metrics below use the sampled rows.")
+        if approx_summary is not None:
+            tiles = st.container()
+            if approx_bounds and st.button("🎯 Compute exact now", key="compute_exact"):
+                with st.spinner("Scanning every matching row…"):
+                    exact, err = fetch_summary(api_filters, mode="exact")
+                if err:
+                    st.error(f"Exact computation failed: {err}")
+                else:
+                    approx_summary, approx_bounds = exact, None
+                    approx_note = f"Exact: {exact['rows']} rows scanned in {exact['elapsed_ms'] / 1000:.1f} s."
+            with tiles:
+                render_overview_summary(approx_summary, approx_bounds)
+                st.caption(approx_note)
+        else:
+            col1, col2, col3, col4 = st.columns(4)
         
-        with col1:
-            avg_latency = filtered_df['latency_ms'].mean() if 'latency_ms' in filtered_df.columns else 0
-            st.metric("Avg latency (ms)", f"{avg_latency:.1f}")
+            with col1:
+                avg_latency = filtered_df['latency_ms'].mean() if 'latency_ms' in filtered_df.columns else 0
+                st.metric("Avg latency (ms)", f"{avg_latency:.1f}")
         
-        with col2:
-            min_latency = filtered_df['latency_ms'].min() if 'latency_ms' in filtered_df.columns else 0
-            st.metric("Min latency (ms)", f"{min_latency:.1f}")
+            with col2:
+                min_latency = filtered_df['latency_ms'].min() if 'latency_ms' in filtered_df.columns else 0
+                st.metric("Min latency (ms)", f"{min_latency:.1f}")
         
-        with col3:
-            max_latency = filtered_df['latency_ms'].max() if 'latency_ms' in filtered_df.columns else 0
-            st.metric("Max latency (ms)", f"{max_latency:.1f}")
+            with col3:
+                max_latency = filtered_df['latency_ms'].max() if 'latency_ms' in filtered_df.columns else 0
+                st.metric("Max latency (ms)", f"{max_latency:.1f}")
         
-        with col4:
-            if 'latency_ms' in filtered_df.columns:
-                p95_latency = filtered_df['latency_ms'].quantile(0.95)
-                st.metric("P95 latency (ms)", f"{p95_latency:.1f}")
-
-    # Extended metrics row
-        ext1, ext2, ext3, ext4 = st.columns(4)
-        with ext1:
-            if 'crash_log' in filtered_df.columns and len(filtered_df) > 0:
-                crash_rate = (filtered_df['crash_log'].notna() & (filtered_df['crash_log'] != "")).mean() * 100
-                st.metric("Crash rate (%)", f"{crash_rate:.1f}")
-        with ext2:
-            if 'user_feedback' in filtered_df.columns and len(filtered_df) > 0:
-                up_rate = (filtered_df['user_feedback'] == "up").mean() * 100
-                st.metric("👍 Positive feedback (%)", f"{up_rate:.1f}")
-        with ext3:
-            if 'device_temperature' in filtered_df.columns and len(filtered_df) > 0:
-                most_common_temp = filtered_df['device_temperature'].mode().iloc[0]
-                st.metric("Most common temperature", get_temp_label(most_common_temp))
-
-        with ext4:
-            if 'battery_percentage' in filtered_df.columns and len(filtered_df) > 0:
-                avg_batt = filtered_df['battery_percentage'].mean()
-                st.metric("Avg battery (%)", f"{avg_batt:.1f}")
-        # Ensure request_id is numeric
-        filtered_df["request_id"] = pd.to_numeric(filtered_df["request_id"], errors="coerce")
-
-        # Convert timestamp (ms) to datetime
-        filtered_df["timestamp"] = pd.to_datetime(
-            filtered_df["request_id"], unit="ms")
-        filtered_df = filtered_df.sort_values("timestamp")
-
-        filtered_df["runtime_sec"] = (
-            filtered_df["timestamp"]
-            - filtered_df.groupby("model_name")["timestamp"].transform("min")
-        ).dt.total_seconds()
-
-        filtered_df["runtime_min"] = filtered_df["runtime_sec"] / 60
+            with col4:
+                if 'latency_ms' in filtered_df.columns:
+                    p95_latency = filtered_df['latency_ms'].quantile(0.95)
+                    st.metric("P95 latency (ms)", f"{p95_latency:.1f}")
+
+        # Extended metrics row
+            ext1, ext2, ext3, ext4 = st.columns(4)
+            with ext1:
+                if 'crash_log' in filtered_df.columns and len(filtered_df) > 0:
+                    crash_rate = (filtered_df['crash_log'].notna() & (filtered_df['crash_log'] != "")).mean() * 100
+                    st.metric("Crash rate (%)", f"{crash_rate:.1f}")
+            with ext2:
+                if 'user_feedback' in filtered_df.columns and len(filtered_df) > 0:
+                    up_rate = (filtered_df['user_feedback'] == "up").mean() * 100
+                    st.metric("👍 Positive feedback (%)", f"{up_rate:.1f}")
+            with ext3:
+                if 'device_temperature' in filtered_df.columns and len(filtered_df) > 0:
+                    most_common_temp = filtered_df['device_temperature'].mode().iloc[0]
+                    st.metric("Most common temperature", get_temp_label(most_common_temp))
+
+            with ext4:
+                if 'battery_percentage' in filtered_df.columns and len(filtered_df) > 0:
+                    avg_batt = filtered_df['battery_percentage'].mean()
+                    st.metric("Avg battery (%)", f"{avg_batt:.1f}")
+        perf.mark("aggregate: headline metrics", len(filtered_df))
+        filtered_df = shared_cache.memo(("derived", view_key), lambda: add_derived_columns(filtered_df))
+        perf.mark("derived columns", len(filtered_df))
 
             
         st.subheader("📌 Model Summary Table")
 
-        summary_df = filtered_df.groupby("model_name").agg({
-            "latency_ms": ["mean", "min", "max", lambda x: x.quantile(0.95)],
-            "runtime_min": "max",
-            "device_temperature": lambda x: get_temp_label(x.mode().iloc[0]) if len(x.mode()) > 0 else "N/A",
-            "crash_log": lambda x: (x.notna() & (x != "")).mean() * 100,
-            "user_feedback": lambda x: (x == "up").mean() * 100
-        })
-
-        summary_df.columns = [
-            "Avg Latency (ms)",
-            "Min Latency (ms)",
-            "Max Latency (ms)",
-            "P95 Latency (ms)",
-            "Total Runtime (min)",
-            "Avg Temperature",
-            "Crash Rate (%)",
-            "Positive Feedback (%)"
-        ]
-
-
-        st.dataframe(summary_df, use_container_width=True)  
+        if approx_summary is not None:
+            summary_df = summary_table(approx_summary)
+        else:
+            summary_df = shared_cache.memo(("model_summary", view_key), lambda: model_summary(filtered_df))
+        perf.table(summary_df, "Model Summary Table")
         
         # Charts section
         st.subheader("📈 Latency over time")
         
         if 'request_id' in filtered_df.columns and 'latency_ms' in filtered_df.columns:
             # Latency over time chart
-            fig_time = go.Figure()
-            
-            for model in selected_models:
-                model_data = filtered_df[filtered_df['model_name'] == model].reset_index(drop=True)
-                fig_time.add_trace(go.Scatter(
-                    x=list(range(len(model_data))),
-                    y=model_data['latency_ms'].values,
-                    mode='lines',
-                    name=model,
-                    line=dict(width=2)
-                ))
-            
-            fig_time.update_layout(
-                title="Latency Over Time",
-                xaxis_title="Request",
-                yaxis_title="Latency (ms)",
-                hovermode='x unified',
-                height=400,
-                template='plotly_dark'
-            )
-            st.plotly_chart(fig_time, use_container_width=True)
+            def build_latency_over_time():
+                fig_time = go.Figure()
+
+                for model in selected_models:
+                    model_data = filtered_df[filtered_df['model_name'] == model].reset_index(drop=True)
+                    fig_time.add_trace(go.Scatter(
+                        x=list(range(len(model_data))),
+                        y=model_data['latency_ms'].values,
+                        mode='lines',
+                        name=model,
+                        line=dict(width=2)
+                    ))
+
+                fig_time.update_layout(
+                    title="Latency Over Time",
+                    xaxis_title="Request",
+                    yaxis_title="Latency (ms)",
+                    hovermode='x unified',
+                    height=400,
+                    template='plotly_dark'
+                )
+                return fig_time
+            perf.chart(cached_figure(("latency_over_time", view_key), build_latency_over_time))
 
             filtered_df = filtered_df.reset_index(drop=True)
             filtered_df["time_index"] = range(len(filtered_df))
@@ -324,6 +674,7 @@ if df is not None:
 
             # Sort models by average latency (ascending) so bars go from low → high
             latency_bar_df = latency_bar_df.sort_values("avg_latency", ascending=True)
+            perf.mark("aggregate: avg latency by model", len(latency_bar_df))
 
             fig_latency_bar = go.Figure()
 
@@ -345,34 +696,36 @@ if df is not None:
                 uniformtext_mode="hide"
             )
 
-            st.plotly_chart(fig_latency_bar, use_container_width=True)
+            perf.chart(fig_latency_bar)
 
 
             st.subheader("🔋 Battery Percentage Over Time")
 
-            fig_battery_time = go.Figure()
-
-            for model in selected_models:
-                model_data = filtered_df[filtered_df["model_name"] == model]
-
-                fig_battery_time.add_trace(go.Scatter(
-                    x=model_data["time_index"],
-                    y=model_data["battery_percentage"],
-                    mode="lines+markers",
-                    name=model,
-                    line=dict(width=3)
-                ))
-
-            fig_battery_time.update_layout(
-                title="Battery Drain Over Time While Running Models",
-                xaxis_title="Time (Request Order)",
-                yaxis_title="Battery Level (%)",
-                hovermode="x unified",
-                height=450,
-                template="plotly_dark"
-            )
+            def build_battery_over_time():
+                fig_battery_time = go.Figure()
+
+                for model in selected_models:
+                    model_data = filtered_df[filtered_df["model_name"] == model]
+
+                    fig_battery_time.add_trace(go.Scatter(
+                        x=model_data["time_index"],
+                        y=model_data["battery_percentage"],
+                        mode="lines+markers",
+                        name=model,
+                        line=dict(width=3)
+                    ))
+
+                fig_battery_time.update_layout(
+                    title="Battery Drain Over Time While Running Models",
+                    xaxis_title="Time (Request Order)",
+                    yaxis_title="Battery Level (%)",
+                    hovermode="x unified",
+                    height=450,
+                    template="plotly_dark"
+                )
+                return fig_battery_time
 
-            st.plotly_chart(fig_battery_time, use_container_width=True)
+            perf.chart(cached_figure(("battery_over_time", view_key), build_battery_over_time))
             def compute_battery_drain_by_model(df):
                     rows = []
 
@@ -398,6 +751,7 @@ if df is not None:
             st.subheader("🔋 Battery Drain by Model")
 
             drain_df = compute_battery_drain_by_model(filtered_df)
+            perf.mark("aggregate: battery drain by model", len(drain_df))
 
             if not drain_df.empty:
                     # Sort models by battery drain (ascending) so bars go from low → high
@@ -417,7 +771,7 @@ if df is not None:
                         xaxis_title="Model"
                     )
 
-                    st.plotly_chart(fig_drain_model, use_container_width=True)
+                    perf.chart(fig_drain_model)
             else:
                     st.info("Not enough battery data to compute drain per model.")   
 
@@ -438,6 +792,7 @@ if df is not None:
 
             # Temperature is already numeric (0-3), add 1 for better visualization
             radar_df["temp_score"] = radar_df["device_temperature"].fillna(0) + 1
+            perf.mark("aggregate: model radar", len(radar_df))
 
             fig_radar = go.Figure()
 
@@ -461,18 +816,18 @@ if df is not None:
                 title="Model Comparison Radar Chart"
             )
 
-            st.plotly_chart(fig_radar, use_container_width=True)
+            perf.chart(fig_radar)
         with col2:
             st.subheader("📊 Latency Distribution by Model")
             if 'model_name' in filtered_df.columns and 'latency_ms' in filtered_df.columns:
-                fig_model = px.box(
+                fig_model = cached_figure(("latency_box", view_key), lambda: px.box(
                     filtered_df,
                     x='model_name',
                     y='latency_ms',
                     title='Latency Distribution by Model',
                     template='plotly_dark'
-                )
-                st.plotly_chart(fig_model, use_container_width=True) 
+                ))
+                perf.chart(fig_model)
 
 
 
@@ -492,34 +847,174 @@ if df is not None:
                     title="User feedback distribution by model",
                     template="plotly_dark"
                 )
-                st.plotly_chart(fig_fb, use_container_width=True)
+                perf.chart(fig_fb)
         with col4:
             if 'device_temperature' in filtered_df.columns and 'latency_ms' in filtered_df.columns:
                 st.subheader("🔥 Temp vs Latency")
-                fig_temp = px.scatter(
-                    filtered_df,
-                    x="device_temperature",
-                    y="latency_ms",
-                    color="device_model" if "device_model" in filtered_df.columns else None,
-                    title="Latency vs Device temperature",
-                    template="plotly_dark",
-                    
-                )
-                # Update x-axis to show all text labels (even if no data for some levels)
-                fig_temp.update_layout(
-                    xaxis_title="Temperature Level",
-                    xaxis=dict(
-                        tickmode='array',
-                        tickvals=[0, 1, 2, 3],
-                        ticktext=['nominal', 'fair', 'serious', 'critical'],
-                        range=[-0.5, 3.5]  # Ensure all categories are shown
+                def build_temp_vs_latency():
+                    fig_temp = px.scatter(
+                        filtered_df,
+                        x="device_temperature",
+                        y="latency_ms",
+                        color="device_model" if "device_model" in filtered_df.columns else None,
+                        title="Latency vs Device temperature",
+                        template="plotly_dark",
+                    )
+                    # Update x-axis to show all text labels (even if no data for some levels)
+                    fig_temp.update_layout(
+                        xaxis_title="Temperature Level",
+                        xaxis=dict(
+                            tickmode='array',
+                            tickvals=[0, 1, 2, 3],
+                            ticktext=['nominal', 'fair', 'serious', 'critical'],
+                            range=[-0.5, 3.5]  # Ensure all categories are shown
+                        )
                     )
+                    return fig_temp
+                perf.chart(cached_figure(("temp_vs_latency", view_key), build_temp_vs_latency))
+
+        # Thermal-normalized comparison (warm-up and throttling separated by the API)
+        st.subheader("🌡 Latency by Thermal Level (steady state vs throttled)")
+        # Thermal phases and stage breakdowns are full scans on the API (warm-up and throttling
+        # need consecutive requests of a run): in approximate mode they run only when asked for
+        scan_filters = (tuple(selected_models), tuple(selected_devices))
+        show_scans = not approx_mode or st.session_state.get("scan_filters") == scan_filters
+        if not show_scans:
+            st.caption("Approximate mode: the thermal and stage analyses scan every row of the selected models.")
+            show_scans = st.button("🔬 Run thermal and stage analyses", key="run_scans")
+        if show_scans:
+            st.session_state["scan_filters"] = scan_filters
+            thermal, thermal_error = fetch_thermal(models=tuple(selected_models))
+            if thermal_error:
+                st.info(f"Thermal analysis unavailable: {thermal_error}")
+            elif thermal["models"]:
+                thermal_rows = []
+                for m in thermal["models"]:
+                    thermal_rows.append({"model_name": m["model_name"], "level": "steady state",
+                                         "p50": m["steady_state"]["p50"], "count": m["steady_state"]["count"]})
+                    for level, q in m["by_thermal_level"].items():
+                        thermal_rows.append({"model_name": m["model_name"], "level": level,
+                                             "p50": q["p50"], "count": q["count"]})
+                thermal_df = pd.DataFrame(thermal_rows)
+                fig_thermal = px.bar(
+                    thermal_df,
+                    x="model_name",
+                    y="p50",
+                    color="level",
+                    barmode="group",
+                    hover_data=["count"],
+                    category_orders={"level": ["steady state", "nominal", "fair", "serious", "critical"]},
+                    title="Median Latency per Thermal Level",
+                    template="plotly_dark"
                 )
-                st.plotly_chart(fig_temp, use_container_width=True)
+                fig_thermal.update_layout(yaxis_title="P50 Latency (ms)", xaxis_title="Model")
+                perf.chart(fig_thermal)
         
+        # Stage breakdown (only for clients that report stage timings)
+        st.subheader("⏱ Latency Breakdown by Stage")
+        if not show_scans:
+            st.caption("Approximate mode: run the analyses above to see the stage breakdown.")
+        else:
+            stages, stages_error = fetch_stages(models=tuple(selected_models), devices=tuple(selected_devices))
+            if stages_error:
+                st.info(f"Stage analysis unavailable: {stages_error}")
+            else:
+                staged = [g for g in stages["groups"] if g["with_stages"]]
+                if not staged:
+                    st.info("No stage timings yet: send `ttft_ms`, `prefill_ms`, `image_preprocess_ms`, "
+                            "`decode_tokens_per_s`, token counts and `peak_memory_mb` with the logs.")
+                else:
+                    stage_rows = []
+                    for g in staged:
+                        group = f"{g['model_name']} · {g['device_model']}"
+                        for stage, q in g["stages"].items():
+                            stage_rows.append({"group": group, "stage": STAGE_LABELS.get(stage, stage),
+                                               "mean_ms": q["mean"], "share_pct": q["share_pct"]})
+                    fig_stages = px.bar(
+                        pd.DataFrame(stage_rows),
+                        x="mean_ms",
+                        y="group",
+                        color="stage",
+                        orientation="h",
+                        hover_data={"share_pct": ":.1f"},
+                        category_orders={"stage": list(STAGE_LABELS.values())},
+                        title="Mean Latency per Stage (stacked = mean latency)",
+                        template="plotly_dark"
+                    )
+                    fig_stages.update_layout(xaxis_title="Latency (ms)", yaxis_title="", barmode="stack",
+                                             height=max(300, 50 * len(staged) + 150))
+                    perf.chart(fig_stages)
+
+                    summary_rows = [{
+                        "Model": g["model_name"],
+                        "Device": g["device_model"],
+                        "Requests with stages": g["with_stages"],
+                        "TTFT p50 (ms)": g["ttft_ms"]["p50"],
+                        "Decode tok/s p50": g["decode_tokens_per_s"]["p50"],
+                        "Prompt tokens (avg)": g["prompt_tokens_mean"],
+                        "Output tokens (avg)": g["output_tokens_mean"],
+                        "Peak memory (MB)": g["peak_memory_mb_max"],
+                        "Bottleneck": STAGE_LABELS.get(g["bottleneck"], g["bottleneck"]),
+                        "Bottleneck share (%)": g["stages"][g["bottleneck"]]["share_pct"] if g["bottleneck"] else None,
+                    } for g in staged]
+                    perf.table(pd.DataFrame(summary_rows).round(1), "Stage Summary")
+                    st.caption("Halving a stage saves at most half of its share of the mean latency.")
+
+        # Fleet cube: pivots answered by the API from precomputed cells
+        st.subheader("🧊 Fleet Cube: Model × Device × Version × Thermal Level")
+        cube_c1, cube_c2, cube_c3 = st.columns(3)
+        cube_rows = cube_c1.selectbox("Rows", CUBE_DIMENSIONS, index=0, key="cube_rows")
+        cube_cols = cube_c2.selectbox("Columns", [d for d in CUBE_DIMENSIONS if d != cube_rows], index=0, key="cube_cols")
+        cube_metric = cube_c3.selectbox("Metric", list(CUBE_METRICS), format_func=CUBE_METRICS.get, key="cube_metric")
+        cube, cube_error = fetch_cube(
+            cube_rows, cube_cols, cube_metric,
+            models=tuple(selected_models), devices=tuple(selected_devices),
+            versions=tuple(selected_versions), temperatures=tuple(int(t) for t in selected_temps)
+        )
+        if cube_error:
+            st.info(f"Fleet cube unavailable: {cube_error}")
+        elif cube["values"]:
+            fig_cube = go.Figure(go.Heatmap(
+                z=cube["values"],
+                x=cube["col_labels"],
+                y=cube["row_labels"],
+                customdata=cube["counts"],
+                colorscale="RdYlGn_r" if cube_metric != "avg_battery_pct" else "RdYlGn",
+                texttemplate="%{z:.4~r}",
+                hovertemplate=f"{cube_rows}: %{{y}}<br>{cube_cols}: %{{x}}<br>"
+                              f"{CUBE_METRICS[cube_metric]}: %{{z:.1f}}<br>requests: %{{customdata}}<extra></extra>",
+                colorbar=dict(title=CUBE_METRICS[cube_metric]),
+            ))
+            fig_cube.update_layout(
+                title=f"{CUBE_METRICS[cube_metric]} by {cube_rows} × {cube_cols}",
+                xaxis_title=cube_cols.capitalize(),
+                yaxis_title=cube_rows.capitalize(),
+                height=max(300, 60 * len(cube["row_labels"]) + 150),
+                template="plotly_dark"
+            )
+            perf.chart(fig_cube)
+            st.caption(
+                f"{cube['cells']} precomputed cells. Devices and versions are merged under canonical names "
+                f"(iPhone18,2 = iPhone 17 Pro Max, 'Version 1.0 (Build 1)' = 1.0); quantiles within 1%."
+            )
+        else:
+            st.info("No data in the cube for the current filters.")
+
         # Data table
         st.subheader("📋 Raw Data")
-        st.dataframe(filtered_df, use_container_width=True)
+
+        # Download filtered data: streamed by the API, never built in this process
+        dl1, dl2 = st.columns(2)
+        for col, fmt in ((dl1, "csv"), (dl2, "parquet")):
+            col.link_button(
+                f"⬇️ Download filtered data ({fmt.upper()})",
+                f"{API_PUBLIC_URL}/api/export?{urlencode({**api_filters, 'format': fmt}, doseq=True)}",
+                use_container_width=True
+            )
+        if approx_mode:
+            st.caption(f"Approximate mode: {len(filtered_df)} sampled rows (up to "
+                       f"{DASHBOARD_SAMPLE_ROWS} in total, an even share per model × run); the downloads are exact.")
+        perf.table(filtered_df, "Raw Data")
     with tab2:
 
         st.header("📌 Per-Run Analysis")
@@ -530,10 +1025,15 @@ if df is not None:
 
         if selected_run is None:
             st.info("Please select a run_id to view details.")
-            st.stop()
+            stop_rerun()
 
         # Filter theo run
-        run_df = df[df["run_id"] == selected_run]
+        if approx_mode:
+            # Every row of the run, not only the sampled ones
+            run_df = shared_cache.memo(("run", selected_run), lambda: read_runs([selected_run]))
+        else:
+            run_df = df[df["run_id"] == selected_run]
+        perf.mark("filter: run", len(run_df))
 
         st.subheader(f"📄 Run Information : {selected_run}")
 
@@ -564,6 +1064,7 @@ if df is not None:
         colA2, colB2 = st.columns(2)
         colA2.metric("Crash Rate (%)", f"{crash_rate:.1f}%")
         colB2.metric("Positive Feedback (%)", f"{feedback_up:.1f}%")
+        perf.mark("aggregate: run metrics", len(run_df))
 
         st.markdown("---")
 
@@ -581,7 +1082,63 @@ if df is not None:
             markers=True
         )
         fig_latency.update_layout(template="plotly_dark")
-        st.plotly_chart(fig_latency, use_container_width=True)
+
+        # Rolling p50/p95, EWMA and change points, maintained incrementally by the API
+        run_timeline, run_timeline_error = fetch_api(f"/api/runs/{selected_run}/timeline")
+        if not run_timeline_error and run_timeline["count"] > 0:
+            points = pd.DataFrame(run_timeline["points"])
+            points["request_id"] = pd.to_numeric(points["request_id"], errors="coerce")
+            for col, label, dash in (
+                ("p50", f"rolling p50 ({run_timeline['window']} req)", "solid"),
+                ("p95", f"rolling p95 ({run_timeline['window']} req)", "dot"),
+                ("ewma", f"EWMA (α={run_timeline['ewma_alpha']})", "dash"),
+            ):
+                fig_latency.add_trace(go.Scatter(
+                    x=points["request_id"], y=points[col], mode="lines", name=label, line=dict(width=2, dash=dash)
+                ))
+            for cp in run_timeline["change_points"]:
+                fig_latency.add_vline(
+                    x=float(cp["request_id"]), line_dash="dot",
+                    line_color="#ffa500" if cp["direction"] == "up" else "#7CFC00"
+                )
+            if run_timeline["change_points"]:
+                st.caption(
+                    f"🔀 {len(run_timeline['change_points'])} latency regime shifts detected (CUSUM): "
+                    "orange = slower, green = faster"
+                )
+
+        # Overlay warm-up / throttling segments and the steady-state median
+        run_thermal, run_thermal_error = fetch_thermal(run_ids=(str(selected_run),))
+        if not run_thermal_error and run_thermal["runs"]:
+            phases = run_thermal["runs"][0]
+            first_req, last_req = run_df["request_id"].min(), run_df["request_id"].max()
+            if phases["warmup_end_request_id"] is not None:
+                fig_latency.add_vrect(
+                    x0=first_req, x1=float(phases["warmup_end_request_id"]),
+                    fillcolor="#00d4ff", opacity=0.15, line_width=0,
+                    annotation_text=f"warm-up ({phases['warmup_requests']})", annotation_position="top left"
+                )
+            if phases["throttle_onset_request_id"] is not None:
+                fig_latency.add_vrect(
+                    x0=float(phases["throttle_onset_request_id"]), x1=last_req,
+                    fillcolor="#ff4b4b", opacity=0.12, line_width=0,
+                    annotation_text="thermal throttling", annotation_position="top right"
+                )
+            if phases["steady_state"]["p50"] is not None:
+                fig_latency.add_hline(
+                    y=phases["steady_state"]["p50"], line_dash="dash", line_color="#00d4ff",
+                    annotation_text=f"steady-state p50 {phases['steady_state']['p50']:.0f} ms"
+                )
+        perf.chart(fig_latency)
+
+        if not run_thermal_error and run_thermal["runs"]:
+            th1, th2, th3 = st.columns(3)
+            steady_p50 = phases["steady_state"]["p50"]
+            th1.metric("Steady-state P50 (ms)", f"{steady_p50:.0f}" if steady_p50 is not None else "N/A")
+            slowdown = phases["throttle_slowdown_pct"]
+            th2.metric("Throttling slowdown (%)", f"{slowdown:+.1f}" if slowdown is not None else "N/A")
+            slope = phases["battery_slope_ms_per_pct"]
+            th3.metric("Latency per battery % (ms)", f"{slope:+.1f}" if slope is not None else "N/A")
 
         # Battery timeline
         fig_battery = px.line(
@@ -592,7 +1149,7 @@ if df is not None:
             markers=True
         )
         fig_battery.update_layout(template="plotly_dark")
-        st.plotly_chart(fig_battery, use_container_width=True)
+        perf.chart(fig_battery)
 
         # Temperature timeline – already numeric (0-3)
         fig_temp = px.line(
@@ -607,7 +1164,7 @@ if df is not None:
             ticktext=["nominal", "fair", "serious", "critical"]
         )
         fig_temp.update_layout(template="plotly_dark")
-        st.plotly_chart(fig_temp, use_container_width=True)
+        perf.chart(fig_temp)
 
         # Feedback distribution
         fig_fb = px.histogram(
@@ -617,7 +1174,7 @@ if df is not None:
             color="user_feedback"
         )
         fig_fb.update_layout(template="plotly_dark")
-        st.plotly_chart(fig_fb, use_container_width=True)
+        perf.chart(fig_fb)
 
         # Crash logs list
         st.subheader("💥 Crash Logs")
@@ -626,8 +1183,36 @@ if df is not None:
         if len(crash_entries) == 0:
             st.success("No crash logs for this run 🎉")
         else:
-            for idx, row in crash_entries.iterrows():
-                st.error(f"Request {row['request_id']}:\n\n{row['crash_log']}")
+            run_sigs, run_sigs_error = fetch_crash_signatures(run_ids=(str(selected_run),))
+            if run_sigs_error or not run_sigs["signatures"]:
+                if run_sigs_error:
+                    st.warning(f"Crash index unavailable: {run_sigs_error}")
+                else:
+                    st.info("Crashes of this run are not indexed yet (POST /api/crashes/reindex)")
+                local_counts = crash_entries["crash_log"].value_counts().rename_axis("crash_log").reset_index(name="count")
+                perf.table(local_counts, "crash logs (local)")
+            else:
+                sig_df = pd.DataFrame(run_sigs["signatures"])
+                perf.table(
+                    sig_df[["signature", "exception", "top_frame", "count", "first_request_id", "last_request_id"]],
+                    "crash signatures"
+                )
+                colQ1, colQ2 = st.columns([2, 1])
+                crash_query = colQ1.text_input("Search crash logs", placeholder='EXC_BAD_ACCESS, "out of memory", metal*')
+                crash_sig = colQ2.selectbox("Signature", ["All"] + sig_df["signature"].tolist())
+                found, found_error = fetch_api("/api/crashes/search", {
+                    "q": crash_query or None,
+                    "run_id": str(selected_run),
+                    "signature": None if crash_sig == "All" else crash_sig,
+                    "limit": 20,
+                })
+                if found_error:
+                    st.error(f"Search failed: {found_error}")
+                else:
+                    st.caption(f"{found['count']} crash(es) shown")
+                    for crash in found["crashes"]:
+                        with st.expander(f"Request {crash['request_id']} · {crash['signature']}"):
+                            st.code(crash["crash_log"], language=None)
     with tab3:
 
         st.header("🆚 Compare Runs")
@@ -642,9 +1227,13 @@ if df is not None:
 
         if len(selected_runs) == 0:
             st.info("Hãy chọn ít nhất 1 run để so sánh.")
-            st.stop()
+            stop_rerun()
 
-        compare_df = df[df["run_id"].isin(selected_runs)].copy()
+        if approx_mode:
+            compare_df = shared_cache.memo(("runs", tuple(selected_runs)), lambda: read_runs(list(selected_runs))).copy()
+        else:
+            compare_df = df[df["run_id"].isin(selected_runs)].copy()
+        perf.mark("filter: compare runs", len(compare_df))
 
         # ============================
         # SUMMARY TABLE
@@ -677,7 +1266,7 @@ if df is not None:
         summary_rows = [summarize(r) for r in selected_runs]
         summary_table = pd.DataFrame(summary_rows)
 
-        st.dataframe(summary_table, use_container_width=True)
+        perf.table(summary_table, "Run Summary Table")
 
         st.markdown("---")
 
@@ -687,15 +1276,15 @@ if df is not None:
 
         # ---- Boxplot latency per run ----
         st.subheader("📦 Latency Distribution per Run (Boxplot)")
-        fig_box = px.box(
+        fig_box = cached_figure(("run_box", tuple(selected_runs)), lambda: px.box(
             compare_df,
             x="run_id",
             y="latency_ms",
             color="run_id",
-            title="Latency Distribution by Run"
-        )
-        fig_box.update_layout(template="plotly_dark")
-        st.plotly_chart(fig_box, use_container_width=True)
+            title="Latency Distribution by Run",
+            template="plotly_dark"
+        ))
+        perf.chart(fig_box)
 
         # ---- Average Latency per run ----
         st.subheader("🚀 Average Latency per Run")
@@ -707,7 +1296,7 @@ if df is not None:
             text_auto=".2f"
         )
         fig_avg_latency.update_layout(template="plotly_dark")
-        st.plotly_chart(fig_avg_latency, use_container_width=True)
+        perf.chart(fig_avg_latency)
 
         # ---- Avg Battery per run ----
         st.subheader("🔋 Average Battery per Run")
@@ -719,7 +1308,7 @@ if df is not None:
             text_auto=".1f"
         )
         fig_bat.update_layout(template="plotly_dark")
-        st.plotly_chart(fig_bat, use_container_width=True)
+        perf.chart(fig_bat)
 
         # ---- Avg Temperature per run ----
         st.subheader("🌡 Temperature Level per Run (Most Common)")
@@ -730,7 +1319,7 @@ if df is not None:
             title="Dominant Temperature Level per Run"
         )
         fig_temp.update_layout(template="plotly_dark")
-        st.plotly_chart(fig_temp, use_container_width=True)
+        perf.chart(fig_temp)
 
         # ---- Radar chart per run ----
         st.subheader("🕸 Radar Chart Comparison")
@@ -763,7 +1352,75 @@ if df is not None:
             showlegend=True
         )
 
-        st.plotly_chart(fig_radar, use_container_width=True)
+        perf.chart(fig_radar)
+
+        st.markdown("---")
+
+        # ============================
+        # REGRESSION CHECK
+        # ============================
+        st.subheader("🧪 Regression Check")
+        st.caption("Bootstrap CIs on p50/p95 + Mann-Whitney U test, computed by the API on all logs.")
+
+        reg1, reg2, reg3, reg4 = st.columns(4)
+        reg_dimension = reg1.selectbox(
+            "Compare by",
+            options=["run_id", "app_version", "model_name"],
+            key="reg_dimension"
+        )
+        # Versions come from the filter options: a sample can miss rare ones
+        reg_values = app_versions if reg_dimension == "app_version" else df[reg_dimension].dropna().unique()
+        reg_options = [str(v) for v in reg_values]
+        reg_baseline = reg2.selectbox("Baseline", options=reg_options, index=0, key="reg_baseline")
+        reg_candidate = reg3.selectbox(
+            "Candidate",
+            options=reg_options,
+            index=min(1, len(reg_options) - 1),
+            key="reg_candidate"
+        )
+        reg_threshold = reg4.number_input("Threshold (%)", min_value=0.0, value=5.0, step=1.0, key="reg_threshold")
+
+        reg_params = {
+            "dimension": reg_dimension,
+            "baseline": reg_baseline,
+            "candidate": reg_candidate,
+            "threshold_pct": reg_threshold,
+        }
+        if st.button("Run regression check", key="reg_run"):
+            st.session_state["reg_result"] = (reg_params, *fetch_api("/api/analysis/regression", reg_params))
+
+        if st.session_state.get("reg_result") and st.session_state["reg_result"][0] == reg_params:
+            _, reg_result, reg_error = st.session_state["reg_result"]
+            if reg_error:
+                st.warning(reg_error)
+            else:
+                if reg_result["regression"]:
+                    st.error(
+                        f"🚨 Regression: {', '.join(reg_result['regressed_metrics'])} slower than baseline "
+                        f"by more than {reg_threshold:.0f}%"
+                    )
+                else:
+                    st.success("✅ No significant latency regression")
+
+                reg_rows = []
+                for metric, m in reg_result["metrics"].items():
+                    reg_rows.append({
+                        "metric": metric,
+                        "baseline (ms)": m["baseline"],
+                        "baseline CI": f"{m['baseline_ci'][0]:.0f} – {m['baseline_ci'][1]:.0f}",
+                        "candidate (ms)": m["candidate"],
+                        "candidate CI": f"{m['candidate_ci'][0]:.0f} – {m['candidate_ci'][1]:.0f}",
+                        "change (%)": m["change_pct"],
+                        "change CI (%)": f"{m['change_pct_ci'][0]:+.1f} – {m['change_pct_ci'][1]:+.1f}",
+                        "regression": m["regression"],
+                    })
+                perf.table(pd.DataFrame(reg_rows), "Regression Check")
+
+                mw = reg_result["mann_whitney"]
+                mw1, mw2, mw3 = st.columns(3)
+                mw1.metric("Mann-Whitney p-value", f"{mw['p_value']:.2g}")
+                mw2.metric("P(candidate slower)", f"{mw['prob_candidate_slower']:.2f}")
+                mw3.metric("Samples (base / cand)", f"{reg_result['n_baseline']} / {reg_result['n_candidate']}")
 
         st.markdown("---")
 
@@ -781,6 +1438,7 @@ if df is not None:
 
         numeric_cols = ["latency_ms", "battery_percentage", "device_temperature"]
         corr = corr_df[numeric_cols].corr()
+        perf.mark("aggregate: correlation", len(corr_df))
 
         fig_corr = px.imshow(
             corr,
@@ -788,7 +1446,7 @@ if df is not None:
             title="Correlation Heatmap: Latency / Battery / Temperature"
         )
         fig_corr.update_layout(template="plotly_dark")
-        st.plotly_chart(fig_corr, use_container_width=True)
+        perf.chart(fig_corr)
 
         # ---- Battery Drain Rate ----
         st.markdown("### ② Battery Drain Rate per Run")
@@ -798,6 +1456,7 @@ if df is not None:
             return sub["battery_percentage"].iloc[0] - sub["battery_percentage"].iloc[-1]
 
         summary_table["battery_drain"] = summary_table["run_id"].apply(battery_drain)
+        perf.mark("aggregate: battery drain per run", len(summary_table))
 
         fig_drain = px.bar(
             summary_table,
@@ -807,7 +1466,7 @@ if df is not None:
             text_auto=".1f"
         )
         fig_drain.update_layout(template="plotly_dark")
-        st.plotly_chart(fig_drain, use_container_width=True)
+        perf.chart(fig_drain)
 
         # ---- Temperature Rise Rate ----
         st.markdown("### ③ Temperature Rise Trend per Run")
@@ -819,6 +1478,7 @@ if df is not None:
             return ts.iloc[-1] - ts.iloc[0]
 
         summary_table["temp_rise"] = summary_table["run_id"].apply(temp_rise)
+        perf.mark("aggregate: temperature rise per run", len(summary_table))
 
         fig_rise = px.bar(
             summary_table,
@@ -828,7 +1488,7 @@ if df is not None:
             text_auto=".1f"
         )
         fig_rise.update_layout(template="plotly_dark")
-        st.plotly_chart(fig_rise, use_container_width=True)
+        perf.chart(fig_rise)
 
         # ---- Crash timeline ----
         st.markdown("### ④ Crash Timeline per Run")
@@ -838,17 +1498,35 @@ if df is not None:
         if len(crash_df) == 0:
             st.success("No crashes detected across selected runs.")
         else:
-            fig_crash = px.scatter(
+            fig_crash = cached_figure(("crash_timeline", tuple(selected_runs)), lambda: px.scatter(
                 crash_df,
                 x="request_id",
                 y="run_id",
                 color="run_id",
                 size=[10] * len(crash_df),
                 title="Crash Timeline",
-                labels={"request_id": "Request", "run_id": "Run ID"}
+                labels={"request_id": "Request", "run_id": "Run ID"},
+                template="plotly_dark"
+            ))
+            perf.chart(fig_crash)
+
+            cmp_sigs, cmp_sigs_error = fetch_crash_signatures(
+                run_ids=tuple(str(r) for r in selected_runs), group_by="run_id"
             )
-            fig_crash.update_layout(template="plotly_dark")
-            st.plotly_chart(fig_crash, use_container_width=True)
+            if cmp_sigs_error:
+                st.warning(f"Crash index unavailable: {cmp_sigs_error}")
+            elif cmp_sigs["signatures"]:
+                fig_sigs = px.bar(
+                    pd.DataFrame(cmp_sigs["signatures"]),
+                    x="count",
+                    y="signature",
+                    color="run_id",
+                    orientation="h",
+                    hover_data=["exception", "top_frame"],
+                    title="Top Crash Signatures per Run"
+                )
+                fig_sigs.update_layout(template="plotly_dark")
+                perf.chart(fig_sigs)
 
 else:
     # When shared file is missing or failed to load
@@ -862,4 +1540,6 @@ else:
         'device_model': ['iPhone 13', 'iPhone 14', 'iPhone 15 Pro'],
         'app_version': ['1.0.0', '1.1.0', '2.0.0']
     }
-    st.dataframe(pd.DataFrame(sample_data))
\ No newline at end of file
+    st.dataframe(pd.DataFrame(sample_data))
+
+finish_rerun()
@@ -0,0 +1,120 @@
+"""
+Process-wide data cache shared by every Streamlit session.
+
+Streamlit runs all browser sessions in one process, so a single instance of
+``SharedDataCache`` (created through ``st.cache_resource``) holds one immutable,
+versioned copy of the log plus memoized per-filter results. Sessions only ever
+receive shallow copies; with pandas copy-on-write enabled nothing a session does
+to its copy can leak into the shared frame.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import pandas as pd
+
+# Sessions get shallow copies of shared frames; copy-on-write makes them safe to modify
+pd.options.mode.copy_on_write = True
+
+CACHE_BUDGET_MB = float(os.environ.get("DASHBOARD_CACHE_MB", "512"))
+
+
+def _size_of(value):
+    if hasattr(value, "cache_size"):
+        return int(value.cache_size)
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(deep=True).sum())
+    if isinstance(value, pd.Series):
+        return int(value.memory_usage(deep=True))
+    return 1024  # small scalars / dicts: nominal cost
+
+
+def _share(value):
+    return value.copy(deep=False) if isinstance(value, (pd.DataFrame, pd.Series)) else value
+
+
+class SharedDataCache:
+    """One immutable frame per data version + LRU of derived results under a memory budget"""
+
+    def __init__(self, budget_mb=CACHE_BUDGET_MB):
+        self.budget_bytes = int(budget_mb * 1024 * 1024)
+        self.version = None
+        self.frame = None
+        self.loaded_at = None
+        self._base_version = None
+        self._position = None
+        self._results = OrderedDict()  # key -> (value, size)
+        self._bytes = 0
+        self.hits = self.misses = self.evictions = 0
+        self._lock = threading.RLock()
+
+    def get_frame(self, version, loader, extend=None):
+        """
+        Return the shared frame, (re)loading it once per ``version`` for all sessions.
+
+        ``loader()`` returns (frame, position). For sources that only grow between
+        versions, ``extend(position, frame)`` returns (new rows or None, new position),
+        or None if the source was rewritten; new rows are appended instead of reloading.
+        """
+        with self._lock:
+            grown = None
+            if self.frame is not None and version == self._base_version and extend is not None:
+                grown = extend(self._position, self.frame)
+            if self.frame is None or version != self._base_version or grown is None:
+                frame, self._position = loader()
+                self._base_version = version
+                self._install(frame)
+            else:
+                rows, self._position = grown
+                if rows is not None:
+                    self._install(pd.concat([self.frame, rows], ignore_index=True))
+            return _share(self.frame)
+
+    def _install(self, frame):
+        self.frame = frame
+        self.version = (self._base_version, self._position)
+        self.loaded_at = time.time()
+        # Results of older versions can never be hit again
+        self._results.clear()
+        self._bytes = 0
+
+    def memo(self, key, compute):
+        """Return ``compute()`` memoized under (current version, key), LRU-evicted"""
+        full_key = (self.version, key)
+        with self._lock:
+            if full_key in self._results:
+                self._results.move_to_end(full_key)
+                self.hits += 1
+                return _share(self._results[full_key][0])
+            self.misses += 1
+
+        value = compute()
+        size = _size_of(value)
+        with self._lock:
+            if full_key in self._results:
+                # Another session computed the same result meanwhile: keep theirs
+                self._results.move_to_end(full_key)
+                value = self._results[full_key][0]
+            elif size <= self.budget_bytes and full_key[0] == self.version:
+                self._results[full_key] = (value, size)
+                self._bytes += size
+                while self._bytes > self.budget_bytes:
+                    _, (_, old_size) = self._results.popitem(last=False)
+                    self._bytes -= old_size
+                    self.evictions += 1
+        return _share(value)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "version": self.version,
+                "rows": 0 if self.frame is None else len(self.frame),
+                "frame_mb": 0 if self.frame is None else _size_of(self.frame) / 1024 / 1024,
+                "results": len(self._results),
+                "results_mb": self._bytes / 1024 / 1024,
+                "budget_mb": self.budget_bytes / 1024 / 1024,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
@@ -0,0 +1,140 @@
+"""
+Payload-aware preparation of Plotly figures before they are sent to the browser.
+
+Above ``WEBGL_MIN_POINTS`` points a figure switches its scatter traces to WebGL
+(``scattergl``), line traces longer than ``MAX_LINE_POINTS`` are decimated with
+a min/max-per-bucket pass (spikes stay visible), large box traces are sent as
+precomputed quartiles instead of every raw value, and float arrays are rounded
+to ``FIGURE_DECIMALS``. The plotly.js bundled with Streamlit 1.28 (2.6) predates
+typed-array ("bdata") figure encoding, so the payload is made compact by
+sending fewer, shorter numbers instead.
+"""
+import json
+import os
+
+import numpy as np
+import plotly.graph_objects as go
+import plotly.utils
+
+WEBGL_MIN_POINTS = int(os.environ.get("DASHBOARD_WEBGL_POINTS", "2000"))
+MAX_LINE_POINTS = int(os.environ.get("DASHBOARD_MAX_LINE_POINTS", "4000"))  # per trace
+FIGURE_DECIMALS = int(os.environ.get("DASHBOARD_FIGURE_DECIMALS", "2"))
+
+
+class PreparedFigure:
+    """A figure ready to send, with its point count and (lazily) its JSON payload size"""
+
+    def __init__(self, figure, points, source_points):
+        self.figure = figure
+        self.points = points
+        self.source_points = source_points
+        self.renderer = "webgl" if any(t.type == "scattergl" for t in figure.data) else "svg"
+        self._payload_bytes = None
+
+    @property
+    def payload_bytes(self):
+        if self._payload_bytes is None:
+            self._payload_bytes = len(json.dumps(self.figure, cls=plotly.utils.PlotlyJSONEncoder))
+        return self._payload_bytes
+
+    @property
+    def cache_size(self):
+        return self.payload_bytes
+
+
+def _array(values):
+    return None if values is None else np.asarray(values)
+
+
+def _trace_points(trace):
+    for key in ("y", "x", "r"):
+        values = trace.get(key)
+        if values is not None:
+            return len(values)
+    return 0
+
+
+def _compact(values):
+    """Round float arrays; leave ints, strings and dates untouched"""
+    if values is not None and values.dtype.kind == "f":
+        return np.round(values.astype(np.float64), FIGURE_DECIMALS)
+    return values
+
+
+def decimate_indices(y, max_points):
+    """Indices of the min and max of every bucket, in order (~max_points indices)"""
+    n = len(y)
+    edges = np.linspace(0, n, max(max_points // 2, 1) + 1).astype(int)
+    keep = []
+    for lo, hi in zip(edges[:-1], edges[1:]):
+        if hi <= lo:
+            continue
+        segment = y[lo:hi]
+        if np.isnan(segment).all():
+            keep.append(lo)
+            continue
+        keep.extend((lo + int(np.nanargmin(segment)), lo + int(np.nanargmax(segment))))
+    return np.unique(keep)
+
+
+def _box_stats(trace):
+    """Replace raw box values by precomputed quartiles / fences per category"""
+    y = _array(trace["y"]).astype(float)
+    has_x = trace.get("x") is not None
+    x = _array(trace["x"]) if has_x else np.zeros(len(y), dtype=int)
+    categories, codes = np.unique(x, return_inverse=True)
+    stats = {k: [] for k in ("q1", "median", "q3", "lowerfence", "upperfence", "mean")}
+    for code in range(len(categories)):
+        values = y[codes == code]
+        values = values[~np.isnan(values)]
+        if len(values) == 0:
+            values = np.array([np.nan])
+        q1, median, q3 = np.quantile(values, [0.25, 0.5, 0.75])
+        iqr = q3 - q1
+        stats["q1"].append(q1)
+        stats["median"].append(median)
+        stats["q3"].append(q3)
+        stats["lowerfence"].append(values[values >= q1 - 1.5 * iqr].min())
+        stats["upperfence"].append(values[values <= q3 + 1.5 * iqr].max())
+        stats["mean"].append(values.mean())
+    trace = {k: v for k, v in trace.items() if k not in ("y", "x", "boxpoints")}
+    trace.update({k: _compact(np.asarray(v)) for k, v in stats.items()}, boxpoints=False)
+    if has_x:
+        trace["x"] = categories
+    return trace
+
+
+def prepare_figure(fig):
+    """Return a PreparedFigure: WebGL / decimated / compact above the size thresholds"""
+    if isinstance(fig, PreparedFigure):
+        return fig
+    traces = [trace.to_plotly_json() for trace in fig.data]
+    source_points = sum(_trace_points(t) for t in traces)
+    large = source_points >= WEBGL_MIN_POINTS
+
+    prepared = []
+    for trace in traces:
+        kind = trace.get("type", "scatter")
+        if kind == "scatter":
+            x, y = _array(trace.get("x")), _array(trace.get("y"))
+            lines = "lines" in (trace.get("mode") or "lines")
+            if lines and y is not None and y.dtype.kind in "fi" and len(y) > MAX_LINE_POINTS:
+                idx = decimate_indices(y.astype(float), MAX_LINE_POINTS)
+                y = y[idx]
+                x = x[idx] if x is not None else idx
+                for key in ("text", "hovertext", "customdata"):
+                    if trace.get(key) is not None and np.ndim(trace[key]) > 0:
+                        trace[key] = _array(trace[key])[idx]
+            trace["x"], trace["y"] = _compact(x), _compact(y)
+            if large:
+                trace["type"] = "scattergl"
+        elif kind == "box" and large and trace.get("y") is not None and trace.get("orientation") != "h":
+            trace = _box_stats(trace)
+        else:
+            for key in ("x", "y"):
+                if trace.get(key) is not None and np.ndim(trace[key]) > 0:
+                    trace[key] = _compact(_array(trace[key]))
+        prepared.append(trace)
+
+    figure = go.Figure(data=prepared, layout=fig.layout, skip_invalid=True)
+    return PreparedFigure(figure, sum(_trace_points(t) for t in prepared), source_points)
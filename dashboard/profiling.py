@@ -0,0 +1,168 @@
+import cProfile
+import io
+import marshal
+import pstats
+import time
+
+import streamlit as st
+import streamlit.components.v1 as components
+
+from figures import PreparedFigure, prepare_figure
+
+# Optional: pyinstrument gives a nicer call tree than cProfile if it is installed
+try:
+    from pyinstrument import Profiler as _PyinstrumentProfiler
+except ImportError:
+    _PyinstrumentProfiler = None
+
+CAPTURE_MODES = ["off", "cProfile"] + (["pyinstrument"] if _PyinstrumentProfiler else [])
+
+
+# Runs in a component iframe (same origin) and hooks plotly.js' before/after plot
+# events on every chart of the page to time how long the browser takes to draw it
+BROWSER_TIMING_HTML = """
+<div id="out" style="font: 12px monospace; color: #bbb">Waiting for charts to re-render…</div>
+<script>
+const doc = window.parent.document;
+function hook() {
+  doc.querySelectorAll('.js-plotly-plot').forEach((gd) => {
+    if (gd.__timingHooked || !gd.on) return;
+    gd.__timingHooked = true;
+    gd.on('plotly_beforeplot', () => { gd.__plotStart = performance.now(); });
+    gd.on('plotly_afterplot', () => {
+      if (gd.__plotStart !== undefined) gd.__renderMs = performance.now() - gd.__plotStart;
+    });
+  });
+}
+function report() {
+  hook();
+  const rows = Array.from(doc.querySelectorAll('.js-plotly-plot')).map((gd, i) => {
+    const title = (gd.layout && gd.layout.title && (gd.layout.title.text || gd.layout.title)) || `chart ${i + 1}`;
+    const types = Array.from(new Set((gd._fullData || []).map((t) => t.type))).join(',');
+    const points = (gd._fullData || []).reduce((n, t) => n + (t._length || 0), 0);
+    const ms = gd.__renderMs === undefined ? '–' : gd.__renderMs.toFixed(1) + ' ms';
+    return `${ms.padStart(10)}  ${String(points).padStart(7)} pts  ${types.padEnd(18)} ${title}`;
+  });
+  if (rows.length) document.getElementById('out').innerText = rows.join('\\n');
+}
+setInterval(report, 1000);
+report();
+</script>
+"""
+
+
+class RerunProfiler:
+    """Collect wall time, row counts and browser payload size per stage of one rerun
+
+    Stages are laps: ``mark(name)`` records the time spent since the previous mark,
+    so the script does not need to be re-indented into ``with`` blocks.
+    When disabled every method is a no-op (``chart``/``table`` still render).
+    """
+
+    def __init__(self, enabled=False, capture="off"):
+        self.enabled = enabled
+        self.capture = capture if enabled else "off"
+        self.stages = []
+        self._profiler = None
+        if self.capture == "cProfile":
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        elif self.capture == "pyinstrument":
+            self._profiler = _PyinstrumentProfiler()
+            self._profiler.start()
+        self._start = self._last = time.perf_counter()
+
+    def _record(self, stage, elapsed, rows=None, payload_bytes=None, renderer=None):
+        self.stages.append({
+            "stage": stage,
+            "wall_ms": elapsed * 1000,
+            "rows": rows,
+            "payload_kb": payload_bytes / 1024 if payload_bytes is not None else None,
+            "renderer": renderer,
+        })
+
+    def mark(self, stage, rows=None):
+        """Close the current stage (time since the previous mark)"""
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        self._record(stage, now - self._last, rows)
+        self._last = now
+
+    def chart(self, fig, name=None):
+        """Render a plotly figure (WebGL / decimated when large), recording build time and payload size"""
+        if not self.enabled:
+            st.plotly_chart(prepare_figure(fig).figure, use_container_width=True)
+            return
+        layout = fig.figure.layout if isinstance(fig, PreparedFigure) else fig.layout
+        name = name or layout.title.text or "figure"
+        self.mark(f"figure: {name}")
+        t0 = time.perf_counter()
+        prepared = prepare_figure(fig)
+        payload = prepared.payload_bytes
+        self._record(f"prepare: {name}", time.perf_counter() - t0, rows=prepared.source_points)
+        t0 = time.perf_counter()
+        st.plotly_chart(prepared.figure, use_container_width=True)
+        now = time.perf_counter()
+        self._record(f"send: {name}", now - t0, rows=prepared.points, payload_bytes=payload,
+                     renderer=prepared.renderer)
+        self._last = now
+
+    def table(self, data, name="table"):
+        """Render a dataframe, recording its (approximate) in-memory size"""
+        if not self.enabled:
+            st.dataframe(data, use_container_width=True)
+            return
+        self.mark(f"build: {name}", len(data))
+        t0 = time.perf_counter()
+        payload = int(data.memory_usage(deep=True).sum())
+        st.dataframe(data, use_container_width=True)
+        now = time.perf_counter()
+        self._record(f"send: {name}", now - t0, rows=len(data), payload_bytes=payload)
+        self._last = now
+
+    def _stop_capture(self):
+        """Stop the profiler and return (preview text, download bytes, file name, mime)"""
+        if self.capture == "cProfile":
+            self._profiler.disable()
+            self._profiler.create_stats()
+            out = io.StringIO()
+            pstats.Stats(self._profiler, stream=out).sort_stats("cumulative").print_stats(40)
+            # Same format as Profile.dump_stats(): loadable with pstats / snakeviz
+            return out.getvalue(), marshal.dumps(self._profiler.stats), "rerun.prof", "application/octet-stream"
+        if self.capture == "pyinstrument":
+            self._profiler.stop()
+            return (self._profiler.output_text(unicode=True), self._profiler.output_html().encode(),
+                    "rerun.html", "text/html")
+        return None
+
+    def render(self):
+        """Show the debug panel at the bottom of the page"""
+        if not self.enabled:
+            return
+        import pandas as pd
+
+        total_ms = (time.perf_counter() - self._start) * 1000
+        capture = self._stop_capture()
+
+        with st.expander("🐞 Debug: rerun timings", expanded=True):
+            stages_df = pd.DataFrame(self.stages)
+            total_kb = stages_df["payload_kb"].sum() if not stages_df.empty else 0
+            c1, c2, c3 = st.columns(3)
+            c1.metric("Rerun wall time (ms)", f"{total_ms:.0f}")
+            c2.metric("Stages", len(stages_df))
+            c3.metric("Payload to browser (KB)", f"{total_kb:.0f}")
+            if not stages_df.empty:
+                st.dataframe(
+                    stages_df.sort_values("wall_ms", ascending=False),
+                    use_container_width=True,
+                )
+
+            st.caption("Browser render time per chart (measured on the next re-render of each chart):")
+            components.html(BROWSER_TIMING_HTML, height=160, scrolling=True)
+
+            if capture is not None:
+                text, data, file_name, mime = capture
+                st.download_button(f"⬇️ Download {self.capture} profile", data,
+                                   file_name=file_name, mime=mime)
+                st.code(text[:20000])
@@ -0,0 +1,267 @@
+"""
+Readers for the latency log the API shares with the dashboard.
+
+The log is made of rotated segments listed in the API's manifest, the live CSV
+the API appends to, and optionally an Arrow snapshot of both (see
+api/log_store.py and api/snapshot.py). A full load is versioned by the segments,
+the live file's epoch and whether a snapshot covers them: rows appended to the
+live file afterwards are read from the byte offset the loaded frame already
+covers, so neither ingestion nor the API republishing its snapshot forces the
+whole log to be re-read.
+"""
+import io
+import json
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+SHARED_LOG = "/app/latency_logs.csv"
+# Rotated/compacted segments written by the API (see api/log_store.py)
+SHARED_SEGMENT_DIR = "/app/log_segments"
+# Arrow IPC snapshot published by the API (see api/snapshot.py)
+SHARED_SNAPSHOT = "/app/snapshots/latency.arrow"
+
+
+def manifest_path():
+    return os.path.join(SHARED_SEGMENT_DIR, "manifest.json")
+
+
+def load_manifest():
+    try:
+        with open(manifest_path()) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {"active_since": None, "segments": []}
+
+
+def read_log_segments():
+    """Read rotated segments listed in the API's manifest (oldest first)"""
+    frames = []
+    for seg in load_manifest()["segments"]:
+        path = os.path.join(SHARED_SEGMENT_DIR, seg["name"])
+        try:
+            if seg["format"] == "parquet":
+                frames.append(pd.read_parquet(path))
+            else:
+                frames.append(pd.read_csv(path))
+        except FileNotFoundError:
+            # Compacted or dropped by the API while we were reading
+            continue
+    return frames
+
+
+def _storage_state(manifest):
+    """Segments (by stem, so compaction is not a change) and the live file's epoch"""
+    return [seg["name"].split(".")[0] for seg in manifest["segments"]], manifest.get("active_since")
+
+
+def _snapshot_meta():
+    """The snapshot's metadata (its schema only), or None without one"""
+    try:
+        with pa.memory_map(SHARED_SNAPSHOT) as source:
+            schema = pa.ipc.open_file(source).schema
+    except FileNotFoundError:
+        return None
+    return json.loads(schema.metadata[b"snapshot"])
+
+
+def data_version():
+    """
+    Version stamp of what a full load reads besides the live tail: the segments,
+    the live file's epoch, and whether the snapshot covers them. Appends to the
+    live file do not change it, nor does the API republishing the snapshot over
+    the same segments: the rows it adds are the live tail the frame already reads.
+    """
+    segments, active_since = _storage_state(load_manifest())
+    meta = _snapshot_meta()
+    covered = meta is not None and meta["segments"] == segments and meta["active_since"] == active_since
+    return tuple(segments), active_since, covered
+
+
+def _conform(rows, dtypes):
+    """Give tail rows the dtypes of the frame they are appended to"""
+    for col, dtype in dtypes.items():
+        if col in rows.columns and rows[col].dtype != dtype and pd.api.types.is_numeric_dtype(dtype):
+            values = pd.to_numeric(rows[col], errors="coerce")
+            # Integer columns of the snapshot cannot hold the tail's NaN: stay float then
+            rows[col] = values if values.isna().any() else values.astype(dtype)
+    return rows
+
+
+def read_live_tail(offset, dtypes=None):
+    """
+    Rows appended to the live file after byte ``offset`` and the offset they end at.
+    Rows are None if nothing new was written; returns None if the file shrank
+    below ``offset`` (cleared or rotated), i.e. the caller must reload.
+
+    With ``dtypes`` (of the frame the rows will be appended to), the rows take them:
+    its text columns are parsed as text, so the snapshot's app_version "1.0" is not
+    followed by tail rows holding the float 1.0.
+    """
+    with open(SHARED_LOG, "rb") as f:
+        header = f.readline()
+        if os.fstat(f.fileno()).st_size < offset:
+            return None
+        offset = max(offset, len(header))
+        f.seek(offset)
+        data = f.read()
+    # The API may be halfway through writing the last row: keep complete lines only
+    data = data[:data.rfind(b"\n") + 1]
+    if not data.strip():
+        return None, offset
+    if dtypes is None:
+        return pd.read_csv(io.BytesIO(header + data)), offset + len(data)
+    text = {col: str for col, dtype in dtypes.items() if not pd.api.types.is_numeric_dtype(dtype)}
+    rows = pd.read_csv(io.BytesIO(header + data), dtype=text)
+    return _conform(rows, dtypes), offset + len(data)
+
+
+def extend_frame(offset, frame):
+    """``SharedDataCache.get_frame`` extension: live rows after ``offset``, typed like ``frame``"""
+    return read_live_tail(offset, None if frame.empty else frame.dtypes)
+
+
+def open_snapshot():
+    """
+    Memory-map the API's Arrow snapshot without converting it: (table, live-file
+    offset it covers). Returns None if there is no snapshot or the log was
+    rotated/cleared after it.
+    """
+    try:
+        table = pa.ipc.open_file(pa.memory_map(SHARED_SNAPSHOT)).read_all()
+    except FileNotFoundError:
+        return None
+    meta = json.loads(table.schema.metadata[b"snapshot"])
+    segments, active_since = _storage_state(load_manifest())
+    if (segments != meta["segments"] or active_since != meta["active_since"]
+            or os.path.getsize(SHARED_LOG) < meta["live_offset"]):
+        return None
+    return table, meta["live_offset"]
+
+
+def snapshot_rows():
+    """Rows in the published snapshot (its metadata only), or None without one"""
+    meta = _snapshot_meta()
+    return None if meta is None else meta["rows"]
+
+
+def read_snapshot():
+    """The snapshot as a frame: (frame, live-file offset it covers), or None (see open_snapshot)"""
+    snapshot = open_snapshot()
+    if snapshot is None:
+        return None
+    table, offset = snapshot
+    # Numeric columns stay backed by the mapped file; only strings are materialized
+    return table.to_pandas(split_blocks=True), offset
+
+
+def read_latency():
+    """Full load of the shared log: (frame, live-file offset it covers)"""
+    snapshot = read_snapshot()
+    if snapshot is None:
+        frames = [f for f in read_log_segments() if not f.empty]
+        # The live file is read below as a tail from its first row
+        base = pd.concat(frames, ignore_index=True) if frames else pd.read_csv(SHARED_LOG, nrows=0)
+        snapshot = (base, 0)
+    df, offset = snapshot
+    tail = read_live_tail(offset, None if df.empty else df.dtypes)
+    if tail is None:
+        raise RuntimeError(f"{SHARED_LOG} was rewritten while it was being read")
+    rows, offset = tail
+    if rows is not None:
+        df = rows if df.empty else pd.concat([df, rows], ignore_index=True)
+    return df, offset
+
+
+def sample_positions(strata, budget):
+    """
+    Positions of random rows of every stratum (an even share of ``budget`` each,
+    at least 100), in their original order
+    """
+    n = len(strata)
+    if not n:
+        return np.arange(0)
+    per_stratum = max(100, budget // (int(strata.max()) + 1))
+    priority = np.random.default_rng(0).random(n)
+    order = np.lexsort((priority, strata))
+    sorted_strata = strata[order]
+    starts = np.flatnonzero(np.r_[True, sorted_strata[1:] != sorted_strata[:-1]])
+    rank = np.arange(n) - np.repeat(starts, np.diff(np.r_[starts, n]))
+    return np.sort(order[rank < per_stratum])
+
+
+def stratified_sample(df, budget):
+    """Random rows of every (model, run), as ``sample_positions`` picks them"""
+    strata = df.groupby(["model_name", "run_id"], sort=False, dropna=False).ngroup().to_numpy()
+    return df.iloc[sample_positions(strata, budget)]
+
+
+def _tail_of(table, offset):
+    """Live rows after the snapshot, typed like its columns"""
+    tail = read_live_tail(offset, table.schema.empty_table().to_pandas().dtypes)
+    if tail is None:
+        raise RuntimeError(f"{SHARED_LOG} was rewritten while it was being read")
+    return tail
+
+
+def read_sample(budget):
+    """
+    Approximate mode's frame: a stratified sample of the snapshot, taken on the
+    mapped Arrow table so only sampled rows are converted to pandas, plus every
+    live row written after it. (frame, live-file offset it covers)
+    """
+    snapshot = open_snapshot()
+    if snapshot is None:
+        df, offset = read_latency()
+        return stratified_sample(df, budget), offset
+    table, offset = snapshot
+    codes = [pc.dictionary_encode(table[col], null_encoding="encode").combine_chunks().indices.to_numpy()
+             for col in ("model_name", "run_id")]
+    runs = int(codes[1].max()) + 1 if table.num_rows else 1
+    _, strata = np.unique(codes[0].astype(np.int64) * runs + codes[1], return_inverse=True)
+    df = table.take(sample_positions(strata, budget)).to_pandas()
+    rows, offset = _tail_of(table, offset)
+    if rows is not None:
+        df = pd.concat([df, rows], ignore_index=True)
+    return df, offset
+
+
+def read_filter_rows(columns, range_columns=()):
+    """
+    One row per distinct combination of ``columns`` in the snapshot, with the
+    min and max of each of ``range_columns`` (two rows per combination), plus
+    the live rows after it: a small frame holding every value a filter can offer.
+    None without a usable snapshot.
+    """
+    snapshot = open_snapshot()
+    if snapshot is None:
+        return None
+    table, offset = snapshot
+    columns = [col for col in columns if col in table.column_names]
+    range_columns = [col for col in range_columns if col in table.column_names]
+    groups = table.group_by(columns).aggregate(
+        [(col, "min") for col in range_columns] + [(col, "max") for col in range_columns]).to_pandas()
+    frames = [groups[columns].assign(**{col: groups[f"{col}_{stat}"] for col in range_columns})
+              for stat in ("min", "max")]
+    rows, _ = _tail_of(table, offset)
+    if rows is not None:
+        frames.append(rows.reindex(columns=columns + range_columns))
+    return pd.concat(frames, ignore_index=True)
+
+
+def read_runs(run_ids):
+    """Every row of ``run_ids``: filtered on the mapped snapshot, plus the live rows after it"""
+    snapshot = open_snapshot()
+    if snapshot is None:
+        df, _ = read_latency()
+        return df[df["run_id"].isin(run_ids)]
+    table, offset = snapshot
+    wanted = pa.array(run_ids).cast(table.schema.field("run_id").type)
+    df = table.filter(pc.is_in(table["run_id"], value_set=wanted)).to_pandas()
+    rows, _ = _tail_of(table, offset)
+    if rows is not None:
+        df = pd.concat([df, rows[rows["run_id"].isin(run_ids)]], ignore_index=True)
+    return df
@@ -0,0 +1,35 @@
+"""
+Run the dashboard's data modules outside Streamlit, against a throwaway copy
+of the files the API shares with it.
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import shared_log  # noqa: E402
+
+HEADER = "run_id,request_id,model_name,latency_ms,app_version\n"
+
+
+@pytest.fixture
+def shared_files(tmp_path, monkeypatch):
+    """Point shared_log at an empty live file (no segments, no snapshot)"""
+    monkeypatch.setattr(shared_log, "SHARED_LOG", str(tmp_path / "latency_logs.csv"))
+    monkeypatch.setattr(shared_log, "SHARED_SEGMENT_DIR", str(tmp_path / "log_segments"))
+    monkeypatch.setattr(shared_log, "SHARED_SNAPSHOT", str(tmp_path / "snapshots" / "latency.arrow"))
+    (tmp_path / "log_segments").mkdir()
+    (tmp_path / "snapshots").mkdir()
+    (tmp_path / "latency_logs.csv").write_text(HEADER)
+    return shared_log
+
+
+@pytest.fixture
+def append_live():
+    """append_live(text): append raw CSV text to the live file, as the API does"""
+    def append(text):
+        with open(shared_log.SHARED_LOG, "a") as f:
+            f.write(text)
+    return append
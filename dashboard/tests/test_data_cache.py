@@ -0,0 +1,75 @@
+import os
+import threading
+
+import pandas as pd
+
+from data_cache import SharedDataCache
+from test_shared_log import snapshot_row, write_snapshot
+
+
+def no_reload():
+    raise AssertionError("the whole log was reloaded")
+
+
+def load(cache, shared_log):
+    return cache.get_frame(shared_log.data_version(), shared_log.read_latency, shared_log.extend_frame)
+
+
+def test_live_appends_extend_the_frame_without_reloading(shared_files, append_live):
+    cache = SharedDataCache()
+    append_live("1,10,model-a,100.0,1.0\n2,20,model-a,200.0,1.0\n3,30,mod")
+    assert load(cache, shared_files)["request_id"].tolist() == [10, 20]
+    loaded_at = cache.loaded_at
+
+    calls = []
+    cache.memo("rows", lambda: calls.append(1) or 2)
+    append_live("el-a,300.0,1.0\n")
+    df = cache.get_frame(shared_files.data_version(), no_reload, shared_files.extend_frame)
+    assert df["request_id"].tolist() == [10, 20, 30]
+    assert cache.loaded_at >= loaded_at
+    # Results of the shorter frame are not served for the longer one
+    cache.memo("rows", lambda: calls.append(1) or 3)
+    assert len(calls) == 2
+
+
+def test_rewritten_live_file_reloads(shared_files, append_live):
+    cache = SharedDataCache()
+    append_live("1,10,model-a,100.0,1.0\n2,20,model-a,200.0,1.0\n")
+    assert len(load(cache, shared_files)) == 2
+    with open(shared_files.SHARED_LOG, "w") as f:
+        f.write("run_id,request_id,model_name,latency_ms,app_version\n9,90,model-b,1.0,2.0\n")
+    assert load(cache, shared_files)["request_id"].tolist() == [90]
+
+
+def test_concurrent_memo_counts_a_result_once():
+    cache = SharedDataCache()
+    cache.get_frame("v", lambda: (pd.DataFrame({"x": [1]}), 0))
+    barrier = threading.Barrier(4)
+
+    def compute():
+        barrier.wait()
+        return pd.DataFrame({"x": range(1000)})
+
+    threads = [threading.Thread(target=cache.memo, args=("key", compute)) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    stats = cache.stats()
+    assert stats["results"] == 1
+    assert cache._bytes == sum(size for _, size in cache._results.values())
+
+
+def test_republished_snapshot_does_not_reload(shared_files, append_live):
+    append_live("1,10,model-a,100.0,1.0\n")
+    write_snapshot(shared_files, [snapshot_row(10)], os.path.getsize(shared_files.SHARED_LOG))
+    cache = SharedDataCache()
+    version = shared_files.data_version()
+    assert load(cache, shared_files)["request_id"].tolist() == [10]
+
+    # The API publishes again over the same segments: the new rows are live tail
+    append_live("1,20,model-a,200.0,1.0\n")
+    write_snapshot(shared_files, [snapshot_row(10), snapshot_row(20)], os.path.getsize(shared_files.SHARED_LOG))
+    assert shared_files.data_version() == version
+    df = cache.get_frame(shared_files.data_version(), no_reload, shared_files.extend_frame)
+    assert df["request_id"].tolist() == [10, 20]
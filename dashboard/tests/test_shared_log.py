@@ -0,0 +1,72 @@
+import json
+import os
+
+import pyarrow as pa
+
+from data_cache import SharedDataCache
+
+
+def write_snapshot(shared_log, rows, live_offset):
+    """An Arrow snapshot as the API publishes it: text columns as strings, ids as int64"""
+    schema = pa.schema([
+        ("run_id", pa.int64()), ("request_id", pa.int64()), ("model_name", pa.string()),
+        ("latency_ms", pa.float64()), ("app_version", pa.string()),
+    ])
+    meta = {"segments": [], "active_since": None, "live_offset": live_offset, "rows": len(rows)}
+    table = pa.Table.from_pylist(rows, schema=schema.with_metadata({"snapshot": json.dumps(meta)}))
+    # Published with a rename, like the API: frames still map the previous file
+    with pa.ipc.new_file(shared_log.SHARED_SNAPSHOT + ".tmp", table.schema) as writer:
+        writer.write_table(table)
+    os.replace(shared_log.SHARED_SNAPSHOT + ".tmp", shared_log.SHARED_SNAPSHOT)
+
+
+def snapshot_row(request_id):
+    return {"run_id": 1, "request_id": request_id, "model_name": "model-a",
+            "latency_ms": 100.0, "app_version": "1.0"}
+
+
+def test_snapshot_and_live_tail_share_dtypes(shared_files, append_live):
+    append_live("1,10,model-a,100.0,1.0\n")
+    write_snapshot(shared_files, [snapshot_row(10)], os.path.getsize(shared_files.SHARED_LOG))
+    append_live("1,20,model-a,200.0,1.0\n2,30,model-b,300.0,2.5\n")
+
+    df, offset = shared_files.read_latency()
+    assert offset == os.path.getsize(shared_files.SHARED_LOG)
+    assert df["request_id"].tolist() == [10, 20, 30]
+    assert df["app_version"].tolist() == ["1.0", "1.0", "2.5"]
+    # What the sidebar filters do with the column
+    assert sorted(df["app_version"].dropna().unique()) == ["1.0", "2.5"]
+    assert df["app_version"].isin(["1.0"]).sum() == 2
+    assert df["run_id"].dtype == "int64"
+
+
+def test_live_rows_appended_to_a_snapshot_keep_its_dtypes(shared_files, append_live):
+    append_live("1,10,model-a,100.0,1.0\n")
+    write_snapshot(shared_files, [snapshot_row(10)], os.path.getsize(shared_files.SHARED_LOG))
+    cache = SharedDataCache()
+    cache.get_frame(shared_files.data_version(), shared_files.read_latency, shared_files.extend_frame)
+
+    append_live("1,20,model-a,200.0,1.0\n")
+    df = cache.get_frame(shared_files.data_version(), shared_files.read_latency, shared_files.extend_frame)
+    assert df["app_version"].tolist() == ["1.0", "1.0"]
+    assert df["latency_ms"].dtype == "float64"
+
+
+def test_approximate_mode_reads_the_snapshot(shared_files, append_live):
+    rows = [dict(snapshot_row(i), run_id=1 + i % 2, model_name=f"model-{'ab'[i % 2]}") for i in range(400)]
+    rows[0]["app_version"] = "0.9"
+    write_snapshot(shared_files, rows, os.path.getsize(shared_files.SHARED_LOG))
+    append_live("3,1000,model-a,200.0,2.5\n")
+
+    df, offset = shared_files.read_sample(budget=200)
+    assert offset == os.path.getsize(shared_files.SHARED_LOG)
+    # An even share of every (model, run), plus the live rows
+    assert df.groupby("run_id").size().to_dict() == {1: 100, 2: 100, 3: 1}
+    assert df["app_version"].dtype == object
+
+    options = shared_files.read_filter_rows(["model_name", "app_version"], ["latency_ms"])
+    assert sorted(options["app_version"].unique()) == ["0.9", "1.0", "2.5"]
+    assert options["latency_ms"].max() == 200.0
+
+    runs = shared_files.read_runs([1, 3])
+    assert runs.groupby("run_id").size().to_dict() == {1: 200, 3: 1}
@@ -2,35 +2,40 @@ import json
 import re
 import pandas as pd
  
+def parse_telemetry(raw_content):
+    """Parse nội dung một file telemetry dump thành list các record (dict)"""
+    # 2. Làm sạch dữ liệu (Data Cleaning)
+    # Loại bỏ các thẻ (kể cả khi chúng nằm giữa dòng)
+    # Pattern tìm kiếm chuỗi bắt đầu bằng
+    # cleaned_content = re.sub(r'\', '', raw_content)
+    # Mẫu Regex đúng để tìm và xóa các thẻ
+    cleaned_content = re.sub(r'\'', '', raw_content)
+   
+    # Xóa các khoảng trắng thừa ở đầu/cuối
+    cleaned_content = cleaned_content.strip()
+ 
+    # 3. Chuẩn hóa về dạng JSON List hợp lệ
+    # Dữ liệu hiện tại là các object rời rạc: {obj1} {obj2} ...
+    # Cần chuyển thành: [{obj1}, {obj2}, ...]
+   
+    # Tìm các vị trí đóng ngoặc nhọn liền kề mở ngoặc nhọn "}{" (có thể có xuống dòng)
+    # và thay thế bằng "}, {" để ngăn cách các phần tử
+    json_array_str = re.sub(r'\}\s*\{', '}, {', cleaned_content)
+   
+    # Bao bọc toàn bộ bằng ngoặc vuông []
+    json_final_str = f"[{json_array_str}]"
+ 
+    # 4. Parse JSON
+    return json.loads(json_final_str)
+ 
+ 
 def convert_telemetry_to_csv(input_file, output_file):
     try:
         # 1. Đọc nội dung file
         with open(input_file, 'r', encoding='utf-8') as f:
             raw_content = f.read()
  
-        # 2. Làm sạch dữ liệu (Data Cleaning)
-        # Loại bỏ các thẻ (kể cả khi chúng nằm giữa dòng)
-        # Pattern tìm kiếm chuỗi bắt đầu bằng
-        # cleaned_content = re.sub(r'\', '', raw_content)
-        # Mẫu Regex đúng để tìm và xóa các thẻ
-        cleaned_content = re.sub(r'\'', '', raw_content)
-       
-        # Xóa các khoảng trắng thừa ở đầu/cuối
-        cleaned_content = cleaned_content.strip()
- 
-        # 3. Chuẩn hóa về dạng JSON List hợp lệ
-        # Dữ liệu hiện tại là các object rời rạc: {obj1} {obj2} ...
-        # Cần chuyển thành: [{obj1}, {obj2}, ...]
-       
-        # Tìm các vị trí đóng ngoặc nhọn liền kề mở ngoặc nhọn "}{" (có thể có xuống dòng)
-        # và thay thế bằng "}, {" để ngăn cách các phần tử
-        json_array_str = re.sub(r'\}\s*\{', '}, {', cleaned_content)
-       
-        # Bao bọc toàn bộ bằng ngoặc vuông []
-        json_final_str = f"[{json_array_str}]"
- 
-        # 4. Parse JSON
-        data = json.loads(json_final_str)
+        data = parse_telemetry(raw_content)
  
         # 5. Chuyển đổi sang DataFrame và lưu CSV
         df = pd.DataFrame(data)
@@ -53,7 +58,7 @@ def convert_telemetry_to_csv(input_file, output_file):
     except json.JSONDecodeError as e:
         print(f"❌ Lỗi khi giải mã JSON: {e}")
         # In ra một phần vị trí lỗi để debug
-        print(f"Vị trí lỗi trong chuỗi đã clean: {json_final_str[e.pos-20:e.pos+20]}")
+        print(f"Vị trí lỗi trong chuỗi đã clean: {e.doc[e.pos-20:e.pos+20]}")
     except Exception as e:
         print(f"❌ Có lỗi xảy ra: {e}")
  